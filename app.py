@@ -1,15 +1,44 @@
+import argparse
+import sqlite3
+import threading
 import tkinter as tk
-from tkinter import ttk, messagebox
+import uuid
+from bisect import bisect_left
+from collections import deque
+from tkinter import ttk, messagebox, filedialog
 import database as db # Assuming database.py is in the same directory
+import contention
+import csv_import
+import export
+import instrumentation
+import live_filter
+import reports
+import timestamps
+from client import InventoryClient
+from row_store import RowStore, TransactionRecord
+from db_worker import DBWorker, timed_action
 
 class InventoryApp:
-    def __init__(self, root):
+    TRANS_PAGE_SIZE = 200 # Rows fetched per keyset page
+    TRANS_MAX_PAGES = 5 # Pages kept in trans_tree at once; older/newer ones are evicted
+    TRANS_PREFETCH_FRACTION = 0.2 # Load the next page once the view is this close to an edge
+    FILTER_DEBOUNCE_MS = 150 # Pause in typing before a filter goes to the database
+    # Heading -> the sort_by the listing queries accept (see database.py); other headings don't sort
+    STOCK_SORT_HEADINGS = {"ID": "id", "Course Code": "course_code", "Title": "title", "Language": "language",
+                           "Quantity": "quantity"}
+    TRANS_SORT_HEADINGS = {"ID": "id", "Course Code": "course_code", "Enrolment No": "enrolment_no",
+                           "Qty": "quantity", "Datetime": "transaction_time"}
+    STOCK_DEFAULT_SORT = ("course_code", False) # (sort_by, descending)
+    TRANS_DEFAULT_SORT = ("transaction_time", True)
+
+    def __init__(self, root, backend=None):
         self.root = root
+        # backend is an InventoryClient in client mode (see service.py); otherwise the database module
+        self.db = backend if backend is not None else db
+        self.reports = backend if backend is not None else reports
         self.root.title("Book Inventory Management")
         self.root.geometry("1200x800")
-
-        # Initialize database and tables
-        db.create_tables()
+        self.root.protocol("WM_DELETE_WINDOW", self.on_close) # Release DB connections on exit
 
         # Styling
         style = ttk.Style()
@@ -21,21 +50,200 @@ class InventoryApp:
         
         self.stock_tab = ttk.Frame(self.notebook)
         self.transactions_tab = ttk.Frame(self.notebook)
+        self.reports_tab = ttk.Frame(self.notebook)
+        self.diagnostics_tab = ttk.Frame(self.notebook)
         
         self.notebook.add(self.stock_tab, text='Stock Management')
         self.notebook.add(self.transactions_tab, text='Transaction Log')
+        self.notebook.add(self.reports_tab, text='Reports')
+        self.notebook.add(self.diagnostics_tab, text='Diagnostics')
         self.notebook.pack(expand=True, fill='both', padx=10, pady=10)
 
         self.selected_stock_id = None
         self.selected_transaction_id = None
         self.selected_transaction_stock_id = None # For transaction updates/deletes
+        self.stock_filters = None
+        self.trans_filters = None
+        self.stock_shown_filters = None # Filters of the rows in stock_tree; None until the first load
+        self.trans_shown_filters = None # Same for trans_tree
+        self.stock_sort = self.STOCK_DEFAULT_SORT # (sort_by, descending) of stock_tree
+        self.trans_sort = self.TRANS_DEFAULT_SORT # Same for trans_tree
+        self._debounced = {} # name -> root.after id of a pending debounced call
+        self.trans_pages = deque()
+        self.trans_at_newest = True
+        self.trans_at_oldest = True
+        self._trans_paging = False
+        self.trans_archive = False # Whether the loaded view includes the archive database
+        self.trans_request_key = uuid.uuid4().hex # Identifies this fill of the form (see clear_transaction_form)
+        self.cart = {} # course_code -> quantity waiting for Checkout, in the order added
+        self.balance_enrolment_no = None # Student shown in the Student Balance panel
+        self.search_uses_fts = None # Decides how live filters match in memory; None until the database is open
+        self._database_open = False
+        self._loaded_tabs = set() # Tabs whose data has been loaded (see load_tab)
+
+        # All database access from the handlers goes through this background worker
+        # The service client can't abort a request in flight; superseded results are still dropped
+        self.db_worker = DBWorker(root, on_busy_change=self.set_busy, on_error=self.show_db_error,
+                                  interrupt=getattr(self.db, "interrupt_thread", None))
 
         self.create_stock_widgets()
         self.create_transaction_widgets()
-
-        self.refresh_stock_view()
-        self.refresh_transaction_view()
-        self.populate_course_code_combobox()
+        self.create_report_widgets()
+        self.create_diagnostics_widgets()
+        # The rows behind each tree's items (see row_store.py); transactions keep their hidden stock_id too
+        self.tree_rows = {self.stock_tree: RowStore(), self.trans_tree: RowStore(TransactionRecord)}
+
+        self.busy_label = ttk.Label(root, text="", anchor="e")
+        self.busy_label.pack(fill="x", padx=10, pady=(0, 5))
+
+        # Nothing above touched the database, so the window paints straight away
+        self.db_worker.submit(self._open_database, callback=self._database_opened)
+
+    # --- Startup ---
+    # The worker opens the database after the window is up (the schema check is a single PRAGMA
+    # read when it is current), then loads the visible tab and runs the daily maintenance.
+    # Other tabs load the first time they are shown.
+    def _open_database(self):
+        # Runs on the worker thread
+        self.db.create_tables(maintenance=False)
+        return self.db.search_uses_fts()
+
+    def _database_opened(self, search_uses_fts):
+        self.search_uses_fts = search_uses_fts
+        self._database_open = True
+        self.load_tab(self.notebook.select())
+        self.db_worker.submit(self.db.run_maintenance) # Queued behind the visible tab's queries
+
+    def load_tab(self, tab):
+        # Fill a tab with data the first time it is shown
+        tab = str(tab)
+        if not self._database_open or tab in self._loaded_tabs:
+            return
+        self._loaded_tabs.add(tab)
+        if tab == str(self.stock_tab):
+            self.refresh_stock_view()
+        elif tab == str(self.transactions_tab):
+            self.refresh_transaction_view() # Its first page clears the form, which fills the course codes
+
+    def on_close(self):
+        self.db_worker.shutdown() # Let the running query finish; queued ones are dropped
+        self.db.close_db() # Roll back anything pending and close every DB connection
+        self.root.destroy()
+
+    def set_busy(self, busy):
+        self.busy_label.config(text="Working..." if busy else "")
+        self.root.config(cursor="watch" if busy else "")
+
+    def show_db_error(self, error):
+        messagebox.showerror("Database Error", str(error))
+
+    # --- Tree Helpers ---
+    # Tree item ids are the DB row ids and tree_rows holds the full row behind each item, so
+    # refreshes only touch the items that changed and keep scroll position and selection.
+    # Rows are whole listing rows with the DB id first; fields past the tree's columns are not shown.
+    def _display_values(self, tree, row):
+        values = row[:len(tree["columns"])]
+        if tree is self.trans_tree: # transaction_time arrives as epoch milliseconds
+            values = values[:5] + (timestamps.format_timestamp(values[5]),) + values[6:]
+        return values
+
+    def sync_tree(self, tree, rows):
+        store = self.tree_rows[tree]
+        wanted = [str(row[0]) for row in rows]
+        wanted_set = set(wanted)
+        stale = [iid for iid in store if iid not in wanted_set]
+        if stale:
+            tree.delete(*stale)
+            for iid in stale:
+                store.remove(iid)
+        # Inserts and deletes keep the survivors' relative order; only a re-sort needs moves
+        reordered = list(tree.get_children()) != [iid for iid in wanted if iid in store]
+        for index, (iid, row) in enumerate(zip(wanted, rows)):
+            row = tuple(row)
+            if iid not in store:
+                tree.insert("", index, iid=iid, values=self._display_values(tree, row))
+            else:
+                if store.get(iid) != row:
+                    tree.item(iid, values=self._display_values(tree, row))
+                if reordered:
+                    tree.move(iid, "", index)
+            store.put(iid, row)
+
+    def upsert_tree_row(self, tree, row, index="end"):
+        # Insert or update one item; index (if given for an existing item) moves it there
+        iid = str(row[0])
+        row = tuple(row)
+        store = self.tree_rows[tree]
+        if iid in store:
+            if store.get(iid) != row:
+                tree.item(iid, values=self._display_values(tree, row))
+            if index != "end" and tree.index(iid) != index:
+                tree.move(iid, "", index)
+        else:
+            tree.insert("", index, iid=iid, values=self._display_values(tree, row))
+        store.put(iid, row)
+
+    def remove_tree_rows(self, tree, iids):
+        store = self.tree_rows[tree]
+        iids = [str(iid) for iid in iids if str(iid) in store]
+        if iids:
+            tree.delete(*iids)
+            for iid in iids:
+                store.remove(iid)
+
+    # --- Live Filtering ---
+    # Filters apply as the user types. A filter that narrows the one on screen is applied to the
+    # rows already in the tree straight away; any other change goes to the database once typing
+    # pauses, superseding (and interrupting) the query still running for the previous one.
+    def _debounce(self, name, func=None):
+        # Run func after FILTER_DEBOUNCE_MS unless called again for name first; func=None just cancels
+        pending = self._debounced.pop(name, None)
+        if pending is not None:
+            self.root.after_cancel(pending)
+        if func is not None:
+            def run():
+                del self._debounced[name]
+                func()
+            self._debounced[name] = self.root.after(self.FILTER_DEBOUNCE_MS, run)
+
+    def _active(self, filters):
+        return {key: value for key, value in (filters or {}).items() if value}
+
+    # --- Sorting ---
+    # Clicking a sortable heading orders the listing by that column; clicking it again reverses
+    # it. The ORDER BY runs in the database, so a sorted log is still read a page at a time, and
+    # filtering (live narrowing included) keeps whatever order is shown.
+    def _make_sortable(self, tree, headings, sort, command):
+        for column, sort_by in headings.items():
+            tree.heading(column, command=lambda sort_by=sort_by: command(sort_by))
+        self._mark_sort(tree, headings, sort)
+
+    def _mark_sort(self, tree, headings, sort):
+        # Show the direction on the sorted heading
+        sort_by, descending = sort
+        for column, name in headings.items():
+            text = tree.heading(column, "text").rstrip(" ▲▼")
+            if name == sort_by:
+                text += " ▼" if descending else " ▲"
+            tree.heading(column, text=text)
+
+    def _next_sort(self, sort, sort_by):
+        # The same column again reverses it; a new one starts ascending, except time (newest first)
+        if sort[0] == sort_by:
+            return sort_by, not sort[1]
+        return sort_by, sort_by == "transaction_time"
+
+    @timed_action
+    def sort_stock_view(self, sort_by):
+        self.stock_sort = self._next_sort(self.stock_sort, sort_by)
+        self._mark_sort(self.stock_tree, self.STOCK_SORT_HEADINGS, self.stock_sort)
+        self.refresh_stock_view(filters=self.stock_filters)
+
+    @timed_action
+    def sort_transaction_view(self, sort_by):
+        self.trans_sort = self._next_sort(self.trans_sort, sort_by)
+        self._mark_sort(self.trans_tree, self.TRANS_SORT_HEADINGS, self.trans_sort)
+        self.refresh_transaction_view(filters=self.trans_filters) # Back to the first page of the new order
 
 
     # --- Stock Tab ---
@@ -55,6 +263,9 @@ class InventoryApp:
         ttk.Label(filter_frame_stock, text="Language:").grid(row=0, column=4, padx=5, pady=5, sticky="w")
         self.stock_filter_language = ttk.Entry(filter_frame_stock, width=15)
         self.stock_filter_language.grid(row=0, column=5, padx=5, pady=5)
+        for entry in (self.stock_filter_course_code, self.stock_filter_title, self.stock_filter_language):
+            entry.bind("<KeyRelease>", self.on_stock_filter_changed)
+            entry.bind("<Return>", lambda event: self.filter_stock_view())
 
         ttk.Button(filter_frame_stock, text="Filter", command=self.filter_stock_view).grid(row=0, column=6, padx=10, pady=5)
         ttk.Button(filter_frame_stock, text="Clear Filters", command=self.clear_stock_filters_and_refresh).grid(row=0, column=7, padx=5, pady=5)
@@ -81,6 +292,7 @@ class InventoryApp:
         stock_scrollbar.pack(side="right", fill="y")
         self.stock_tree.pack(fill="both", expand=True)
         self.stock_tree.bind("<<TreeviewSelect>>", self.on_stock_select)
+        self._make_sortable(self.stock_tree, self.STOCK_SORT_HEADINGS, self.stock_sort, self.sort_stock_view)
 
         # --- Form Frame ---
         form_frame_stock = ttk.LabelFrame(self.stock_tab, text="Manage Stock Item", padding=10)
@@ -116,19 +328,46 @@ class InventoryApp:
         ttk.Button(button_frame_stock, text="Clear Form", command=self.clear_stock_form).pack(side="left", padx=5)
         ttk.Button(button_frame_stock, text="Refresh View", command=self.refresh_stock_view).pack(side="right", padx=5)
 
+    @timed_action
     def clear_stock_filters_and_refresh(self):
+        self._debounce("stock_filter")
         self.stock_filter_course_code.delete(0, tk.END)
         self.stock_filter_title.delete(0, tk.END)
         self.stock_filter_language.delete(0, tk.END)
         self.refresh_stock_view()
 
-    def filter_stock_view(self):
-        filters = {
+    def _stock_filter_values(self):
+        return {
             "course_code": self.stock_filter_course_code.get(),
             "title": self.stock_filter_title.get(),
             "language": self.stock_filter_language.get()
         }
-        self.refresh_stock_view(filters=filters)
+
+    @timed_action
+    def filter_stock_view(self):
+        self._debounce("stock_filter")
+        self.refresh_stock_view(filters=self._stock_filter_values())
+
+    def on_stock_filter_changed(self, event=None):
+        filters = self._stock_filter_values()
+        if self._active(filters) == self._active(self.stock_filters):
+            return # e.g. a cursor key
+        if self.search_uses_fts is not None and live_filter.narrows(self.stock_shown_filters, filters):
+            predicate = live_filter.stock_predicate(filters, self.search_uses_fts)
+            if predicate is not None:
+                self._debounce("stock_filter")
+                self.narrow_stock_view(filters, predicate)
+                return
+        self._debounce("stock_filter", self.filter_stock_view)
+
+    def narrow_stock_view(self, filters, predicate):
+        # Every row the narrower filter matches is already shown: just drop the others
+        refreshing = self.db_worker.has_pending("stock_view")
+        store = self.tree_rows[self.stock_tree]
+        self.sync_tree(self.stock_tree, [row for row in map(store.get, self.stock_tree.get_children()) if predicate(row)])
+        self.stock_filters = self.stock_shown_filters = filters
+        if refreshing: # The shown rows were about to be replaced (e.g. after a write); confirm them
+            self.refresh_stock_view(filters=filters)
 
     def on_stock_select(self, event=None):
         selected_items = self.stock_tree.selection()
@@ -137,8 +376,7 @@ class InventoryApp:
             self.clear_stock_form(clear_selection=False) # Don't reset selected_stock_id again
             return
 
-        item = self.stock_tree.item(selected_items[0])
-        values = item['values']
+        values = self.tree_rows[self.stock_tree].get(selected_items[0]) # The row as loaded, not Tk's string copy
         
         self.selected_stock_id = values[0]
         self.stock_course_code_entry.delete(0, tk.END)
@@ -161,15 +399,41 @@ class InventoryApp:
                 self.stock_tree.selection_remove(self.stock_tree.selection()[0])
 
 
+    @timed_action
     def refresh_stock_view(self, filters=None):
-        for item in self.stock_tree.get_children():
-            self.stock_tree.delete(item)
-        
-        stock_data = db.get_all_stock(filters=filters)
-        for row in stock_data:
-            self.stock_tree.insert("", "end", values=row)
-        self.populate_course_code_combobox() # Update combobox in transaction tab
+        self.stock_filters = filters
+        def show(stock_data):
+            self.sync_tree(self.stock_tree, stock_data)
+            self.stock_shown_filters = filters or {}
+        # A newer refresh supersedes this one (interrupting its query) if it hasn't finished yet
+        sort_by, descending = self.stock_sort
+        self.db_worker.submit(self.db.get_all_stock, filters=filters, sort_by=sort_by, descending=descending,
+                              callback=show, key="stock_view", interruptible=True)
+        if str(self.transactions_tab) in self._loaded_tabs:
+            self.populate_course_code_combobox() # Update combobox in transaction tab
+
+    def _filtered(self, filters):
+        return bool(filters) and any(filters.values())
+
+    def show_stock_row(self, row):
+        # Put one fresh stock row in place (sorted by course code) without re-querying the table
+        if self._filtered(self.stock_filters) or self.stock_sort != self.STOCK_DEFAULT_SORT:
+            self.refresh_stock_view(filters=self.stock_filters) # Membership or order may have changed; diff refresh
+            return
+        store = self.tree_rows[self.stock_tree]
+        iid = str(row[0])
+        course_codes = [store.get(item)[1] for item in self.stock_tree.get_children() if item != iid]
+        self.upsert_tree_row(self.stock_tree, row, bisect_left(course_codes, row[1]))
+
+    def update_stock_quantity_row(self, row):
+        # Quantity changes never affect filter membership, so just refresh the visible item
+        if row and str(row[0]) in self.tree_rows[self.stock_tree]:
+            if self.stock_sort[0] == "quantity":
+                self.refresh_stock_view(filters=self.stock_filters) # Its place in the order moved too
+            else:
+                self.upsert_tree_row(self.stock_tree, row)
 
+    @timed_action
     def add_stock_item(self):
         course_code = self.stock_course_code_entry.get()
         title = self.stock_title_entry.get()
@@ -188,14 +452,23 @@ class InventoryApp:
             messagebox.showerror("Input Error", "Quantity must be a valid integer.")
             return
 
-        success, message = db.add_stock(course_code, title, language, quantity)
-        if success:
-            messagebox.showinfo("Success", message)
-            self.refresh_stock_view()
-            self.clear_stock_form()
-        else:
-            messagebox.showerror("Database Error", message)
+        def add_and_fetch():
+            success, message = self.db.add_stock(course_code, title, language, quantity)
+            return success, message, self.db.get_stock_by_name(course_code) if success else None
 
+        def done(result):
+            success, message, row = result
+            if success:
+                messagebox.showinfo("Success", message)
+                if row:
+                    self.show_stock_row(row)
+                self.populate_course_code_combobox() # Update combobox in transaction tab
+                self.clear_stock_form()
+            else:
+                messagebox.showerror("Database Error", message)
+        self.db_worker.submit(add_and_fetch, callback=done)
+
+    @timed_action
     def update_stock_item(self):
         if self.selected_stock_id is None:
             messagebox.showwarning("Selection Error", "Please select a stock item to update.")
@@ -218,27 +491,41 @@ class InventoryApp:
             messagebox.showerror("Input Error", "Quantity must be a valid integer.")
             return
         
-        success, message = db.update_stock(self.selected_stock_id, course_code, title, language, quantity)
-        if success:
-            messagebox.showinfo("Success", message)
-            self.refresh_stock_view()
-            self.clear_stock_form()
-        else:
-            messagebox.showerror("Database Error", message)
+        stock_id = self.selected_stock_id
+        def update_and_fetch():
+            success, message = self.db.update_stock(stock_id, course_code, title, language, quantity)
+            return success, message, self.db.get_stock_by_id(stock_id) if success else None
+
+        def done(result):
+            success, message, row = result
+            if success:
+                messagebox.showinfo("Success", message)
+                if row:
+                    self.show_stock_row(row)
+                self.populate_course_code_combobox() # Course code may have changed
+                self.clear_stock_form()
+            else:
+                messagebox.showerror("Database Error", message)
+        self.db_worker.submit(update_and_fetch, callback=done)
             
+    @timed_action
     def delete_stock_item(self):
         if self.selected_stock_id is None:
             messagebox.showwarning("Selection Error", "Please select a stock item to delete.")
             return
         
         if messagebox.askyesno("Confirm Delete", "Are you sure you want to delete this stock item?"):
-            success, message = db.delete_stock(self.selected_stock_id)
-            if success:
-                messagebox.showinfo("Success", message)
-                self.refresh_stock_view()
-                self.clear_stock_form()
-            else:
-                messagebox.showerror("Error", message)
+            stock_id = self.selected_stock_id
+            def done(result):
+                success, message = result
+                if success:
+                    messagebox.showinfo("Success", message)
+                    self.clear_stock_form()
+                    self.remove_tree_rows(self.stock_tree, [stock_id])
+                    self.populate_course_code_combobox() # Update combobox in transaction tab
+                else:
+                    messagebox.showerror("Error", message)
+            self.db_worker.submit(self.db.delete_stock, stock_id, callback=done)
 
     # --- Transaction Tab ---
     def create_transaction_widgets(self):
@@ -257,9 +544,28 @@ class InventoryApp:
         ttk.Label(filter_frame_trans, text="Action (in/out):").grid(row=0, column=4, padx=5, pady=5, sticky="w")
         self.trans_filter_action = ttk.Combobox(filter_frame_trans, values=["", "in", "out"], width=8, state="readonly")
         self.trans_filter_action.grid(row=0, column=5, padx=5, pady=5)
+        self.trans_filter_action.bind("<<ComboboxSelected>>", self.on_transaction_filter_changed)
+        for entry in (self.trans_filter_course_code, self.trans_filter_enrolment_no):
+            entry.bind("<KeyRelease>", self.on_transaction_filter_changed)
+            entry.bind("<Return>", lambda event: self.filter_transaction_view())
         
-        ttk.Button(filter_frame_trans, text="Filter", command=self.filter_transaction_view).grid(row=0, column=6, padx=10, pady=5)
-        ttk.Button(filter_frame_trans, text="Clear Filters", command=self.clear_transaction_filters_and_refresh).grid(row=0, column=7, padx=5, pady=5)
+        self.trans_include_archive = tk.BooleanVar(value=False)
+        ttk.Checkbutton(filter_frame_trans, text="Include archive", variable=self.trans_include_archive,
+                        command=self.on_transaction_filter_changed).grid(row=0, column=6, padx=5, pady=5)
+
+        ttk.Button(filter_frame_trans, text="Filter", command=self.filter_transaction_view).grid(row=0, column=7, padx=10, pady=5)
+        ttk.Button(filter_frame_trans, text="Clear Filters", command=self.clear_transaction_filters_and_refresh).grid(row=0, column=8, padx=5, pady=5)
+
+        # Both days inclusive; the range is read off the transaction_time index
+        ttk.Label(filter_frame_trans, text="From (YYYY-MM-DD):").grid(row=1, column=0, padx=5, pady=5, sticky="w")
+        self.trans_filter_date_from = ttk.Entry(filter_frame_trans, width=20)
+        self.trans_filter_date_from.grid(row=1, column=1, padx=5, pady=5)
+        ttk.Label(filter_frame_trans, text="To (YYYY-MM-DD):").grid(row=1, column=2, padx=5, pady=5, sticky="w")
+        self.trans_filter_date_to = ttk.Entry(filter_frame_trans, width=15)
+        self.trans_filter_date_to.grid(row=1, column=3, padx=5, pady=5)
+        for entry in (self.trans_filter_date_from, self.trans_filter_date_to):
+            entry.bind("<KeyRelease>", self.on_transaction_filter_changed) # Applied once the date is complete
+            entry.bind("<Return>", lambda event: self.filter_transaction_view())
 
 
         # --- Treeview Frame ---
@@ -287,11 +593,12 @@ class InventoryApp:
         self.trans_tree.column("Remarks", width=100)
         self.trans_tree.column("Phone", width=100)
         
-        trans_scrollbar = ttk.Scrollbar(tree_frame_trans, orient="vertical", command=self.trans_tree.yview)
-        self.trans_tree.configure(yscrollcommand=trans_scrollbar.set)
-        trans_scrollbar.pack(side="right", fill="y")
+        self.trans_scrollbar = ttk.Scrollbar(tree_frame_trans, orient="vertical", command=self.trans_tree.yview)
+        self.trans_tree.configure(yscrollcommand=self.on_transaction_scroll) # Pages rows in/out as the view moves
+        self.trans_scrollbar.pack(side="right", fill="y")
         self.trans_tree.pack(fill="both", expand=True)
         self.trans_tree.bind("<<TreeviewSelect>>", self.on_transaction_select)
+        self._make_sortable(self.trans_tree, self.TRANS_SORT_HEADINGS, self.trans_sort, self.sort_transaction_view)
 
         # --- Form Frame ---
         form_frame_trans = ttk.LabelFrame(self.transactions_tab, text="Manage Transaction", padding=10)
@@ -329,6 +636,39 @@ class InventoryApp:
         form_frame_trans.columnconfigure(1, weight=1)
         form_frame_trans.columnconfigure(3, weight=1)
 
+        # --- Cart and Student Balance Frames ---
+        lower_frame_trans = ttk.Frame(self.transactions_tab)
+        lower_frame_trans.pack(fill="x", padx=10, pady=5)
+        # Several books for the student in the form, recorded together by Checkout
+        cart_frame = ttk.LabelFrame(lower_frame_trans, text="Cart", padding=10)
+        cart_frame.pack(side="left", fill="both", expand=True, padx=(0, 5))
+        self.cart_list = tk.Listbox(cart_frame, height=4)
+        self.cart_list.pack(side="left", fill="x", expand=True, padx=5)
+        cart_buttons = ttk.Frame(cart_frame)
+        cart_buttons.pack(side="left", padx=5)
+        ttk.Button(cart_buttons, text="Add to Cart", command=self.add_to_cart).pack(fill="x", pady=1)
+        ttk.Button(cart_buttons, text="Remove from Cart", command=self.remove_from_cart).pack(fill="x", pady=1)
+        ttk.Button(cart_buttons, text="Checkout Cart", command=self.checkout_cart).pack(fill="x", pady=1)
+
+        # What a student still holds, read from the student_balance ledger (see balances.py)
+        balance_frame = ttk.LabelFrame(lower_frame_trans, text="Student Balance", padding=10)
+        balance_frame.pack(side="left", fill="both", expand=True, padx=(5, 0))
+        balance_bar = ttk.Frame(balance_frame)
+        balance_bar.pack(fill="x")
+        ttk.Label(balance_bar, text="Enrolment No:").pack(side="left", padx=5)
+        self.balance_enrolment_entry = ttk.Entry(balance_bar, width=15)
+        self.balance_enrolment_entry.pack(side="left", padx=5)
+        self.balance_enrolment_entry.bind("<Return>", lambda event: self.show_student_balance())
+        ttk.Button(balance_bar, text="Show Outstanding", command=self.show_student_balance).pack(side="left", padx=5)
+        self.balance_status_label = ttk.Label(balance_bar, text="")
+        self.balance_status_label.pack(side="left", padx=5)
+        self.balance_tree = ttk.Treeview(balance_frame, columns=("Course Code", "Title", "Outstanding", "Last Issued"),
+                                         show="headings", height=3)
+        for column, width in (("Course Code", 120), ("Title", 180), ("Outstanding", 80), ("Last Issued", 130)):
+            self.balance_tree.heading(column, text=column)
+            self.balance_tree.column(column, width=width)
+        self.balance_tree.pack(fill="both", expand=True, pady=(5, 0))
+
         # --- Button Frame ---
         button_frame_trans = ttk.Frame(self.transactions_tab, padding=5)
         button_frame_trans.pack(fill="x", padx=10, pady=5)
@@ -337,31 +677,91 @@ class InventoryApp:
         ttk.Button(button_frame_trans, text="Update Selected (Details)", command=self.update_transaction_item).pack(side="left", padx=5)
         ttk.Button(button_frame_trans, text="Delete Selected", command=self.delete_transaction_item).pack(side="left", padx=5)
         ttk.Button(button_frame_trans, text="Clear Form", command=self.clear_transaction_form).pack(side="left", padx=5)
+        ttk.Button(button_frame_trans, text="Import CSV...", command=self.open_import_dialog).pack(side="left", padx=5)
+        ttk.Button(button_frame_trans, text="Export...", command=self.open_export_dialog).pack(side="left", padx=5)
         ttk.Button(button_frame_trans, text="Refresh View", command=self.refresh_transaction_view).pack(side="right", padx=5)
 
+    @timed_action
     def clear_transaction_filters_and_refresh(self):
+        self._debounce("transaction_filter")
         self.trans_filter_course_code.delete(0, tk.END)
         self.trans_filter_enrolment_no.delete(0, tk.END)
         self.trans_filter_action.set("")
+        self.trans_filter_date_from.delete(0, tk.END)
+        self.trans_filter_date_to.delete(0, tk.END)
+        self.trans_include_archive.set(False)
         self.refresh_transaction_view()
 
-    def filter_transaction_view(self):
-        filters = {
+    def _transaction_filter_values(self):
+        return {
             "course_code": self.trans_filter_course_code.get(),
             "enrolment_no": self.trans_filter_enrolment_no.get(),
-            "action": self.trans_filter_action.get()
+            "action": self.trans_filter_action.get(),
+            "date_from": self.trans_filter_date_from.get().strip(),
+            "date_to": self.trans_filter_date_to.get().strip()
             # Add more filters here if needed, e.g., name, remarks
         }
+
+    def _dates_valid(self, filters):
+        try:
+            for key in ("date_from", "date_to"):
+                if filters.get(key):
+                    timestamps.bound(filters[key])
+        except ValueError:
+            return False
+        return True
+
+    @timed_action
+    def filter_transaction_view(self):
+        self._debounce("transaction_filter")
+        filters = self._transaction_filter_values()
+        if not self._dates_valid(filters):
+            messagebox.showerror("Input Error", "Dates must be YYYY-MM-DD (optionally followed by HH:MM:SS).")
+            return
         self.refresh_transaction_view(filters=filters)
 
+    def on_transaction_filter_changed(self, event=None):
+        filters = self._transaction_filter_values()
+        if not self._dates_valid(filters):
+            return # A date still being typed; wait until it is complete
+        include_archive = self.trans_include_archive.get()
+        if self._active(filters) == self._active(self.trans_filters) and include_archive == self.trans_archive:
+            return # e.g. a cursor key
+        # Archived rows are matched with LIKE even when the hot log uses FTS, and the tree doesn't
+        # say which rows came from where, so views including the archive always re-query
+        if (self.search_uses_fts is not None and live_filter.narrows(self.trans_shown_filters, filters)
+                and not include_archive and not self.trans_archive):
+            predicate = live_filter.transaction_predicate(filters, self.search_uses_fts)
+            if predicate is not None:
+                self._debounce("transaction_filter")
+                self.narrow_transaction_view(filters, predicate)
+                return
+        self._debounce("transaction_filter", self.filter_transaction_view)
+
+    def narrow_transaction_view(self, filters, predicate):
+        # Drop the loaded rows the narrower filter excludes. Each page keeps its keys, so scrolling
+        # past the window still fetches exactly the matching rows beyond it.
+        refreshing = self.db_worker.has_pending("transaction_view")
+        store = self.tree_rows[self.trans_tree]
+        excluded = {iid for iid in store if not predicate(store.get(iid))}
+        for item_ids, _, _ in self.trans_pages:
+            item_ids[:] = [iid for iid in item_ids if iid not in excluded]
+        self.remove_tree_rows(self.trans_tree, excluded)
+        self.trans_filters = self.trans_shown_filters = filters
+        if refreshing: # The window was about to change (a refresh or a page load); reload it
+            self.refresh_transaction_view(filters=filters)
+
     def populate_course_code_combobox(self):
-        stock_items = db.get_all_stock()
-        course_codes = [item[1] for item in stock_items] # item[1] is course_code
-        self.trans_course_code_combo['values'] = course_codes
-        if course_codes:
-            self.trans_course_code_combo.set(course_codes[0]) # Default to first book
-        else:
-            self.trans_course_code_combo.set("")
+        def show(course_codes):
+            self.trans_course_code_combo['values'] = course_codes
+            if self.selected_transaction_id is not None:
+                return # The form is showing a selected transaction; keep its course code
+            if course_codes:
+                self.trans_course_code_combo.set(course_codes[0]) # Default to first book
+            else:
+                self.trans_course_code_combo.set("")
+        # Served from the in-memory stock catalog, so repopulating after every form clear is cheap
+        self.db_worker.submit(self.db.get_course_codes, callback=show, key="course_codes")
 
 
     def on_transaction_select(self, event=None):
@@ -372,22 +772,14 @@ class InventoryApp:
             self.clear_transaction_form(clear_selection=False)
             return
 
-        item = self.trans_tree.item(selected_items[0])
-        values = item['values'] # (Trans ID, Course Code, Enrolment No, Action, Qty, Datetime, Name, Remarks, Phone)
-                                # The get_all_transactions also returns stock_id as the last (hidden) element if needed.
-                                # For now, we fetch transaction by ID to get all details including stock_id for updates.
-        
-        self.selected_transaction_id = values[0]
-        
-        # Fetch full transaction data to get stock_id and ensure data consistency
-        # The treeview might not have stock_id directly visible or easily accessible for logic
-        full_trans_data = db.get_transaction_by_id(self.selected_transaction_id)
-        # full_trans_data: (trans_id, stock_id, course_code, enrolment_no, action, quantity, ...)
-        if not full_trans_data:
-            messagebox.showerror("Error", "Could not retrieve transaction details.")
-            self.clear_transaction_form()
-            return
+        # The row store has every field, including the stock_id the tree doesn't show, so selecting
+        # (or arrowing through the log) needs no query
+        record = self.tree_rows[self.trans_tree].record(selected_items[0])
+        self.selected_transaction_id = record.id
+        self.show_selected_transaction(record.as_detail())
 
+    def show_selected_transaction(self, full_trans_data):
+        # full_trans_data: (trans_id, stock_id, course_code, enrolment_no, action, quantity, ...)
         self.selected_transaction_stock_id = full_trans_data[1] # stock_id
 
         self.trans_course_code_combo.set(full_trans_data[2]) # Course Code
@@ -428,18 +820,150 @@ class InventoryApp:
         self.trans_name_entry.delete(0, tk.END)
         self.trans_remarks_entry.delete(0, tk.END)
         self.trans_phone_entry.delete(0, tk.END)
+        # A fresh form is a new request; until then a repeated Add resubmits the same one
+        self.trans_request_key = uuid.uuid4().hex
 
 
+    @timed_action
     def refresh_transaction_view(self, filters=None):
-        for item in self.trans_tree.get_children():
-            self.trans_tree.delete(item)
-        
-        transaction_data = db.get_all_transactions(filters=filters)
-        for row in transaction_data:
-            # The last element row[-1] is stock_id, we don't display it directly in main columns
-            self.trans_tree.insert("", "end", values=row[:-1]) 
+        # Reload from the newest row; only a bounded window of pages is ever held in the tree
+        self.trans_filters = filters
+        self.trans_archive = self.trans_include_archive.get()
+        self._trans_paging = True # No scroll paging until the first page has replaced the old rows
+        sort_by, descending = self.trans_sort
+        self.db_worker.submit(self.db.get_transactions_page, filters, limit=self.TRANS_PAGE_SIZE,
+                              include_archive=self.trans_archive, sort_by=sort_by, descending=descending,
+                              callback=self._show_first_transaction_page, error_callback=self._transaction_page_failed,
+                              key="transaction_view", interruptible=True)
+
+    def _show_first_transaction_page(self, page):
+        self._trans_paging = False
+        rows, first_key, last_key = page
+        # The last element row[-1] is stock_id; the tree doesn't show it but the row store keeps it
+        self.sync_tree(self.trans_tree, rows)
+        self.trans_shown_filters = self.trans_filters or {}
+        self.trans_pages = deque() # (item ids, first_key, last_key) per loaded page, newest first
+        if rows:
+            self.trans_pages.append(([str(row[0]) for row in rows], first_key, last_key))
+        self.trans_at_newest = True # No newer rows than the first loaded page
+        self.trans_at_oldest = len(rows) < self.TRANS_PAGE_SIZE # No older rows than the last loaded page
         self.clear_transaction_form() # Clear form and selection after refresh
 
+    @timed_action
+    def _load_transaction_page(self, older):
+        # Fetch the page adjacent to the loaded window; shares the refresh key so a refresh supersedes it
+        if older:
+            keys = {"after": self.trans_pages[-1][2]}
+        else:
+            keys = {"before": self.trans_pages[0][1]}
+        sort_by, descending = self.trans_sort
+        self.db_worker.submit(self.db.get_transactions_page, self.trans_filters, limit=self.TRANS_PAGE_SIZE, **keys,
+                              include_archive=self.trans_archive, sort_by=sort_by, descending=descending,
+                              callback=lambda page: self._show_transaction_page(older, page),
+                              error_callback=self._transaction_page_failed, key="transaction_view", interruptible=True)
+
+    def _transaction_page_failed(self, error):
+        self._trans_paging = False
+        self.show_db_error(error)
+
+    def _show_transaction_page(self, older, page):
+        # Insert a fetched page at the matching end, then evict the far end if over budget
+        self._trans_paging = False
+        rows, first_key, last_key = page
+        if len(rows) < self.TRANS_PAGE_SIZE:
+            if older:
+                self.trans_at_oldest = True
+            else:
+                self.trans_at_newest = True
+        if not rows:
+            return
+
+        # Remember the row at the top of the view so evicting/prepending rows doesn't make it jump
+        children = self.trans_tree.get_children()
+        anchor = children[min(int(self.trans_tree.yview()[0] * len(children)), len(children) - 1)] if children else None
+        # Skip rows already shown (e.g. added locally just before this page was fetched)
+        store = self.tree_rows[self.trans_tree]
+        rows = [row for row in rows if str(row[0]) not in store]
+        if older:
+            for row in rows:
+                self.upsert_tree_row(self.trans_tree, row)
+            self.trans_pages.append(([str(row[0]) for row in rows], first_key, last_key))
+        else:
+            for index, row in enumerate(rows):
+                self.upsert_tree_row(self.trans_tree, row, index)
+            self.trans_pages.appendleft(([str(row[0]) for row in rows], first_key, last_key))
+
+        if len(self.trans_pages) > self.TRANS_MAX_PAGES:
+            evict_index = 0 if older else -1
+            evicted_ids = self.trans_pages[evict_index][0]
+            selection = set(self.trans_tree.selection())
+            if not selection.intersection(evicted_ids): # Never evict the row being edited
+                if older:
+                    self.trans_pages.popleft()
+                    self.trans_at_newest = False
+                else:
+                    self.trans_pages.pop()
+                    self.trans_at_oldest = False
+                self.remove_tree_rows(self.trans_tree, evicted_ids)
+
+        if anchor and self.trans_tree.exists(anchor):
+            self.trans_tree.yview_moveto(self.trans_tree.index(anchor) / max(len(self.trans_tree.get_children()), 1))
+
+    def on_transaction_scroll(self, first, last):
+        # yscrollcommand for trans_tree: update the scrollbar and prefetch pages near either edge
+        self.trans_scrollbar.set(first, last)
+        if self._trans_paging or not self.trans_pages:
+            return
+        first, last = float(first), float(last)
+        if last >= 1.0 - self.TRANS_PREFETCH_FRACTION and not self.trans_at_oldest:
+            older = True
+        elif first <= self.TRANS_PREFETCH_FRACTION and not self.trans_at_newest:
+            older = False
+        else:
+            return
+        self._trans_paging = True # Cleared when the page arrives
+        self._load_transaction_page(older)
+
+    def _trans_needs_refresh(self):
+        # New rows go on top of the newest-first listing; filtered or re-sorted, re-read the window
+        return self._filtered(self.trans_filters) or self.trans_sort != self.TRANS_DEFAULT_SORT
+
+    def show_new_transaction_rows(self, rows):
+        # Several (row, key) pairs from one write, oldest first: at most one refresh
+        if self._trans_needs_refresh():
+            self.refresh_transaction_view(filters=self.trans_filters)
+            return
+        for row, key in rows:
+            if row:
+                self.show_new_transaction_row(row, key)
+
+    def show_new_transaction_row(self, row, key):
+        # A new transaction is the newest row: show it on top if the window starts at the newest
+        if self._trans_needs_refresh():
+            self.refresh_transaction_view(filters=self.trans_filters) # May not match the filters, or go elsewhere
+            return
+        if not self.trans_at_newest:
+            return # Paging back up to the top will fetch it
+        iid = str(row[0])
+        shown = self.trans_tree.exists(iid) # Already there if this add was a repeated request
+        self.upsert_tree_row(self.trans_tree, row, 0)
+        if shown:
+            return
+        if self.trans_pages:
+            item_ids, _, last_key = self.trans_pages[0]
+            self.trans_pages[0] = ([iid] + item_ids, key, last_key)
+        else:
+            self.trans_pages.append(([iid], key, key))
+
+    def remove_transaction_row(self, transaction_id):
+        iid = str(transaction_id)
+        for item_ids, _, _ in self.trans_pages:
+            if iid in item_ids:
+                item_ids.remove(iid)
+                break
+        self.remove_tree_rows(self.trans_tree, [iid])
+
+    @timed_action
     def add_transaction_item(self):
         course_code_selected = self.trans_course_code_combo.get()
         action = self.trans_action_combo.get()
@@ -462,21 +986,257 @@ class InventoryApp:
             messagebox.showerror("Input Error", "Quantity must be a valid integer.")
             return
 
-        stock_item = db.get_stock_by_name(course_code_selected)
-        if not stock_item:
-            messagebox.showerror("Input Error", f"Stock item '{course_code_selected}' not found.")
+        request_key = self.trans_request_key
+
+        def lookup_and_add():
+            # Runs on the worker thread: both DB calls happen back to back without a Tk round trip
+            stock_item = self.db.get_stock_by_name(course_code_selected)
+            if not stock_item:
+                return None
+            stock_id = stock_item[0]
+            success, message, transaction_id = self.db.add_transaction(stock_id, enrolment_no, action, quantity, name, remarks, phone,
+                                                                  return_id=True, request_key=request_key)
+            if not success:
+                return success, message, None, None, None
+            # Fetch just the two rows that changed, not the whole log and stock table
+            row, key = self.db.get_transaction_row(transaction_id)
+            return success, message, row, key, self.db.get_stock_by_id(stock_id)
+
+        def done(result):
+            if result is None:
+                messagebox.showerror("Input Error", f"Stock item '{course_code_selected}' not found.")
+                return
+            success, message, row, key, stock_row = result
+            if success:
+                messagebox.showinfo("Success", message)
+                if row:
+                    self.show_new_transaction_row(row, key)
+                self.update_stock_quantity_row(stock_row) # Stock quantity changed
+                self.refresh_student_balance()
+                self.clear_transaction_form()
+            else:
+                messagebox.showerror("Error", message)
+        self.db_worker.submit(lookup_and_add, callback=done)
+
+    # --- Cart ---
+    def add_to_cart(self):
+        course_code = self.trans_course_code_combo.get()
+        quantity_str = self.trans_quantity_entry.get()
+        if not course_code or not quantity_str:
+            messagebox.showerror("Input Error", "Course Code and Quantity are required.")
             return
-        stock_id = stock_item[0]
+        try:
+            quantity = int(quantity_str)
+            if quantity <= 0:
+                messagebox.showerror("Input Error", "Quantity must be a positive integer.")
+                return
+        except ValueError:
+            messagebox.showerror("Input Error", "Quantity must be a valid integer.")
+            return
+        self.cart[course_code] = self.cart.get(course_code, 0) + quantity # The same book twice is one line
+        self.show_cart()
+        self.trans_quantity_entry.delete(0, tk.END)
 
-        success, message = db.add_transaction(stock_id, enrolment_no, action, quantity, name, remarks, phone)
-        if success:
+    def remove_from_cart(self):
+        selection = self.cart_list.curselection()
+        if not selection:
+            messagebox.showwarning("Selection Error", "Please select a cart item to remove.")
+            return
+        del self.cart[list(self.cart)[selection[0]]]
+        self.show_cart()
+
+    def show_cart(self):
+        self.cart_list.delete(0, tk.END)
+        for course_code, quantity in self.cart.items():
+            self.cart_list.insert(tk.END, f"{course_code}  x {quantity}")
+
+    @timed_action
+    def checkout_cart(self):
+        if not self.cart:
+            messagebox.showerror("Input Error", "The cart is empty.")
+            return
+        items = list(self.cart.items())
+        action = self.trans_action_combo.get()
+        enrolment_no = self.trans_enrolment_no_entry.get()
+        name = self.trans_name_entry.get()
+        remarks = self.trans_remarks_entry.get()
+        phone = self.trans_phone_entry.get()
+        request_key = self.trans_request_key
+
+        def checkout_and_fetch():
+            # Runs on the worker thread: one commit, then only the rows that changed
+            success, message, transaction_ids = self.db.checkout_cart(items, enrolment_no, name, remarks, phone,
+                                                                      action=action, request_key=request_key)
+            if not success or not transaction_ids:
+                return success, message, None, []
+            rows = [self.db.get_transaction_row(transaction_id) for transaction_id in transaction_ids]
+            stock_ids = dict.fromkeys(row[-1] for row, _ in rows if row)
+            return success, message, rows, [self.db.get_stock_by_id(stock_id) for stock_id in stock_ids]
+
+        def done(result):
+            success, message, rows, stock_rows = result
+            if not success:
+                messagebox.showerror("Checkout Failed", message)
+                return
             messagebox.showinfo("Success", message)
-            self.refresh_transaction_view()
-            self.refresh_stock_view() # Stock quantity changed
+            if rows is None: # A repeated checkout; nothing new to place
+                self.refresh_transaction_view(filters=self.trans_filters)
+                self.refresh_stock_view(filters=self.stock_filters)
+            else:
+                self.show_new_transaction_rows(rows)
+                for stock_row in stock_rows: # Stock quantities changed
+                    self.update_stock_quantity_row(stock_row)
+            self.cart.clear()
+            self.show_cart()
+            self.refresh_student_balance()
             self.clear_transaction_form()
-        else:
-            messagebox.showerror("Error", message)
+        self.db_worker.submit(checkout_and_fetch, callback=done)
+
+    def open_import_dialog(self):
+        dialog = tk.Toplevel(self.root)
+        dialog.title("Import Transactions from CSV")
+        dialog.geometry("600x400")
+        dialog.transient(self.root)
+
+        file_frame = ttk.Frame(dialog, padding=10)
+        file_frame.pack(fill="x")
+        ttk.Label(file_frame, text="CSV File:").pack(side="left", padx=5)
+        path_entry = ttk.Entry(file_frame, width=50)
+        path_entry.pack(side="left", fill="x", expand=True, padx=5)
+
+        def browse():
+            path = filedialog.askopenfilename(parent=dialog, filetypes=[("CSV files", "*.csv"), ("All files", "*.*")])
+            if path:
+                path_entry.delete(0, tk.END)
+                path_entry.insert(0, path)
+        ttk.Button(file_frame, text="Browse...", command=browse).pack(side="left", padx=5)
+
+        ttk.Label(dialog, text="Columns: course_code, action, quantity (required), enrolment_no, name, remarks, phone",
+                  padding=(15, 0)).pack(anchor="w")
+        skip_invalid = tk.BooleanVar(value=False)
+        ttk.Checkbutton(dialog, text="Import valid rows even if some rows are invalid",
+                        variable=skip_invalid, padding=(15, 5)).pack(anchor="w")
+
+        errors_frame = ttk.LabelFrame(dialog, text="Row Errors", padding=5)
+        errors_frame.pack(fill="both", expand=True, padx=10, pady=5)
+        errors_list = tk.Listbox(errors_frame)
+        errors_scrollbar = ttk.Scrollbar(errors_frame, orient="vertical", command=errors_list.yview)
+        errors_list.configure(yscrollcommand=errors_scrollbar.set)
+        errors_scrollbar.pack(side="right", fill="y")
+        errors_list.pack(fill="both", expand=True)
+
+        def run_import():
+            path = path_entry.get()
+            if not path:
+                messagebox.showerror("Input Error", "Please choose a CSV file.", parent=dialog)
+                return
+            self.db_worker.submit(csv_import.import_transactions_csv, path, skip_invalid=skip_invalid.get(),
+                                  source=self.db, callback=show_result)
+
+        def show_result(result):
+            success, message, errors = result
+            errors_list.delete(0, tk.END)
+            for line_number, error in errors:
+                errors_list.insert(tk.END, f"Line {line_number}: {error}")
+            if success:
+                messagebox.showinfo("Import Complete", message, parent=dialog)
+                self.refresh_transaction_view()
+                self.refresh_stock_view() # Stock quantities changed
+            else:
+                messagebox.showerror("Import Failed", message, parent=dialog)
+
+        button_frame = ttk.Frame(dialog, padding=5)
+        button_frame.pack(fill="x", padx=10, pady=5)
+        ttk.Button(button_frame, text="Import", command=run_import).pack(side="left", padx=5)
+        ttk.Button(button_frame, text="Close", command=dialog.destroy).pack(side="right", padx=5)
+
+    def open_export_dialog(self):
+        dialog = tk.Toplevel(self.root)
+        dialog.title("Export Transaction Log")
+        dialog.transient(self.root)
+
+        form = ttk.Frame(dialog, padding=10)
+        form.pack(fill="x")
+        ttk.Label(form, text="From (YYYY-MM-DD):").grid(row=0, column=0, padx=5, pady=2, sticky="w")
+        from_entry = ttk.Entry(form, width=15)
+        from_entry.grid(row=0, column=1, padx=5, pady=2, sticky="w")
+        ttk.Label(form, text="To (YYYY-MM-DD):").grid(row=0, column=2, padx=5, pady=2, sticky="w")
+        to_entry = ttk.Entry(form, width=15)
+        to_entry.grid(row=0, column=3, padx=5, pady=2, sticky="w")
+        from_entry.insert(0, (self.trans_filters or {}).get("date_from", "")) # Start from the view's range
+        to_entry.insert(0, (self.trans_filters or {}).get("date_to", ""))
+        ttk.Label(form, text="Format:").grid(row=1, column=0, padx=5, pady=2, sticky="w")
+        format_combo = ttk.Combobox(form, values=export.FORMATS, width=8, state="readonly")
+        format_combo.set("csv")
+        format_combo.grid(row=1, column=1, padx=5, pady=2, sticky="w")
+        ttk.Label(form, text="Current transaction filters are applied.").grid(row=2, column=0, columnspan=4, padx=5, pady=2, sticky="w")
+
+        progress_bar = ttk.Progressbar(dialog, mode="determinate", maximum=1)
+        progress_bar.pack(fill="x", padx=15, pady=5)
+        status_label = ttk.Label(dialog, text="", padding=(15, 0))
+        status_label.pack(anchor="w")
+
+        # Shared with the export thread; Tk widgets are only touched from poll() on the Tk thread
+        state = {"done": 0, "total": 0, "result": None, "cancel": False, "running": False}
+
+        def on_progress(done, total):
+            state["done"], state["total"] = done, total
+            return not state["cancel"]
+
+        include_archive = self.trans_archive # Export what the view shows
+
+        def run_export(path, fmt, filters):
+            try:
+                state["result"] = (True, export.export_transactions(path, fmt, filters, progress=on_progress,
+                                                                      source=self.db, include_archive=include_archive))
+            except (OSError, ValueError, sqlite3.Error) as e:
+                state["result"] = (False, str(e))
+            finally:
+                self.db.close_thread_db() # This thread's connection is not needed after the export
+
+        def poll():
+            progress_bar.configure(maximum=max(state["total"], 1), value=state["done"])
+            status_label.config(text=f"{state['done']} of {state['total']} rows written")
+            if state["result"] is None:
+                dialog.after(100, poll)
+                return
+            state["running"] = False
+            success, result = state["result"]
+            if not success:
+                messagebox.showerror("Export Failed", result, parent=dialog)
+            elif state["cancel"]:
+                status_label.config(text=f"Cancelled after {result} rows.")
+            else:
+                messagebox.showinfo("Export Complete", f"Exported {result} transactions.", parent=dialog)
+                dialog.destroy()
 
+        def start_export():
+            if state["running"]:
+                return
+            fmt = format_combo.get()
+            path = filedialog.asksaveasfilename(parent=dialog, defaultextension="." + fmt,
+                                                filetypes=[("CSV files", "*.csv"), ("JSON Lines", "*.jsonl"), ("All files", "*.*")])
+            if not path:
+                return
+            filters = dict(self.trans_filters or {})
+            filters["date_from"] = from_entry.get()
+            filters["date_to"] = to_entry.get()
+            state.update(done=0, total=0, result=None, cancel=False, running=True)
+            threading.Thread(target=run_export, args=(path, fmt, filters), daemon=True).start()
+            poll()
+
+        def cancel_or_close():
+            if state["running"]:
+                state["cancel"] = True
+            else:
+                dialog.destroy()
+
+        button_frame = ttk.Frame(dialog, padding=5)
+        button_frame.pack(fill="x", padx=10, pady=5)
+        ttk.Button(button_frame, text="Export...", command=start_export).pack(side="left", padx=5)
+        ttk.Button(button_frame, text="Cancel / Close", command=cancel_or_close).pack(side="right", padx=5)
+
+    @timed_action
     def update_transaction_item(self):
         if self.selected_transaction_id is None:
             messagebox.showwarning("Selection Error", "Please select a transaction to update.")
@@ -491,33 +1251,231 @@ class InventoryApp:
         # Note: Book, Action, Quantity are not updated here to keep stock logic simple.
         # User should delete and re-add if those need to change.
         
-        success, message = db.update_transaction_details(self.selected_transaction_id, enrolment_no, name, remarks, phone)
-        if success:
-            messagebox.showinfo("Success", message)
-            self.refresh_transaction_view()
-            # No need to refresh stock view as only non-quantity affecting details changed
-            self.clear_transaction_form()
-        else:
-            messagebox.showerror("Error", message)
+        transaction_id = self.selected_transaction_id
+        def update_and_fetch():
+            success, message = self.db.update_transaction_details(transaction_id, enrolment_no, name, remarks, phone)
+            return success, message, self.db.get_transaction_row(transaction_id)[0] if success else None
 
+        def done(result):
+            success, message, row = result
+            if success:
+                messagebox.showinfo("Success", message)
+                if self._filtered(self.trans_filters) or self.trans_sort[0] == "enrolment_no":
+                    self.refresh_transaction_view(filters=self.trans_filters) # Row may no longer match, or have moved
+                elif row:
+                    self.upsert_tree_row(self.trans_tree, row)
+                # No need to refresh stock view as only non-quantity affecting details changed
+                self.refresh_student_balance() # The row may have moved to another enrolment no
+                self.clear_transaction_form()
+            else:
+                messagebox.showerror("Error", message)
+        self.db_worker.submit(update_and_fetch, callback=done)
 
+
+    @timed_action
     def delete_transaction_item(self):
         if self.selected_transaction_id is None:
             messagebox.showwarning("Selection Error", "Please select a transaction to delete.")
             return
         
         if messagebox.askyesno("Confirm Delete", "Are you sure you want to delete this transaction? This will also adjust stock levels."):
-            success, message = db.delete_transaction(self.selected_transaction_id)
-            if success:
-                messagebox.showinfo("Success", message)
-                self.refresh_transaction_view()
-                self.refresh_stock_view() # Stock quantity changed
-                self.clear_transaction_form()
+            transaction_id = self.selected_transaction_id
+            stock_id = self.selected_transaction_stock_id
+            def delete_and_fetch():
+                success, message = self.db.delete_transaction(transaction_id)
+                return success, message, self.db.get_stock_by_id(stock_id) if success else None
+
+            def done(result):
+                success, message, stock_row = result
+                if success:
+                    messagebox.showinfo("Success", message)
+                    self.clear_transaction_form()
+                    self.remove_transaction_row(transaction_id)
+                    self.update_stock_quantity_row(stock_row) # Stock quantity changed
+                    self.refresh_student_balance()
+                else:
+                    messagebox.showerror("Error", message)
+            self.db_worker.submit(delete_and_fetch, callback=done)
+
+
+    # --- Student Balance ---
+    @timed_action
+    def show_student_balance(self):
+        enrolment_no = self.balance_enrolment_entry.get().strip()
+        if not enrolment_no:
+            messagebox.showerror("Input Error", "Enter an enrolment number to look up.")
+            return
+        self.balance_enrolment_no = enrolment_no
+        self.refresh_student_balance()
+
+    def refresh_student_balance(self):
+        # Re-read the student the panel shows, e.g. after a write that may change what they hold
+        enrolment_no = self.balance_enrolment_no
+        if enrolment_no is None:
+            return
+        def show(rows):
+            self.balance_tree.delete(*self.balance_tree.get_children())
+            for _, course_code, title, outstanding, last_out in rows:
+                self.balance_tree.insert("", "end", values=(course_code, title, outstanding,
+                                                            timestamps.format_timestamp(last_out)))
+            if rows:
+                text = f"{enrolment_no} holds {sum(row[3] for row in rows)} copies of {len(rows)} items."
             else:
-                messagebox.showerror("Error", message)
+                text = f"{enrolment_no} has nothing out."
+            self.balance_status_label.config(text=text)
+        self.db_worker.submit(self.db.get_outstanding_for_student, enrolment_no, callback=show, key="student_balance")
+
+    # --- Reports Tab ---
+    def create_report_widgets(self):
+        # --- Options Frame ---
+        options_frame = ttk.LabelFrame(self.reports_tab, text="Report", padding=10)
+        options_frame.pack(fill="x", padx=10, pady=5)
+
+        ttk.Label(options_frame, text="Report:").grid(row=0, column=0, padx=5, pady=5, sticky="w")
+        self.report_combo = ttk.Combobox(options_frame, values=list(reports.REPORTS), width=22, state="readonly")
+        self.report_combo.grid(row=0, column=1, padx=5, pady=5)
+        self.report_combo.current(0)
 
+        ttk.Label(options_frame, text="From (YYYY-MM):").grid(row=0, column=2, padx=5, pady=5, sticky="w")
+        self.report_from_entry = ttk.Entry(options_frame, width=10)
+        self.report_from_entry.grid(row=0, column=3, padx=5, pady=5)
+
+        ttk.Label(options_frame, text="To (YYYY-MM):").grid(row=0, column=4, padx=5, pady=5, sticky="w")
+        self.report_to_entry = ttk.Entry(options_frame, width=10)
+        self.report_to_entry.grid(row=0, column=5, padx=5, pady=5)
+
+        ttk.Button(options_frame, text="Run Report", command=self.run_report).grid(row=0, column=6, padx=10, pady=5)
+
+        # --- Treeview Frame ---
+        tree_frame_report = ttk.Frame(self.reports_tab)
+        tree_frame_report.pack(fill="both", expand=True, padx=10, pady=5)
+
+        self.report_tree = ttk.Treeview(tree_frame_report, show="headings")
+        report_scrollbar = ttk.Scrollbar(tree_frame_report, orient="vertical", command=self.report_tree.yview)
+        self.report_tree.configure(yscrollcommand=report_scrollbar.set)
+        report_scrollbar.pack(side="right", fill="y")
+        self.report_tree.pack(fill="both", expand=True)
+
+        self.report_status_label = ttk.Label(self.reports_tab, text="", anchor="w")
+        self.report_status_label.pack(fill="x", padx=10, pady=(0, 5))
+
+    @timed_action
+    def run_report(self):
+        name = self.report_combo.get()
+        date_from = self.report_from_entry.get().strip()
+        date_to = self.report_to_entry.get().strip()
+        self.report_status_label.config(text=f"Running '{name}'...")
+
+        def show(result):
+            columns, rows = result
+            # Columns differ per report, so the tree is rebuilt rather than diffed
+            self.report_tree.delete(*self.report_tree.get_children())
+            self.report_tree.configure(columns=columns)
+            for column in columns:
+                self.report_tree.heading(column, text=column)
+                self.report_tree.column(column, width=160 if column == "Title" else 100,
+                                        anchor="w" if column in ("Title", "Course Code", "Enrolment No") else "center")
+            for row in rows:
+                self.report_tree.insert("", "end", values=["" if value is None else value for value in row])
+            self.report_status_label.config(text=f"{name}: {len(rows)} rows.")
+
+        def failed(error):
+            self.report_status_label.config(text="")
+            if isinstance(error, ValueError):
+                messagebox.showerror("Input Error", str(error))
+            else:
+                self.show_db_error(error)
+
+        self.db_worker.submit(self.reports.run_report, name, date_from, date_to,
+                              callback=show, error_callback=failed, key="report")
+
+    # --- Diagnostics Tab ---
+    # Latency percentiles from instrumentation.py: per user action (handlers marked @timed_action)
+    # and per database function. Collection is off unless enabled here or via INVENTORY_INSTRUMENT=1.
+    # Write contention (busy retries and lock waits, from contention.py) is always collected.
+    def create_diagnostics_widgets(self):
+        # --- Options Frame ---
+        options_frame = ttk.LabelFrame(self.diagnostics_tab, text="Instrumentation", padding=10)
+        options_frame.pack(fill="x", padx=10, pady=5)
+
+        self.instrument_enabled = tk.BooleanVar(value=instrumentation.ENABLED)
+        ttk.Checkbutton(options_frame, text="Record query and action timings", variable=self.instrument_enabled,
+                        command=self.apply_diagnostics_settings).grid(row=0, column=0, padx=5, pady=5, sticky="w")
+
+        ttk.Label(options_frame, text="Slow query threshold (ms):").grid(row=0, column=1, padx=5, pady=5, sticky="w")
+        self.slow_query_entry = ttk.Entry(options_frame, width=8)
+        self.slow_query_entry.insert(0, f"{instrumentation.SLOW_QUERY_MS:g}")
+        self.slow_query_entry.grid(row=0, column=2, padx=5, pady=5)
+        ttk.Button(options_frame, text="Apply", command=self.apply_diagnostics_settings).grid(row=0, column=3, padx=5, pady=5)
+        ttk.Label(options_frame, text=f"Slow queries are logged to {instrumentation.SLOW_LOG_PATH}").grid(
+            row=0, column=4, padx=10, pady=5, sticky="w")
+
+        ttk.Button(options_frame, text="Refresh", command=self.refresh_diagnostics).grid(row=0, column=5, padx=5, pady=5)
+        ttk.Button(options_frame, text="Reset", command=self.reset_diagnostics).grid(row=0, column=6, padx=5, pady=5)
+
+        # --- Action and Statement Trees ---
+        self.action_stats_tree = self._create_stats_tree("Actions", ("Action", "Count", "p50 ms", "p95 ms", "p99 ms"))
+        self.statement_stats_tree = self._create_stats_tree(
+            "Database Functions", ("Caller", "Count", "Rows", "p50 ms", "p95 ms", "p99 ms"))
+        self.contention_stats_tree = self._create_stats_tree(
+            "Write Contention", ("Function", "Calls", "Retried", "Retries", "Gave up", "p50 ms", "p95 ms",
+                                 "Lock wait p95 ms"))
+
+        self.notebook.bind("<<NotebookTabChanged>>", self.on_tab_changed, add="+")
+
+    def _create_stats_tree(self, title, columns):
+        frame = ttk.LabelFrame(self.diagnostics_tab, text=title, padding=5)
+        frame.pack(fill="both", expand=True, padx=10, pady=5)
+        tree = ttk.Treeview(frame, columns=columns, show="headings", height=8)
+        for column in columns:
+            tree.heading(column, text=column)
+            tree.column(column, width=260 if column in ("Action", "Caller", "Function") else 90,
+                        anchor="w" if column in ("Action", "Caller", "Function") else "e")
+        scrollbar = ttk.Scrollbar(frame, orient="vertical", command=tree.yview)
+        tree.configure(yscrollcommand=scrollbar.set)
+        scrollbar.pack(side="right", fill="y")
+        tree.pack(fill="both", expand=True)
+        return tree
+
+    def on_tab_changed(self, event=None):
+        self.load_tab(self.notebook.select())
+        if self.notebook.select() == str(self.diagnostics_tab):
+            self.refresh_diagnostics()
+
+    def apply_diagnostics_settings(self):
+        try:
+            slow_query_ms = float(self.slow_query_entry.get())
+            if slow_query_ms < 0:
+                raise ValueError
+        except ValueError:
+            messagebox.showerror("Input Error", "Slow query threshold must be a non-negative number.")
+            return
+        instrumentation.configure(enabled=self.instrument_enabled.get(), slow_query_ms=slow_query_ms)
+
+    def refresh_diagnostics(self):
+        # Stats live in memory, so this runs on the Tk thread without touching the database
+        def fill(tree, stats, columns):
+            tree.delete(*tree.get_children())
+            for name, values in sorted(stats.items(), key=lambda item: -item[1]["p95_ms"]):
+                tree.insert("", "end", values=[name] + [
+                    ("" if values[column] is None else f"{values[column]:.2f}") if column.endswith("_ms")
+                    else values[column] for column in columns])
+        fill(self.action_stats_tree, instrumentation.action_stats(), ("count", "p50_ms", "p95_ms", "p99_ms"))
+        fill(self.statement_stats_tree, instrumentation.statement_stats(),
+             ("count", "rows", "p50_ms", "p95_ms", "p99_ms"))
+        fill(self.contention_stats_tree, contention.contention_stats(),
+             ("calls", "retried_calls", "retries", "gave_up", "p50_ms", "p95_ms", "lock_wait_p95_ms"))
+
+    def reset_diagnostics(self):
+        instrumentation.reset()
+        contention.reset()
+        self.refresh_diagnostics()
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Book Inventory Management")
+    parser.add_argument("--server", help="Use a running service.py at this URL (e.g. http://127.0.0.1:8765) "
+                                         "instead of opening the database file")
+    args = parser.parse_args()
     main_root = tk.Tk()
-    app = InventoryApp(main_root)
+    app = InventoryApp(main_root, backend=InventoryClient(args.server) if args.server else None)
     main_root.mainloop() 
\ No newline at end of file
@@ -0,0 +1,198 @@
+import os
+from datetime import datetime
+import timestamps
+
+# --- Transaction Log Archive ---
+# Old transaction_log rows move, in batches, to a separate SQLite file (inventory_archive.db
+# next to inventory.db) that is ATTACHed as "archive" only when needed. The hot database keeps
+# stock, the recent log, the snapshots and the monthly summaries, so it stays small and the
+# reports and stock history still cover archived months.
+#
+# Each batch is two transactions: copy into the archive (INSERT OR IGNORE), then delete from
+# the hot log. In WAL mode SQLite doesn't commit attached databases atomically as a set, so the
+# copy is committed first; a crash in between leaves the batch in both files, never in neither.
+# Readers skip archived copies of rows still in the hot log, and the next run finishes the move.
+
+ARCHIVE_SCHEMA = "archive"
+DEFAULT_BATCH_SIZE = 5000
+
+_DELTA = "CASE action WHEN 'in' THEN quantity ELSE -quantity END"
+
+def archive_path(db_name):
+    """The archive file that belongs to a database file (inventory.db -> inventory_archive.db)."""
+    root, ext = os.path.splitext(db_name)
+    return f"{root}_archive{ext or '.db'}"
+
+def create_archive_state(cursor):
+    """Creates log_archive, the hot database's one-row record of what has been archived."""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS log_archive (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            archived_through TIMESTAMP, -- Newest transaction_time moved to the archive
+            archived_rows INTEGER NOT NULL DEFAULT 0,
+            archiving INTEGER NOT NULL DEFAULT 0 -- Set only inside an archive batch (see summaries.py)
+        )
+    ''')
+    cursor.execute("INSERT OR IGNORE INTO log_archive (id) VALUES (1)")
+
+def archived_through(conn):
+    """Returns the newest archived transaction_time (epoch milliseconds), or None if nothing is archived."""
+    return conn.execute("SELECT archived_through FROM log_archive").fetchone()[0]
+
+def is_attached(conn):
+    return any(row[1] == ARCHIVE_SCHEMA for row in conn.execute("PRAGMA database_list"))
+
+def attach(conn, path, create=False):
+    """
+    Attaches the archive file to conn (once per connection). Returns False without attaching if
+    the file doesn't exist and create is False. Must be called outside a transaction.
+    """
+    if is_attached(conn):
+        return True
+    if not create and not os.path.exists(path):
+        return False
+    conn.execute(f"ATTACH DATABASE ? AS {ARCHIVE_SCHEMA}", (path,))
+    conn.execute(f"PRAGMA {ARCHIVE_SCHEMA}.journal_mode = WAL")
+    conn.execute(f"PRAGMA {ARCHIVE_SCHEMA}.synchronous = NORMAL")
+    if create:
+        _create_archive_tables(conn)
+    else:
+        _index_sort_columns(conn)
+    _convert_text_times(conn)
+    return True
+
+def _create_archive_tables(conn):
+    # Same columns and ids as the hot log; the same index names are fine in another schema
+    conn.execute(f'''
+        CREATE TABLE IF NOT EXISTS {ARCHIVE_SCHEMA}.transaction_log (
+            id INTEGER PRIMARY KEY,
+            stock_id INTEGER NOT NULL,
+            enrolment_no TEXT,
+            action TEXT NOT NULL,
+            quantity INTEGER NOT NULL,
+            transaction_time TIMESTAMP,
+            name TEXT,
+            remarks TEXT,
+            phone TEXT
+        )
+    ''')
+    conn.execute(f'''
+        CREATE INDEX IF NOT EXISTS {ARCHIVE_SCHEMA}.idx_transaction_log_stock
+        ON transaction_log (stock_id, action, quantity)
+    ''')
+    conn.execute(f'''
+        CREATE INDEX IF NOT EXISTS {ARCHIVE_SCHEMA}.idx_transaction_log_time
+        ON transaction_log (transaction_time)
+    ''')
+    conn.execute(f'''
+        CREATE INDEX IF NOT EXISTS {ARCHIVE_SCHEMA}.idx_transaction_log_enrolment_no
+        ON transaction_log (enrolment_no)
+    ''')
+    _index_sort_columns(conn)
+    conn.commit()
+
+def _index_sort_columns(conn):
+    # The hot log's sort index (schema version 11); added on attach to archives made before it
+    conn.execute(f'''
+        CREATE INDEX IF NOT EXISTS {ARCHIVE_SCHEMA}.idx_transaction_log_quantity
+        ON transaction_log (quantity)
+    ''')
+
+def _convert_text_times(conn):
+    # An archive written before schema version 8 holds ISO text times; convert it on first attach.
+    # Text sorts after every integer, so the time index finds any text values at its far end.
+    if not conn.execute(f"SELECT EXISTS(SELECT 1 FROM {ARCHIVE_SCHEMA}.transaction_log WHERE transaction_time >= '')").fetchone()[0]:
+        return
+    timestamps.convert_text_column(conn, f"{ARCHIVE_SCHEMA}.transaction_log", "transaction_time")
+
+# Archived rows that are still in the hot log (an interrupted batch) are read from the hot log
+NOT_IN_HOT_LOG = "NOT EXISTS (SELECT 1 FROM main.transaction_log h WHERE h.id = t.id)"
+
+def archive_batch(conn, begin, cutoff, batch_size=DEFAULT_BATCH_SIZE):
+    """
+    Moves up to batch_size of the oldest rows with transaction_time < cutoff to the archive.
+    begin(cursor) starts a write transaction. Returns the number of rows moved.
+    """
+    cursor = conn.cursor()
+    # The batch is every row up to (and including) the batch_size-th oldest one before cutoff
+    cursor.execute('''
+        SELECT transaction_time, id FROM transaction_log
+        WHERE transaction_time < ?
+        ORDER BY transaction_time, id
+        LIMIT 1 OFFSET ?
+    ''', (cutoff, batch_size - 1))
+    last = cursor.fetchone()
+    if last is None:
+        batch = ("transaction_time < ?", [cutoff])
+    else:
+        batch = ("transaction_time < ? AND (transaction_time, id) <= (?, ?)", [cutoff, *last])
+
+    try:
+        begin(cursor)
+        cursor.execute(f'''
+            INSERT OR IGNORE INTO {ARCHIVE_SCHEMA}.transaction_log
+                (id, stock_id, enrolment_no, action, quantity, transaction_time, name, remarks, phone)
+            SELECT id, stock_id, enrolment_no, action, quantity, transaction_time, name, remarks, phone
+            FROM main.transaction_log WHERE {batch[0]}
+        ''', batch[1])
+        conn.commit()
+
+        begin(cursor)
+        cursor.execute("UPDATE log_archive SET archiving = 1")
+        cursor.execute(f'''
+            DELETE FROM main.transaction_log
+            WHERE {batch[0]} AND id IN (SELECT id FROM {ARCHIVE_SCHEMA}.transaction_log WHERE {batch[0]})
+        ''', batch[1] + batch[1])
+        moved = cursor.rowcount
+        cursor.execute(f'''
+            UPDATE log_archive SET archiving = 0, archived_rows = archived_rows + ?,
+                archived_through = (SELECT MAX(transaction_time) FROM {ARCHIVE_SCHEMA}.transaction_log)
+        ''', (moved,))
+        conn.commit()
+        return moved
+    except Exception:
+        conn.rollback()
+        raise
+
+def archived_deltas(conn, start=None, end=None, stock_id=None):
+    """Like snapshots.log_deltas, over the archived rows (the archive must be attached)."""
+    conditions = [NOT_IN_HOT_LOG]
+    params = []
+    if start is not None:
+        conditions.append("t.transaction_time >= ?")
+        params.append(start)
+    if end is not None:
+        conditions.append("t.transaction_time < ?")
+        params.append(end)
+    if stock_id is not None:
+        conditions.append("t.stock_id = ?")
+        params.append(stock_id)
+    rows = conn.execute(f'''
+        SELECT t.stock_id, SUM({_DELTA}) FROM {ARCHIVE_SCHEMA}.transaction_log t
+        WHERE {" AND ".join(conditions)} GROUP BY t.stock_id
+    ''', params)
+    return dict(rows.fetchall())
+
+def stock_has_archived_rows(conn, stock_id):
+    return conn.execute(f"SELECT EXISTS(SELECT 1 FROM {ARCHIVE_SCHEMA}.transaction_log WHERE stock_id = ?)",
+                        (stock_id,)).fetchone()[0]
+
+if __name__ == '__main__':
+    import argparse
+    import database as db
+    parser = argparse.ArgumentParser(description="Move old transaction_log rows to the archive database.")
+    parser.add_argument("--before", required=True, help="Archive rows logged before this date (YYYY-MM-DD)")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+    parser.add_argument("--vacuum", action="store_true", help="VACUUM the hot database afterwards to shrink the file")
+    parser.add_argument("--db", default=db.DB_NAME)
+    args = parser.parse_args()
+
+    db.set_database(args.db)
+    db.create_tables()
+    started = datetime.now()
+    success, message = db.archive_transactions(
+        args.before, batch_size=args.batch_size, vacuum=args.vacuum,
+        progress=lambda moved: print(f"\r{moved} rows archived", end="", flush=True))
+    print(f"\n{message} ({(datetime.now() - started).total_seconds():.1f}s)")
+    db.close_db()
+    raise SystemExit(0 if success else 1)
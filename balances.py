@@ -0,0 +1,168 @@
+import archive
+
+# --- Student Balances ---
+# student_balance holds, per (enrolment_no, stock_id), how many copies a student has taken out
+# and not brought back, kept in step with transaction_log by the triggers below (the same way
+# summaries.py keeps the monthly totals). "What does this student still hold?" is then a primary
+# key range read instead of a LIKE scan of the log. Rows moved out by archive.py stay counted.
+# check() rebuilds the table from the log (and the archive, when attached) and compares.
+# Each row carries its item's course_code, so a student's items can be read in course order
+# straight off an index; renaming an item updates its rows.
+
+def _apply(row, sign):
+    """Trigger statements that add (sign=1) or remove (sign=-1) one log row from the balances."""
+    key = f"enrolment_no = {row}.enrolment_no AND stock_id = {row}.stock_id"
+    statements = f'''
+        INSERT INTO student_balance (enrolment_no, stock_id, course_code, outstanding, last_out, transactions)
+        SELECT {row}.enrolment_no, {row}.stock_id, (SELECT course_code FROM stock WHERE id = {row}.stock_id),
+               {sign} * CASE {row}.action WHEN 'out' THEN {row}.quantity ELSE -{row}.quantity END,
+               CASE WHEN {sign} > 0 AND {row}.action = 'out' THEN {row}.transaction_time END,
+               {sign}
+        WHERE COALESCE({row}.enrolment_no, '') <> ''
+        ON CONFLICT (enrolment_no, stock_id) DO UPDATE SET
+            outstanding = outstanding + excluded.outstanding,
+            last_out = COALESCE(MAX(last_out, excluded.last_out), last_out, excluded.last_out),
+            transactions = transactions + excluded.transactions;'''
+    if sign < 0:
+        # Removing the newest issue: the next newest comes from the hot log (an item whose earlier
+        # issues are all archived is left without one; check() reports it, a rebuild restores it)
+        statements += f'''
+        UPDATE student_balance SET last_out = (
+            SELECT MAX(transaction_time) FROM transaction_log WHERE {key} AND action = 'out')
+        WHERE {key} AND {row}.action = 'out' AND last_out = {row}.transaction_time;
+        DELETE FROM student_balance WHERE {key} AND transactions = 0;'''
+    return statements
+
+_TRIGGERS = (
+    f'''
+    CREATE TRIGGER IF NOT EXISTS balance_ai AFTER INSERT ON transaction_log BEGIN{_apply("new", 1)}
+    END''',
+    f'''
+    CREATE TRIGGER IF NOT EXISTS balance_ad AFTER DELETE ON transaction_log
+    WHEN (SELECT archiving FROM log_archive) IS NOT 1
+    BEGIN{_apply("old", -1)}
+    END''',
+    # update_transaction_details can move a row to another enrolment_no
+    f'''
+    CREATE TRIGGER IF NOT EXISTS balance_au
+    AFTER UPDATE OF stock_id, enrolment_no, action, quantity, transaction_time ON transaction_log
+    BEGIN{_apply("old", -1)}{_apply("new", 1)}
+    END''',
+    # Renames are rare, so reading every balance row to find the item's is acceptable
+    '''
+    CREATE TRIGGER IF NOT EXISTS balance_stock_au AFTER UPDATE OF course_code ON stock BEGIN
+        UPDATE student_balance SET course_code = new.course_code WHERE stock_id = new.id;
+    END''',
+)
+_TRIGGER_NAMES = ("balance_ai", "balance_ad", "balance_au", "balance_stock_au")
+
+def create_balance_table(cursor):
+    """Creates student_balance and its triggers, then fills it from the log (and the archive, if attached)."""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS student_balance (
+            enrolment_no TEXT NOT NULL,
+            stock_id INTEGER NOT NULL,
+            course_code TEXT NOT NULL, -- The item's stock.course_code, for ordering
+            outstanding INTEGER NOT NULL, -- Copies out minus copies in
+            last_out INTEGER, -- transaction_time of the newest 'out'
+            transactions INTEGER NOT NULL,
+            PRIMARY KEY (enrolment_no, stock_id)
+        ) WITHOUT ROWID
+    ''')
+    # The still-out report: items not yet returned, longest out first
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_student_balance_still_out
+        ON student_balance (last_out) WHERE outstanding > 0
+    ''')
+    # What one student still holds, by course code
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_student_balance_outstanding
+        ON student_balance (enrolment_no, course_code) WHERE outstanding > 0
+    ''')
+    for trigger in _TRIGGERS:
+        cursor.execute(trigger)
+    cursor.execute("DELETE FROM student_balance")
+    cursor.execute(f"INSERT INTO student_balance {expected_balances(cursor.connection)}")
+
+def rebuild_balance_table(cursor):
+    """Drops student_balance and its triggers and creates them again (for a changed table layout)."""
+    for name in _TRIGGER_NAMES:
+        cursor.execute(f"DROP TRIGGER IF EXISTS {name}")
+    cursor.execute("DROP TABLE IF EXISTS student_balance")
+    create_balance_table(cursor)
+
+def expected_balances(conn):
+    """
+    SQL selecting (enrolment_no, stock_id, course_code, outstanding, last_out, transactions)
+    recomputed from the whole log: the hot one, plus the archive when it is attached to conn.
+    """
+    def totals(table, condition):
+        return f'''
+            SELECT enrolment_no, stock_id,
+                   SUM(CASE action WHEN 'out' THEN quantity ELSE -quantity END) AS outstanding,
+                   MAX(CASE action WHEN 'out' THEN transaction_time END) AS last_out,
+                   COUNT(*) AS transactions
+            FROM {table} t
+            WHERE COALESCE(enrolment_no, '') <> '' {condition}
+            GROUP BY enrolment_no, stock_id'''
+    if archive.is_attached(conn):
+        balances = f'''
+            SELECT enrolment_no, stock_id, SUM(outstanding) AS outstanding, MAX(last_out) AS last_out,
+                   SUM(transactions) AS transactions
+            FROM ({totals("main.transaction_log", "")}
+                  UNION ALL {totals(archive.ARCHIVE_SCHEMA + ".transaction_log", "AND " + archive.NOT_IN_HOT_LOG)})
+            GROUP BY enrolment_no, stock_id'''
+    else:
+        balances = totals("main.transaction_log", "")
+    return f'''
+        SELECT b.enrolment_no, b.stock_id, s.course_code, b.outstanding, b.last_out, b.transactions
+        FROM ({balances}) b
+        JOIN main.stock s ON s.id = b.stock_id'''
+
+def check(conn):
+    """
+    Rebuilds the balances from scratch into a temporary table and compares them with
+    student_balance. Returns [(enrolment_no, stock_id, stored, expected)] for every key that
+    differs, where stored and expected are (outstanding, last_out, transactions) or None.
+    Leaves the rebuilt rows in temp.student_balance_check for repair().
+    """
+    conn.execute("DROP TABLE IF EXISTS temp.student_balance_check")
+    conn.execute(f"CREATE TEMP TABLE student_balance_check AS {expected_balances(conn)}")
+    differing = conn.execute('''
+        SELECT enrolment_no, stock_id
+        FROM (SELECT * FROM student_balance_check EXCEPT SELECT * FROM main.student_balance)
+        UNION
+        SELECT enrolment_no, stock_id
+        FROM (SELECT * FROM main.student_balance EXCEPT SELECT * FROM student_balance_check)
+        ORDER BY 1, 2
+    ''').fetchall()
+    mismatches = []
+    for enrolment_no, stock_id in differing:
+        rows = [conn.execute(f'''
+            SELECT outstanding, last_out, transactions FROM {table}
+            WHERE enrolment_no = ? AND stock_id = ?
+        ''', (enrolment_no, stock_id)).fetchone() for table in ("main.student_balance", "student_balance_check")]
+        mismatches.append((enrolment_no, stock_id, *rows))
+    return mismatches
+
+def repair(cursor):
+    """Replaces student_balance with the rows check() rebuilt. Call inside a write transaction."""
+    cursor.execute("DELETE FROM main.student_balance")
+    cursor.execute("INSERT INTO main.student_balance SELECT * FROM temp.student_balance_check")
+
+if __name__ == '__main__':
+    import argparse
+    import database as db
+    parser = argparse.ArgumentParser(description="Check student_balance against a rebuild from the transaction log.")
+    parser.add_argument("--repair", action="store_true", help="Replace the stored balances with the rebuilt ones")
+    parser.add_argument("--db", default=db.DB_NAME)
+    args = parser.parse_args()
+
+    db.set_database(args.db)
+    db.create_tables()
+    consistent, message, mismatches = db.check_student_balances(repair=args.repair)
+    for enrolment_no, stock_id, stored, expected in mismatches:
+        print(f"{enrolment_no} / stock {stock_id}: stored {stored}, expected {expected}")
+    print(message)
+    db.close_db()
+    raise SystemExit(0 if consistent or args.repair else 1)
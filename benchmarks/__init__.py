@@ -0,0 +1,16 @@
+"""
+Benchmarks for database.py.
+
+    python -m benchmarks generate bench.db --stock 100000 --transactions 10000000
+    python -m benchmarks run bench.db --output before.json
+    python -m benchmarks compare before.json after.json
+    python -m benchmarks.load_test bench.db --clients 1 4 16
+    python -m benchmarks.contention --processes 2 4 8 16
+    python -m benchmarks.startup bench.db --runs 5
+
+generate.py builds a reproducible synthetic database, scenarios.py times the public
+database functions against it, and results.py stores the timings as JSON and compares runs.
+load_test.py measures service.py throughput and latency under concurrent clients, and
+contention.py compares write contention policies across many writer processes, and startup.py
+times the app from launch to first paint and to interactive (it needs a display).
+"""
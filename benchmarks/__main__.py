@@ -0,0 +1,73 @@
+import argparse
+import database as db
+from benchmarks import generate, results, scenarios
+
+def _generate(args):
+    def progress(done, total):
+        print(f"\r{done}/{total} transactions", end="", flush=True)
+    dataset = generate.generate(args.db, args.stock, args.transactions, args.seed, progress=progress)
+    print(f"\nWrote {dataset['stock']} stock rows and {dataset['transactions']} transactions to {args.db}.")
+    return 0
+
+def _run(args):
+    db.set_database(args.db)
+    db.create_tables()
+    dataset = generate.describe(args.db)
+    print(f"{dataset['stock']} stock rows, {dataset['transactions']} transactions")
+
+    def progress(name, result):
+        print(f"{name:<45} median {result['median_ms']:>10.3f} ms  (min {result['min_ms']:.3f}, runs {result['runs']})")
+    timings = scenarios.run_all(args.scenario or None, include_heavy=args.heavy, repeat=args.repeat,
+                                progress=progress)
+    db.close_db()
+    if args.output:
+        results.save(args.output, timings, dataset)
+        print(f"Results written to {args.output}.")
+    return 0
+
+def _compare(args):
+    baseline, current = results.load(args.baseline), results.load(args.current)
+    if baseline["dataset"] != current["dataset"]:
+        print(f"Warning: datasets differ ({baseline['dataset']} vs {current['dataset']}).")
+    rows = results.compare(baseline, current, args.threshold, args.min_delta_ms)
+    print(results.format_comparison(rows))
+    regressions = [row[0] for row in rows if row[4] == "regression"]
+    if regressions:
+        print(f"{len(regressions)} regression(s): {', '.join(regressions)}")
+    return 1 if regressions else 0
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m benchmarks", description="Benchmarks for database.py.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    generate_parser = commands.add_parser("generate", help="Build a synthetic benchmark database")
+    generate_parser.add_argument("db")
+    generate_parser.add_argument("--stock", type=int, default=100_000)
+    generate_parser.add_argument("--transactions", type=int, default=10_000_000)
+    generate_parser.add_argument("--seed", type=int, default=1)
+    generate_parser.set_defaults(handler=_generate)
+
+    run_parser = commands.add_parser("run", help="Time the scenarios against a database")
+    run_parser.add_argument("db")
+    run_parser.add_argument("--output", help="Write the results to this JSON file")
+    run_parser.add_argument("--scenario", action="append", choices=list(scenarios.SCENARIOS),
+                            help="Run only this scenario (repeatable)")
+    run_parser.add_argument("--heavy", action="store_true",
+                            help="Include scenarios that load the whole transaction log")
+    run_parser.add_argument("--repeat", type=int, help="Override every scenario's repeat count")
+    run_parser.set_defaults(handler=_run)
+
+    compare_parser = commands.add_parser("compare", help="Compare two results files; exit 1 on regressions")
+    compare_parser.add_argument("baseline")
+    compare_parser.add_argument("current")
+    compare_parser.add_argument("--threshold", type=float, default=results.DEFAULT_THRESHOLD,
+                                help="Relative slowdown counted as a regression (default: %(default)s)")
+    compare_parser.add_argument("--min-delta-ms", type=float, default=results.DEFAULT_MIN_DELTA_MS,
+                                help="Ignore changes smaller than this (default: %(default)s)")
+    compare_parser.set_defaults(handler=_compare)
+
+    args = parser.parse_args(argv)
+    return args.handler(args)
+
+if __name__ == '__main__':
+    raise SystemExit(main())
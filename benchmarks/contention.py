@@ -0,0 +1,112 @@
+import argparse
+import multiprocessing
+import os
+import random
+import tempfile
+import time
+import contention
+import database as db
+import instrumentation
+
+# --- Write Contention Benchmark ---
+# Many writer processes (separate app instances, in effect) add and delete transactions on a
+# handful of stock items in one database for a fixed time, under each contention policy.
+# Reports throughput, how many writes still failed with "database is locked", how often the
+# retry loop kicked in, and write latency, then checks stock against the log.
+
+POLICIES = {
+    # name: contention.configure() arguments
+    "none": {"busy_timeout_ms": 0, "max_attempts": 1},
+    "timeout-only": {"busy_timeout_ms": contention.BUSY_TIMEOUT_MS, "max_attempts": 1},
+    "retry-only": {"busy_timeout_ms": 0, "max_attempts": contention.MAX_ATTEMPTS},
+    "default": {"busy_timeout_ms": contention.BUSY_TIMEOUT_MS, "max_attempts": contention.MAX_ATTEMPTS},
+}
+INITIAL_QUANTITY = 1_000_000 # Large enough that no write is rejected for stock reasons
+
+def _writer(db_path, policy, stock_ids, seconds, seed):
+    contention.configure(**POLICIES[policy])
+    db.set_database(db_path)
+    rng = random.Random(seed)
+    latencies, failures = [], 0
+    pending = [] # Transactions this process added and will delete again
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        start = time.perf_counter()
+        if pending and rng.random() < 0.5:
+            success, _ = db.delete_transaction(pending.pop())
+        else:
+            success, _, transaction_id = db.add_transaction(rng.choice(stock_ids), f"C{seed}", "out", 1,
+                                                            "Contention", "", "", return_id=True)
+            if success:
+                pending.append(transaction_id)
+        latencies.append(time.perf_counter() - start)
+        failures += not success
+    db.close_db()
+    stats = contention.contention_stats()
+    return (latencies, failures, sum(value["retries"] for value in stats.values()),
+            sum(value["gave_up"] for value in stats.values()))
+
+def _check(db_path):
+    """Returns the stock items whose quantity disagrees with the log."""
+    db.set_database(db_path)
+    mismatches = db.connect_db().execute('''
+        SELECT s.id FROM stock s LEFT JOIN transaction_log t ON t.stock_id = s.id
+        GROUP BY s.id
+        HAVING s.quantity != ? + COALESCE(SUM(CASE t.action WHEN 'in' THEN t.quantity ELSE -t.quantity END), 0)
+    ''', (INITIAL_QUANTITY,)).fetchall()
+    db.close_db()
+    return [row[0] for row in mismatches]
+
+def run(processes, policy, seconds=5.0, items=3):
+    """
+    Runs `processes` writers under `policy` in a scratch database.
+    Returns {processes, policy, writes, failed, retries, gave_up, ok_per_s, p50_ms, p95_ms, max_ms, consistent};
+    ok_per_s counts only the writes that succeeded.
+    """
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "contention.db")
+        db.set_database(db_path)
+        db.create_tables()
+        for i in range(items):
+            db.add_stock(f"CONTEND{i}", "Contention item", "en", INITIAL_QUANTITY)
+        stock_ids = [row[0] for row in db.get_all_stock()]
+        db.close_db()
+
+        context = multiprocessing.get_context("spawn")
+        with context.Pool(processes) as pool:
+            results = pool.starmap(_writer, [(db_path, policy, stock_ids, seconds, seed) for seed in range(processes)])
+        consistent = not _check(db_path)
+
+    latencies = sorted(value for result in results for value in result[0])
+    failed = sum(result[1] for result in results)
+    return {"processes": processes, "policy": policy, "writes": len(latencies), "failed": failed,
+            "retries": sum(result[2] for result in results), "gave_up": sum(result[3] for result in results),
+            "ok_per_s": (len(latencies) - failed) / seconds,
+            "p50_ms": instrumentation.percentile(latencies, 50) * 1000,
+            "p95_ms": instrumentation.percentile(latencies, 95) * 1000,
+            "max_ms": latencies[-1] * 1000, "consistent": consistent}
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.contention",
+                                     description="Concurrent writer processes under each contention policy.")
+    parser.add_argument("--processes", type=int, nargs="+", default=[2, 4, 8, 16])
+    parser.add_argument("--policy", action="append", choices=list(POLICIES),
+                        help="Policy to run (repeatable; default: all)")
+    parser.add_argument("--seconds", type=float, default=5)
+    parser.add_argument("--items", type=int, default=3, help="Stock items to contend on")
+    args = parser.parse_args(argv)
+
+    print(f"{'procs':>5} {'policy':<13} {'writes':>7} {'failed':>6} {'retries':>7} {'gave up':>7} "
+          f"{'ok/s':>9} {'p50 ms':>8} {'p95 ms':>8} {'max ms':>8}  consistent")
+    inconsistent = False
+    for processes in args.processes:
+        for policy in args.policy or list(POLICIES):
+            result = run(processes, policy, args.seconds, args.items)
+            inconsistent |= not result["consistent"]
+            print(f"{processes:>5} {policy:<13} {result['writes']:>7} {result['failed']:>6} {result['retries']:>7} "
+                  f"{result['gave_up']:>7} {result['ok_per_s']:>9.1f} {result['p50_ms']:>8.2f} "
+                  f"{result['p95_ms']:>8.2f} {result['max_ms']:>8.1f}  {'yes' if result['consistent'] else 'NO'}")
+    return 1 if inconsistent else 0
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,95 @@
+import os
+import random
+import sqlite3
+from datetime import datetime, timedelta
+import migrations
+import timestamps
+
+# --- Synthetic Data ---
+# The same seed and sizes always produce the same database, so two benchmark runs on
+# different commits measure the code, not the data.
+
+START_TIME = datetime(2020, 1, 1)
+SPAN = timedelta(days=3 * 365) # Transactions are spread evenly over this period
+LANGUAGES = ("English", "Hindi", "Tamil", "Bengali", "Marathi", "Urdu")
+PROGRAMMES = ("BCS", "MCS", "BEG", "MEG", "BHI", "MHI", "BPY", "MPY", "BCO", "MCO")
+TITLE_WORDS = ("Introduction", "Advanced", "Foundations", "Applied", "Modern", "Principles",
+               "Programming", "Economics", "History", "Literature", "Statistics", "Networks",
+               "Databases", "Algebra", "Philosophy", "Management", "Physics", "Chemistry")
+FIRST_NAMES = ("Asha", "Ravi", "Meera", "Arjun", "Priya", "Kiran", "Sunil", "Divya", "Rahul", "Neha")
+LAST_NAMES = ("Sharma", "Iyer", "Khan", "Das", "Patel", "Nair", "Singh", "Rao", "Gupta", "Joshi")
+REMARKS = ("", "", "", "Reissue", "Damaged copy", "Replacement", "Late return")
+
+def _stock_rows(rng, count):
+    for i in range(count):
+        course_code = f"{PROGRAMMES[i % len(PROGRAMMES)]}-{i:06d}"
+        title = " ".join(rng.sample(TITLE_WORDS, 3))
+        yield course_code, title, rng.choice(LANGUAGES), rng.randint(50, 500)
+
+def _student(number):
+    """Deterministic (enrolment_no, name, phone) for student number."""
+    name = f"{FIRST_NAMES[number % len(FIRST_NAMES)]} {LAST_NAMES[number // len(FIRST_NAMES) % len(LAST_NAMES)]}"
+    return f"E{number:08d}", name, f"9{number:09d}"
+
+def generate(path, stock_rows=100_000, transactions=10_000_000, seed=1, progress=None, chunk_size=50_000):
+    """
+    Writes a fresh synthetic database to path (replacing any existing file).
+    Popular items get most of the traffic, no balance ever goes negative, and each stock
+    quantity equals its starting quantity plus the net of its log rows.
+    Rows are written under schema version 1 and the later migrations run afterwards, so the
+    search index, summaries and snapshots are built in bulk rather than row by row.
+    progress, if given, is called as progress(transactions_written, transactions).
+    Returns the dataset description stored in benchmark results.
+    """
+    for suffix in ("", "-wal", "-shm"):
+        if os.path.exists(path + suffix):
+            os.remove(path + suffix)
+    rng = random.Random(seed)
+
+    conn = sqlite3.connect(path)
+    conn.execute("PRAGMA journal_mode = WAL")
+    conn.execute("PRAGMA synchronous = OFF") # A benchmark fixture can be regenerated if lost
+    migrations.migrate(conn, target=1)
+
+    stock = list(_stock_rows(rng, stock_rows))
+    conn.executemany("INSERT INTO stock (course_code, title, language, quantity) VALUES (?, ?, ?, ?)", stock)
+    balances = [row[3] for row in stock] # stock id i + 1 -> running balance
+    students = max(1000, transactions // 50)
+
+    step = SPAN / max(transactions, 1)
+    written = 0
+    while written < transactions:
+        batch = []
+        for n in range(written, min(written + chunk_size, transactions)):
+            index = int(rng.random() ** 3 * stock_rows) # Skewed towards the first (popular) items
+            quantity = rng.randint(1, 3)
+            action = "out" if balances[index] >= quantity and rng.random() < 0.6 else "in"
+            balances[index] += quantity if action == "in" else -quantity
+            enrolment_no, name, phone = _student(rng.randrange(students))
+            batch.append((index + 1, enrolment_no, action, quantity, timestamps.from_datetime(START_TIME + step * n),
+                          name, rng.choice(REMARKS), phone))
+        conn.executemany('''
+            INSERT INTO transaction_log (stock_id, enrolment_no, action, quantity, transaction_time, name, remarks, phone)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        ''', batch)
+        conn.commit() # Per chunk, so the WAL doesn't grow to the size of the whole log
+        written += len(batch)
+        if progress:
+            progress(written, transactions)
+    conn.executemany("UPDATE stock SET quantity = ? WHERE id = ?",
+                     [(balance, stock_id) for stock_id, balance in enumerate(balances, start=1)])
+    conn.commit()
+
+    migrations.migrate(conn)
+    conn.close()
+    return {"stock": stock_rows, "transactions": transactions, "seed": seed}
+
+def describe(path):
+    """Returns the dataset description (row counts) of an existing database."""
+    conn = sqlite3.connect(path)
+    try:
+        stock = conn.execute("SELECT COUNT(*) FROM stock").fetchone()[0]
+        transactions = conn.execute("SELECT COUNT(*) FROM transaction_log").fetchone()[0]
+    finally:
+        conn.close()
+    return {"stock": stock, "transactions": transactions}
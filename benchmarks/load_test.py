@@ -0,0 +1,121 @@
+import argparse
+import random
+import socket
+import subprocess
+import sys
+import threading
+import time
+import instrumentation
+from benchmarks import generate
+from client import InventoryClient, ServiceError
+
+# --- Service Load Test ---
+# Starts service.py against a database and drives it from N concurrent clients, each on its
+# own thread and keep-alive connection, with a counter-like mix: mostly page and stock reads,
+# plus issue-then-delete write pairs so stock levels and the log size stay roughly constant.
+
+WRITE_SHARE = 0.2 # Fraction of operations that are writes
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def start_service(db_path, port, readers=4):
+    """Starts service.py in a subprocess and waits until it answers. Returns the Popen."""
+    process = subprocess.Popen([sys.executable, "service.py", "--db", db_path, "--port", str(port),
+                                "--readers", str(readers)], stdout=subprocess.DEVNULL)
+    client = InventoryClient(f"127.0.0.1:{port}", timeout=5)
+    deadline = time.monotonic() + 60
+    while True:
+        try:
+            client.create_tables()
+            client.close_db()
+            return process
+        except (OSError, ServiceError):
+            if process.poll() is not None or time.monotonic() > deadline:
+                process.kill()
+                raise RuntimeError("service.py did not start")
+            time.sleep(0.1)
+
+def _worker(base_url, stock_ids, course_codes, seconds, seed, latencies, errors):
+    client = InventoryClient(base_url)
+    rng = random.Random(seed)
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        stock_id = rng.choice(stock_ids)
+        start = time.perf_counter()
+        try:
+            if rng.random() < WRITE_SHARE:
+                # Issue and immediately undo, as two timed requests
+                success, _, transaction_id = client.add_transaction(stock_id, "LOAD", "out", 1, "Load Test",
+                                                                    "", "", return_id=True)
+                latencies.append(time.perf_counter() - start)
+                if success:
+                    start = time.perf_counter()
+                    client.delete_transaction(transaction_id)
+            else:
+                choice = rng.random()
+                if choice < 0.5:
+                    client.get_transactions_page(limit=50)
+                elif choice < 0.8:
+                    client.get_transactions_page({"course_code": rng.choice(course_codes)}, limit=50)
+                else:
+                    client.get_stock_by_id(stock_id)
+            latencies.append(time.perf_counter() - start)
+        except (OSError, ServiceError):
+            errors.append(1)
+    client.close_db()
+
+def run_load(base_url, clients, seconds, stock_ids, course_codes):
+    """Runs `clients` concurrent workers for `seconds`. Returns {clients, requests, errors, rps, p50_ms, p95_ms}."""
+    latencies, errors = [], []
+    threads = [threading.Thread(target=_worker, args=(base_url, stock_ids, course_codes, seconds, n, latencies, errors))
+               for n in range(clients)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    ordered = sorted(latencies)
+    return {"clients": clients, "requests": len(ordered), "errors": len(errors),
+            "rps": len(ordered) / elapsed,
+            "p50_ms": (instrumentation.percentile(ordered, 50) or 0) * 1000,
+            "p95_ms": (instrumentation.percentile(ordered, 95) or 0) * 1000}
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.load_test",
+                                     description="Load-test service.py with concurrent clients.")
+    parser.add_argument("db", help="Database to serve; generated first if --generate is given")
+    parser.add_argument("--generate", action="store_true", help="Build a synthetic database at db first")
+    parser.add_argument("--stock", type=int, default=2000)
+    parser.add_argument("--transactions", type=int, default=200_000)
+    parser.add_argument("--clients", type=int, nargs="+", default=[1, 2, 4, 8, 16])
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--readers", type=int, default=4)
+    args = parser.parse_args(argv)
+
+    if args.generate:
+        generate.generate(args.db, args.stock, args.transactions)
+    port = _free_port()
+    process = start_service(args.db, port, args.readers)
+    base_url = f"127.0.0.1:{port}"
+    try:
+        client = InventoryClient(base_url)
+        stock = client.get_all_stock()
+        client.close_db()
+        stock_ids = [row[0] for row in stock if row[4] >= 1]
+        course_codes = sorted({row[1] for row in stock})
+        print(f"{'clients':>7} {'requests':>9} {'errors':>6} {'req/s':>9} {'p50 ms':>8} {'p95 ms':>8}")
+        for clients in args.clients:
+            result = run_load(base_url, clients, args.seconds, stock_ids, course_codes)
+            print(f"{result['clients']:>7} {result['requests']:>9} {result['errors']:>6} {result['rps']:>9.1f} "
+                  f"{result['p50_ms']:>8.2f} {result['p95_ms']:>8.2f}")
+    finally:
+        process.terminate()
+        process.wait()
+    return 0
+
+if __name__ == '__main__':
+    raise SystemExit(main())
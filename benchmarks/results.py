@@ -0,0 +1,84 @@
+import json
+import platform
+import sqlite3
+import subprocess
+from datetime import datetime
+
+# --- Results Format ---
+# One JSON document per run:
+#   {"format": 1, "created": ..., "environment": {...}, "dataset": {"stock": n, "transactions": n},
+#    "results": {scenario: {"runs", "min_ms", "median_ms", "mean_ms", "max_ms"}}}
+# compare() works on the medians.
+
+FORMAT_VERSION = 1
+DEFAULT_THRESHOLD = 0.10 # A median this much slower (10%) is a regression...
+DEFAULT_MIN_DELTA_MS = 0.05 # ...as long as it is also slower by at least this much (timer noise)
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def environment():
+    """Describes where the benchmark ran, so results from different machines can be told apart."""
+    return {
+        "commit": _git_commit(),
+        "python": platform.python_version(),
+        "sqlite": sqlite3.sqlite_version,
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+    }
+
+def save(path, results, dataset):
+    document = {
+        "format": FORMAT_VERSION,
+        "created": datetime.now().isoformat(timespec="seconds"),
+        "environment": environment(),
+        "dataset": dataset,
+        "results": results,
+    }
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(document, f, indent=2, sort_keys=True)
+    return document
+
+def load(path):
+    with open(path, encoding="utf-8") as f:
+        document = json.load(f)
+    if document.get("format") != FORMAT_VERSION:
+        raise ValueError(f"{path}: unsupported results format {document.get('format')!r}.")
+    return document
+
+def compare(baseline, current, threshold=DEFAULT_THRESHOLD, min_delta_ms=DEFAULT_MIN_DELTA_MS):
+    """
+    Compares two results documents scenario by scenario.
+    Returns a list of (name, baseline_ms, current_ms, change, status) where change is the relative
+    change of the median and status is 'regression', 'improvement', 'same', 'new' or 'missing'.
+    """
+    rows = []
+    before, after = baseline["results"], current["results"]
+    for name in list(before) + [name for name in after if name not in before]:
+        if name not in after:
+            rows.append((name, before[name]["median_ms"], None, None, "missing"))
+            continue
+        if name not in before:
+            rows.append((name, None, after[name]["median_ms"], None, "new"))
+            continue
+        old, new = before[name]["median_ms"], after[name]["median_ms"]
+        change = (new - old) / old if old else 0.0
+        if abs(new - old) < min_delta_ms or abs(change) < threshold:
+            status = "same"
+        else:
+            status = "regression" if new > old else "improvement"
+        rows.append((name, old, new, change, status))
+    return rows
+
+def format_comparison(rows):
+    lines = [f"{'scenario':<45} {'baseline ms':>12} {'current ms':>12} {'change':>8}  status"]
+    for name, old, new, change, status in rows:
+        old_text = f"{old:.3f}" if old is not None else "-"
+        new_text = f"{new:.3f}" if new is not None else "-"
+        change_text = f"{change:+.0%}" if change is not None else "-"
+        lines.append(f"{name:<45} {old_text:>12} {new_text:>12} {change_text:>8}  {status}")
+    return "\n".join(lines)
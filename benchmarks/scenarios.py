@@ -0,0 +1,270 @@
+import statistics
+import time
+from datetime import timedelta
+import database as db
+import live_filter
+import reports
+import timestamps
+
+# --- Scenarios ---
+# Each scenario times one public database.py call. setup (untimed) runs before every timed
+# call and returns the arguments for it; cleanup (untimed) runs once afterwards with every
+# setup result, so write scenarios leave the database as they found it.
+# Heavy scenarios materialise the whole log and only run when asked for.
+
+SCENARIOS = {} # name -> dict(run, setup, cleanup, repeat, heavy)
+
+def scenario(name, repeat=20, setup=None, cleanup=None, heavy=False):
+    """Registers the decorated function run(sample, *setup_result) as a scenario."""
+    def register(run):
+        SCENARIOS[name] = {"run": run, "setup": setup, "cleanup": cleanup, "repeat": repeat, "heavy": heavy}
+        return run
+    return register
+
+def sample_values():
+    """Picks the ids and filter values the scenarios use from the open database."""
+    conn = db.connect_db()
+    stock_count = conn.execute("SELECT COUNT(*) FROM stock").fetchone()[0]
+    stock = conn.execute("SELECT id, course_code, title FROM stock ORDER BY id LIMIT 1 OFFSET ?",
+                         (stock_count // 2,)).fetchone()
+    transaction = conn.execute('''
+        SELECT id, enrolment_no, name, transaction_time FROM transaction_log
+        WHERE id >= (SELECT MAX(id) / 2 FROM transaction_log) ORDER BY id LIMIT 1
+    ''').fetchone()
+    if stock is None or transaction is None:
+        raise ValueError("The benchmark database needs at least one stock row and one transaction.")
+    return {
+        "stock_id": stock[0],
+        "course_code": stock[1],
+        "title_word": stock[2].split()[0],
+        "transaction_id": transaction[0],
+        "enrolment_no": transaction[1],
+        "name": transaction[2].split()[0] if transaction[2] else "",
+        "transaction_time": transaction[3],
+    }
+
+# --- Stock ---
+
+def _cold_catalog(sample):
+    db._catalog.invalidate() # Force the next read to reload the stock table
+    return ()
+
+@scenario("get_all_stock")
+def _get_all_stock(sample):
+    db.get_all_stock()
+
+@scenario("get_all_stock (cold cache)", repeat=5, setup=_cold_catalog)
+def _get_all_stock_cold(sample):
+    db.get_all_stock()
+
+@scenario("get_all_stock (by quantity)")
+def _get_all_stock_by_quantity(sample):
+    db.get_all_stock(sort_by="quantity")
+
+@scenario("get_all_stock (course_code filter)")
+def _get_all_stock_by_course(sample):
+    db.get_all_stock({"course_code": sample["course_code"]})
+
+@scenario("get_all_stock (title filter)")
+def _get_all_stock_by_title(sample):
+    db.get_all_stock({"title": sample["title_word"]})
+
+@scenario("get_stock_by_id", repeat=200)
+def _get_stock_by_id(sample):
+    db.get_stock_by_id(sample["stock_id"])
+
+@scenario("get_stock_by_name", repeat=200)
+def _get_stock_by_name(sample):
+    db.get_stock_by_name(sample["course_code"])
+
+def _new_stock_code(sample):
+    _new_stock_code.counter = getattr(_new_stock_code, "counter", 0) + 1
+    return (f"BENCH-{time.time_ns()}-{_new_stock_code.counter}",)
+
+def _delete_stock_codes(sample, setups):
+    for (course_code,) in setups:
+        row = db.get_stock_by_name(course_code)
+        if row:
+            db.delete_stock(row[0])
+
+@scenario("add_stock", setup=_new_stock_code, cleanup=_delete_stock_codes)
+def _add_stock(sample, course_code):
+    db.add_stock(course_code, "Benchmark", "English", 10)
+
+@scenario("update_stock")
+def _update_stock(sample):
+    row = db.get_stock_by_id(sample["stock_id"])
+    db.update_stock(*row)
+
+def _stock_to_delete(sample):
+    course_code = _new_stock_code(sample)[0]
+    db.add_stock(course_code, "Benchmark", "English", 10)
+    return (db.get_stock_by_name(course_code)[0],)
+
+@scenario("delete_stock", setup=_stock_to_delete)
+def _delete_stock(sample, stock_id):
+    db.delete_stock(stock_id)
+
+# --- Transactions ---
+
+@scenario("get_all_transactions", repeat=1, heavy=True)
+def _get_all_transactions(sample):
+    db.get_all_transactions()
+
+@scenario("get_all_transactions (enrolment_no filter)")
+def _get_all_transactions_by_enrolment(sample):
+    db.get_all_transactions({"enrolment_no": sample["enrolment_no"]})
+
+@scenario("get_all_transactions (course_code filter)", repeat=5)
+def _get_all_transactions_by_course(sample):
+    db.get_all_transactions({"course_code": sample["course_code"]})
+
+@scenario("get_all_transactions (name filter)", repeat=5)
+def _get_all_transactions_by_name(sample):
+    db.get_all_transactions({"name": sample["name"]})
+
+@scenario("get_all_transactions (one week)", repeat=5)
+def _get_all_transactions_week(sample):
+    first_day = timestamps.to_datetime(sample["transaction_time"]).date()
+    db.get_all_transactions({"date_from": first_day, "date_to": first_day + timedelta(days=6)})
+
+@scenario("get_transactions_page (newest)")
+def _get_transactions_page(sample):
+    db.get_transactions_page(limit=200)
+
+@scenario("get_transactions_page (mid-log)")
+def _get_transactions_page_mid(sample):
+    db.get_transactions_page(after=(sample["transaction_time"], sample["transaction_id"]), limit=200)
+
+@scenario("get_transactions_page (by quantity, mid-log)")
+def _get_transactions_page_by_quantity(sample):
+    db.get_transactions_page(after=(3, sample["transaction_id"]), limit=200, sort_by="quantity", descending=False)
+
+@scenario("get_transactions_page (by course code, mid-log)")
+def _get_transactions_page_by_course(sample):
+    db.get_transactions_page(after=(sample["course_code"], 0), limit=200, sort_by="course_code", descending=False)
+
+@scenario("count_transactions (enrolment_no filter)")
+def _count_transactions(sample):
+    db.count_transactions({"enrolment_no": sample["enrolment_no"]})
+
+@scenario("get_transaction_by_id", repeat=200)
+def _get_transaction_by_id(sample):
+    db.get_transaction_by_id(sample["transaction_id"])
+
+@scenario("get_outstanding_for_student", repeat=200)
+def _get_outstanding_for_student(sample):
+    db.get_outstanding_for_student(sample["enrolment_no"])
+
+def _delete_added(sample, setups):
+    # add_transaction's ids are only known after the timed call; remove the newest bench rows
+    conn = db.connect_db()
+    for (transaction_id,) in conn.execute(
+            "SELECT id FROM transaction_log WHERE enrolment_no = 'BENCH' ORDER BY id DESC LIMIT ?",
+            (len(setups),)).fetchall():
+        db.delete_transaction(transaction_id)
+
+@scenario("add_transaction", cleanup=_delete_added)
+def _add_transaction(sample):
+    db.add_transaction(sample["stock_id"], "BENCH", "in", 1, "Benchmark", "", "")
+
+CART_SIZE = 5
+
+def _delete_cart_rows(sample, setups):
+    _delete_added(sample, setups * CART_SIZE)
+
+@scenario("checkout_cart (5 items)", cleanup=_delete_cart_rows)
+def _checkout_cart(sample):
+    db.checkout_cart([(sample["course_code"], 1)] * CART_SIZE, "BENCH", "Benchmark", "", "", action="in")
+
+def _transaction_to_delete(sample):
+    return (db.add_transaction(sample["stock_id"], "BENCH", "in", 1, "Benchmark", "", "", return_id=True)[2],)
+
+@scenario("delete_transaction", setup=_transaction_to_delete)
+def _delete_transaction(sample, transaction_id):
+    db.delete_transaction(transaction_id)
+
+@scenario("update_transaction_details")
+def _update_transaction_details(sample):
+    row = db.get_transaction_by_id(sample["transaction_id"])
+    db.update_transaction_details(row[0], row[3], row[7], row[8], row[9])
+
+# --- History and Reports ---
+
+@scenario("get_stock_as_of (one item)")
+def _get_stock_as_of(sample):
+    db.get_stock_as_of(sample["transaction_time"], stock_id=sample["stock_id"])
+
+@scenario("get_stock_as_of (all items)", repeat=5)
+def _get_stock_as_of_all(sample):
+    db.get_stock_as_of(sample["transaction_time"])
+
+@scenario("verify_stock_ledger", repeat=5)
+def _verify_stock_ledger(sample):
+    db.verify_stock_ledger()
+
+for _name in reports.REPORTS:
+    scenario(f"report: {_name}", repeat=5)(lambda sample, name=_name: reports.run_report(name))
+
+# --- Live Filtering ---
+# What the app does per keystroke while a filter only narrows: re-apply it to the rows it shows.
+
+def _all_stock_rows(sample):
+    return (db.get_all_stock(),)
+
+@scenario("live filter: narrow all stock (title)", setup=_all_stock_rows)
+def _narrow_stock(sample, rows):
+    predicate = live_filter.stock_predicate({"title": sample["title_word"][:3]}, db.search_uses_fts())
+    [row for row in rows if predicate(row)]
+
+def _transaction_window(sample):
+    # The most the Transaction Log holds at once: TRANS_MAX_PAGES pages of 200
+    rows, _, _ = db.get_transactions_page(limit=1000)
+    return ([row[:-1] for row in rows],)
+
+@scenario("live filter: narrow 1000 transactions (name)", setup=_transaction_window)
+def _narrow_transactions(sample, rows):
+    predicate = live_filter.transaction_predicate({"name": sample["name"][:2]}, db.search_uses_fts())
+    [row for row in rows if predicate(row)]
+
+# --- Runner ---
+
+def run_scenario(name, sample, repeat=None):
+    """Times one scenario. Returns {"runs", "min_ms", "median_ms", "mean_ms", "max_ms"}."""
+    spec = SCENARIOS[name]
+    timings = []
+    setups = []
+    for _ in range(repeat or spec["repeat"]):
+        args = spec["setup"](sample) if spec["setup"] else ()
+        setups.append(args)
+        start = time.perf_counter()
+        spec["run"](sample, *args)
+        timings.append((time.perf_counter() - start) * 1000)
+    if spec["cleanup"]:
+        spec["cleanup"](sample, setups)
+    return {
+        "runs": len(timings),
+        "min_ms": round(min(timings), 4),
+        "median_ms": round(statistics.median(timings), 4),
+        "mean_ms": round(statistics.fmean(timings), 4),
+        "max_ms": round(max(timings), 4),
+    }
+
+def run_all(names=None, include_heavy=False, repeat=None, progress=None):
+    """
+    Runs the named scenarios (all by default; heavy ones only with include_heavy) against the
+    database database.py currently points at. progress(name, result) is called after each one.
+    Returns {name: result}.
+    """
+    sample = sample_values()
+    db.get_all_stock() # Warm the stock catalog so only the cold-cache scenario pays for loading it
+    results = {}
+    for name, spec in SCENARIOS.items():
+        if names is not None and name not in names:
+            continue
+        if spec["heavy"] and not include_heavy and names is None:
+            continue
+        results[name] = run_scenario(name, sample, repeat)
+        if progress:
+            progress(name, results[name])
+    return results
@@ -0,0 +1,94 @@
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+# --- Startup Benchmark ---
+# Launches the app in a fresh process per run and reports, from process launch:
+#   first paint     - the main window is first exposed (drawn) on screen
+#   interactive     - the visible tab's data is loaded and shown
+#   import / build  - how much of that went to importing the app and building its widgets
+# Each run is a new interpreter, so module imports and the first database open are counted
+# the way a user sees them. Needs a display (set DISPLAY, or run under xvfb-run).
+
+TIMEOUT_S = 60
+
+def _child(db_path):
+    # Runs in the launched process; prints one JSON line of time.time() stamps
+    started = time.time()
+    import tkinter as tk
+    import database as db
+    from app import InventoryApp
+    imported = time.time()
+    db.set_database(db_path)
+
+    stamps = {"imported": imported, "started": started}
+    root = tk.Tk()
+
+    def exposed(event):
+        if event.widget is root and "first_paint" not in stamps:
+            stamps["first_paint"] = time.time()
+
+    root.bind("<Expose>", exposed, add="+")
+    app = InventoryApp(root)
+    stamps["built"] = time.time()
+
+    def poll():
+        if time.time() - started > TIMEOUT_S:
+            stamps["timed_out"] = True
+        elif not (app.stock_shown_filters is not None and not app.db_worker.has_pending("stock_view")
+                  and "first_paint" in stamps):
+            root.after(1, poll)
+            return
+        else:
+            stamps["interactive"] = time.time()
+        print(json.dumps(stamps), flush=True)
+        app.on_close()
+
+    root.after(1, poll)
+    root.mainloop()
+
+def run_once(db_path):
+    """Starts the app once against db_path. Returns {first_paint_ms, interactive_ms, import_ms, build_ms}."""
+    launched = time.time()
+    result = subprocess.run([sys.executable, "-m", "benchmarks.startup", db_path, "--child"],
+                            capture_output=True, text=True, timeout=TIMEOUT_S + 10,
+                            cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    if result.returncode != 0:
+        if "TclError" in result.stderr and "display" in result.stderr:
+            raise SystemExit("No display to open the window on; set DISPLAY or run under xvfb-run.")
+        raise SystemExit(f"The app failed to start:\n{result.stderr}")
+    stamps = json.loads(result.stdout.strip().splitlines()[-1])
+    if stamps.get("timed_out"):
+        raise SystemExit(f"The app did not become interactive within {TIMEOUT_S}s.")
+    return {"first_paint_ms": (stamps["first_paint"] - launched) * 1000,
+            "interactive_ms": (stamps["interactive"] - launched) * 1000,
+            "import_ms": (stamps["imported"] - stamps["started"]) * 1000,
+            "build_ms": (stamps["built"] - stamps["imported"]) * 1000}
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.startup",
+                                     description="Time from launch to first paint and to interactive.")
+    parser.add_argument("db", help="Database file to open (e.g. one made by 'python -m benchmarks generate')")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+    if args.child:
+        _child(args.db)
+        return 0
+    if not os.path.exists(args.db):
+        parser.error(f"{args.db} does not exist")
+
+    results = [run_once(args.db) for _ in range(args.runs)]
+    print(f"{'':<14} {'median ms':>10} {'min ms':>8} {'max ms':>8}")
+    for name, label in (("first_paint_ms", "first paint"), ("interactive_ms", "interactive"),
+                        ("import_ms", "imports"), ("build_ms", "build widgets")):
+        values = [result[name] for result in results]
+        print(f"{label:<14} {statistics.median(values):>10.1f} {min(values):>8.1f} {max(values):>8.1f}")
+    return 0
+
+if __name__ == '__main__':
+    raise SystemExit(main())
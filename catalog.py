@@ -0,0 +1,125 @@
+import sqlite3
+import threading
+
+class StockRecord:
+    """One stock row. __slots__ keeps a large catalog compact."""
+    __slots__ = ("id", "course_code", "title", "language", "quantity")
+
+    def __init__(self, id, course_code, title, language, quantity):
+        self.id = id
+        self.course_code = course_code
+        self.title = title
+        self.language = language
+        self.quantity = quantity
+
+    def as_row(self):
+        """Returns the (id, course_code, title, language, quantity) tuple the stock queries return."""
+        return (self.id, self.course_code, self.title, self.language, self.quantity)
+
+class StockCatalog:
+    """
+    In-memory copy of the stock table, indexed by id and by course_code.
+    It is loaded once and then kept exact by the database.py write functions, which commit
+    through commit() so the changed rows are copied in as part of the commit. Commits made on any
+    other connection move that connection's PRAGMA data_version and trigger a reload.
+    """
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._by_id = {}
+        self._by_code = {}
+        self._sorted_rows = {} # (sort_by, descending) -> cached get_all_stock() result; cleared after any change
+        self._loaded = False
+        self._seen_versions = {} # connection -> its data_version when it last found the catalog current
+
+    def _load(self, conn):
+        rows = conn.execute("SELECT id, course_code, title, language, quantity FROM stock").fetchall()
+        self._by_id = {}
+        self._by_code = {}
+        for row in rows:
+            record = StockRecord(*row)
+            self._by_id[record.id] = record
+            self._by_code[record.course_code] = record
+        self._sorted_rows = {}
+        self._loaded = True
+        # A reload only makes the catalog newer, so other connections' baselines still hold;
+        # just drop the ones whose connection has been closed since
+        self._seen_versions = {seen: version for seen, version in self._seen_versions.items() if _is_open(seen)}
+
+    def ensure_fresh(self, conn):
+        """Loads the catalog on first use, or reloads it if another connection changed the DB."""
+        version = conn.execute("PRAGMA data_version").fetchone()[0]
+        with self._lock:
+            if not self._loaded or self._seen_versions.get(conn) != version:
+                self._load(conn)
+                self._seen_versions[conn] = version
+
+    def invalidate(self):
+        with self._lock:
+            self._loaded = False
+
+    def get_by_id(self, stock_id):
+        with self._lock:
+            record = self._by_id.get(stock_id)
+            return record.as_row() if record else None
+
+    def get_by_code(self, course_code):
+        with self._lock:
+            record = self._by_code.get(course_code)
+            return record.as_row() if record else None
+
+    def all_rows(self, sort_by="course_code", descending=False):
+        """All stock rows ordered by the sort_by field, then id (same order as the SQL listing, NULL first)."""
+        with self._lock:
+            rows = self._sorted_rows.get((sort_by, descending))
+            if rows is None:
+                def key(record):
+                    value = getattr(record, sort_by)
+                    return value is not None, value, record.id
+                rows = [record.as_row() for record in sorted(self._by_id.values(), key=key, reverse=descending)]
+                self._sorted_rows[(sort_by, descending)] = rows
+            return list(rows)
+
+    def course_codes(self):
+        return [row[1] for row in self.all_rows()]
+
+    # --- Keeping it exact: database.py commits stock changes through here ---
+
+    def commit(self, conn, stock_ids=(), chunk_size=500):
+        """
+        Commits conn's open transaction and copies the stock rows with the given ids, as that
+        transaction left them, into the catalog (removing ids whose row is gone). The rows are
+        read before the commit, while the write lock keeps them from changing, and applied with
+        the catalog lock held across the commit, so a reload on another thread sees either the
+        database and catalog both without the change or both with it. Whole rows are copied
+        rather than quantity deltas, so nothing can be counted twice.
+        """
+        stock_ids = list(stock_ids)
+        rows = {}
+        for start in range(0, len(stock_ids), chunk_size):
+            chunk = stock_ids[start:start + chunk_size]
+            placeholders = ", ".join("?" * len(chunk))
+            for row in conn.execute(f"SELECT id, course_code, title, language, quantity FROM stock WHERE id IN ({placeholders})", chunk):
+                rows[row[0]] = row
+        with self._lock:
+            conn.commit()
+            if not self._loaded:
+                return
+            for stock_id in stock_ids:
+                self._remove(stock_id)
+            for row in rows.values():
+                record = StockRecord(*row)
+                self._by_id[record.id] = record
+                self._by_code[record.course_code] = record
+            self._sorted_rows = {}
+
+    def _remove(self, stock_id):
+        record = self._by_id.pop(stock_id, None)
+        if record is not None:
+            self._by_code.pop(record.course_code, None)
+
+def _is_open(conn):
+    try:
+        conn.in_transaction
+        return True
+    except sqlite3.ProgrammingError:
+        return False
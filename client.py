@@ -0,0 +1,205 @@
+import http.client
+import json
+import sqlite3
+import threading
+import uuid
+from urllib.parse import quote, urlencode, urlsplit
+
+# --- Service Client ---
+# Talks to service.py and exposes the database.py functions InventoryApp uses, with the same
+# arguments and return shapes (tuples, not JSON lists), so the app can run against either.
+
+class ServiceError(sqlite3.Error):
+    """An error reported by the service. A sqlite3.Error so existing database error handling applies."""
+
+def _tuple(row):
+    return tuple(row) if row is not None else None
+
+class InventoryClient:
+    """
+    HTTP client for service.py. Each thread keeps its own keep-alive connection, so the app's
+    DB worker and export threads can use one client at the same time.
+    """
+    def __init__(self, base_url, timeout=30):
+        url = urlsplit(base_url if "://" in base_url else "http://" + base_url)
+        self.host = url.hostname or "127.0.0.1"
+        self.port = url.port or 80
+        self.timeout = timeout
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._connections = []
+
+    def _connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+            self._local.conn = conn
+            with self._lock:
+                self._connections.append(conn)
+        return conn
+
+    def _request(self, method, path, query=None, body=None, idempotent=None):
+        if query:
+            query = {key: value for key, value in query.items() if value not in (None, "")}
+            if query:
+                path += "?" + urlencode(query)
+        data = json.dumps(body).encode("utf-8") if body is not None else None
+        headers = {"Content-Type": "application/json"} if data is not None else {}
+        for attempt in (1, 2):
+            conn = self._connection()
+            try:
+                conn.request(method, path, body=data, headers=headers)
+                response = conn.getresponse()
+                payload = json.loads(response.read() or b"{}")
+                break
+            except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError):
+                # The server dropped the keep-alive connection (e.g. it restarted). Reconnect and
+                # retry once if that is safe: reads, and writes carrying a request key. Any other
+                # write may already have been applied, so it is not repeated.
+                self.close_thread_db()
+                if attempt == 2 or not (idempotent if idempotent is not None else method == "GET"):
+                    raise
+            except (OSError, http.client.HTTPException):
+                self.close_thread_db() # Never reuse a connection left mid-request
+                raise
+        if response.status != 200:
+            raise ServiceError(payload.get("error") or f"HTTP {response.status}")
+        return payload
+
+    def close_thread_db(self):
+        """Closes the calling thread's connection."""
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            self._local.conn = None
+            with self._lock:
+                if conn in self._connections:
+                    self._connections.remove(conn)
+            conn.close()
+
+    def close_db(self):
+        """Closes every connection this client opened."""
+        with self._lock:
+            connections, self._connections = self._connections, []
+        for conn in connections:
+            conn.close()
+        self._local = threading.local()
+
+    def create_tables(self, maintenance=True):
+        """The service owns the schema and its maintenance; this only checks that it is reachable."""
+        self._request("GET", "/health")
+
+    def run_maintenance(self):
+        """Done by the service when it starts."""
+
+    def search_uses_fts(self):
+        return self._request("GET", "/health").get("search_fts", False)
+
+    # --- Stock ---
+
+    def get_all_stock(self, filters=None, sort_by="course_code", descending=False):
+        query = dict(filters or {}, sort_by=sort_by, descending=int(descending))
+        return [tuple(row) for row in self._request("GET", "/stock", query=query)["rows"]]
+
+    def get_stock_by_id(self, stock_id):
+        return _tuple(self._request("GET", f"/stock/{int(stock_id)}")["row"])
+
+    def get_stock_by_name(self, course_code):
+        return _tuple(self._request("GET", "/stock/by-code/" + quote(course_code, safe=""))["row"])
+
+    def get_course_codes(self):
+        return self._request("GET", "/course-codes")["course_codes"]
+
+    def add_stock(self, course_code, title, language, quantity):
+        payload = self._request("POST", "/stock", body={"course_code": course_code, "title": title,
+                                                         "language": language, "quantity": quantity})
+        return payload["success"], payload["message"]
+
+    def update_stock(self, stock_id, course_code, title, language, quantity):
+        payload = self._request("PUT", f"/stock/{int(stock_id)}", body={
+            "course_code": course_code, "title": title, "language": language, "quantity": quantity})
+        return payload["success"], payload["message"]
+
+    def delete_stock(self, stock_id):
+        payload = self._request("DELETE", f"/stock/{int(stock_id)}")
+        return payload["success"], payload["message"]
+
+    # --- Transactions ---
+
+    def add_transaction(self, stock_id, enrolment_no, action, quantity, name, remarks, phone, return_id=False,
+                        request_key=None):
+        # Always keyed, so a reconnect can resend it without adding the transaction twice
+        payload = self._request("POST", "/transactions", body={
+            "stock_id": stock_id, "enrolment_no": enrolment_no, "action": action, "quantity": quantity,
+            "name": name, "remarks": remarks, "phone": phone,
+            "request_key": request_key or uuid.uuid4().hex}, idempotent=True)
+        if return_id:
+            return payload["success"], payload["message"], payload.get("id")
+        return payload["success"], payload["message"]
+
+    def add_transactions_bulk(self, rows, skip_invalid=False, request_key=None):
+        payload = self._request("POST", "/transactions/bulk", body={
+            "rows": list(rows), "skip_invalid": skip_invalid, "request_key": request_key or uuid.uuid4().hex},
+            idempotent=True)
+        return payload["success"], payload["message"], [tuple(error) for error in payload["errors"]]
+
+    def checkout_cart(self, items, enrolment_no, name, remarks, phone, action='out', request_key=None):
+        payload = self._request("POST", "/transactions/checkout", body={
+            "items": [list(item) for item in items], "enrolment_no": enrolment_no, "name": name,
+            "remarks": remarks, "phone": phone, "action": action, "request_key": request_key or uuid.uuid4().hex},
+            idempotent=True)
+        return payload["success"], payload["message"], payload["ids"]
+
+    def get_transactions_page(self, filters=None, after=None, before=None, limit=200, include_archive=False,
+                              sort_by="transaction_time", descending=True):
+        query = dict(filters or {}, limit=limit, include_archive=int(include_archive), sort_by=sort_by,
+                     descending=int(descending))
+        for name, key in (("after", after), ("before", before)):
+            if key is not None: # The sort value goes as JSON, so a course code or a null survives the trip
+                query[name], query[name + "_id"] = json.dumps(key[0]), key[1]
+        payload = self._request("GET", "/transactions", query=query)
+        return [tuple(row) for row in payload["rows"]], _tuple(payload["first_key"]), _tuple(payload["last_key"])
+
+    def iter_transactions(self, filters=None, chunk_size=1000, include_archive=False, sort_by="transaction_time",
+                          descending=True):
+        """Yields every matching transaction, newest first by default, one page request at a time."""
+        after = None
+        while True:
+            rows, _, last_key = self.get_transactions_page(filters, after=after, limit=chunk_size,
+                                                           include_archive=include_archive, sort_by=sort_by,
+                                                           descending=descending)
+            yield from rows
+            if len(rows) < chunk_size:
+                return
+            after = last_key
+
+    def count_transactions(self, filters=None, include_archive=False):
+        query = dict(filters or {}, include_archive=int(include_archive))
+        return self._request("GET", "/transactions/count", query=query)["count"]
+
+    def get_transaction_by_id(self, transaction_id, include_archive=False):
+        return _tuple(self._request("GET", f"/transactions/{int(transaction_id)}",
+                                    query={"include_archive": int(include_archive)})["row"])
+
+    def get_transaction_row(self, transaction_id, include_archive=False):
+        payload = self._request("GET", f"/transactions/{int(transaction_id)}/row",
+                                query={"include_archive": int(include_archive)})
+        return _tuple(payload["row"]), _tuple(payload["key"])
+
+    def update_transaction_details(self, transaction_id, enrolment_no, name, remarks, phone):
+        payload = self._request("PUT", f"/transactions/{int(transaction_id)}", body={
+            "enrolment_no": enrolment_no, "name": name, "remarks": remarks, "phone": phone})
+        return payload["success"], payload["message"]
+
+    def delete_transaction(self, transaction_id):
+        payload = self._request("DELETE", f"/transactions/{int(transaction_id)}")
+        return payload["success"], payload["message"]
+
+    def get_outstanding_for_student(self, enrolment_no):
+        path = "/students/" + quote((enrolment_no or "").strip(), safe="") + "/outstanding"
+        return [tuple(row) for row in self._request("GET", path)["rows"]]
+
+    # --- Reports ---
+
+    def run_report(self, name, date_from=None, date_to=None):
+        payload = self._request("GET", "/reports/" + quote(name, safe=""), query={"from": date_from, "to": date_to})
+        return tuple(payload["columns"]), [tuple(row) for row in payload["rows"]]
@@ -0,0 +1,105 @@
+import os
+import sqlite3
+import threading
+import contention
+from instrumentation import InstrumentedConnection
+
+# Under a steady stream of writers SQLite's automatic checkpoint falls behind and the WAL grows
+# without bound (past 1 GB in seconds in benchmarks/contention.py), slowing every reader and
+# ending in a multi-second checkpoint. Writers check the WAL size after each write instead.
+WAL_CHECKPOINT_BYTES = 16 * 1024 * 1024
+
+# PRAGMAs applied once when a connection is opened, not on every call.
+PRAGMAS = (
+    "PRAGMA journal_mode = WAL",
+    "PRAGMA synchronous = NORMAL",
+    "PRAGMA foreign_keys = ON",
+    "PRAGMA cache_size = -16000",   # ~16 MB page cache (negative value = KiB)
+    "PRAGMA mmap_size = 268435456", # 256 MB memory-mapped I/O
+    "PRAGMA temp_store = MEMORY",
+    f"PRAGMA journal_size_limit = {WAL_CHECKPOINT_BYTES}", # Truncate the WAL back to this after a reset
+)
+
+class ConnectionManager:
+    """
+    Hands out one long-lived SQLite connection per thread for a database file.
+    Connections are opened lazily, configured once, and kept until close_all().
+    """
+    def __init__(self, db_name):
+        self.db_name = db_name
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._connections = [] # Every connection opened, so close_all() can reach other threads' ones
+        self._by_thread = {} # thread ident -> connection, for interrupt()
+
+    def _open(self):
+        # check_same_thread=False only so close_all() may close it from the shutdown thread;
+        # each connection is still used exclusively by the thread that opened it.
+        # InstrumentedConnection behaves like a plain connection unless instrumentation is enabled.
+        # timeout is SQLite's busy timeout: how long a write waits for another writer's lock.
+        conn = sqlite3.connect(self.db_name, timeout=contention.BUSY_TIMEOUT_MS / 1000, check_same_thread=False,
+                               factory=InstrumentedConnection)
+        for pragma in PRAGMAS:
+            conn.execute(pragma)
+        return conn
+
+    def connection(self):
+        """Returns this thread's connection, opening it on first use."""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._open()
+            self._local.conn = conn
+            with self._lock:
+                self._connections.append(conn)
+                self._by_thread[threading.get_ident()] = conn
+        return conn
+
+    def interrupt(self, thread_id):
+        """
+        Aborts the statement running on that thread's connection, which then raises
+        sqlite3.OperationalError("interrupted"). Safe to call from any thread.
+        """
+        with self._lock:
+            conn = self._by_thread.get(thread_id)
+        if conn is not None:
+            try:
+                conn.interrupt()
+            except sqlite3.ProgrammingError:
+                pass # Closed meanwhile; nothing is running on it
+
+    def checkpoint_if_large(self):
+        """Runs a passive checkpoint if the WAL file has grown past WAL_CHECKPOINT_BYTES."""
+        try:
+            size = os.path.getsize(self.db_name + "-wal")
+        except OSError:
+            return # No WAL yet
+        if size > WAL_CHECKPOINT_BYTES:
+            self.connection().execute("PRAGMA wal_checkpoint(PASSIVE)").fetchone()
+
+    def close_current(self):
+        """Closes the calling thread's connection, if it has one (for short-lived worker threads)."""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            return
+        self._local.conn = None
+        with self._lock:
+            if conn in self._connections:
+                self._connections.remove(conn)
+            self._by_thread.pop(threading.get_ident(), None)
+        conn.close()
+
+    def close_all(self):
+        """Closes every connection opened by this manager (e.g. when the app window closes)."""
+        with self._lock:
+            connections, self._connections = self._connections, []
+            self._by_thread = {}
+        for conn in connections:
+            try:
+                if conn.in_transaction:
+                    conn.rollback()
+                conn.execute("PRAGMA optimize") # Cheap; keeps planner statistics fresh for next start
+                conn.close()
+            except sqlite3.Error:
+                pass # Already closed or unusable; nothing left to release
+        # Threads that call connection() again will reopen lazily
+        self._local = threading.local()
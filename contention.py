@@ -0,0 +1,217 @@
+import functools
+import random
+import threading
+import time
+from collections import deque
+from datetime import timedelta
+import instrumentation
+import timestamps
+
+# --- Write Contention Policy ---
+# Several app instances (or service processes) can share inventory.db, and SQLite lets only one
+# of them write at a time. A writer that finds the lock taken first waits in SQLite's busy
+# handler for up to BUSY_TIMEOUT_MS. Some SQLITE_BUSY results bypass the busy handler (e.g. a
+# WAL read snapshot that went stale), and a long write elsewhere can outlast the timeout, so
+# each write function is also retried as a whole, up to MAX_ATTEMPTS times with exponential
+# backoff and jitter. Every failed attempt has rolled back completely, so retrying inside one
+# call never applies a write twice; request keys (below) cover a caller that retries after
+# losing the reply.
+
+BUSY_TIMEOUT_MS = 5000 # Applied to each connection when it is opened (see connection.py)
+MAX_ATTEMPTS = 4 # Attempts per write call, including the first
+BACKOFF_BASE = 0.05 # Seconds before the first retry; doubles on each further retry...
+BACKOFF_MAX = 1.0 # ...up to this. Each delay is jittered down by up to half.
+
+_BUSY_CODES = (5, 6) # SQLITE_BUSY, SQLITE_LOCKED (primary codes; extended codes are masked)
+
+_lock = threading.Lock()
+_state = threading.local() # The retry_on_busy call running on this thread
+_stats = {} # function name -> _Stats
+
+def configure(busy_timeout_ms=None, max_attempts=None, backoff_base=None, backoff_max=None):
+    """
+    Sets the contention policy. The busy timeout applies to connections opened afterwards
+    (database.set_database() or close_db() reopens them).
+    """
+    global BUSY_TIMEOUT_MS, MAX_ATTEMPTS, BACKOFF_BASE, BACKOFF_MAX
+    if busy_timeout_ms is not None:
+        BUSY_TIMEOUT_MS = int(busy_timeout_ms)
+    if max_attempts is not None:
+        MAX_ATTEMPTS = max(1, int(max_attempts))
+    if backoff_base is not None:
+        BACKOFF_BASE = float(backoff_base)
+    if backoff_max is not None:
+        BACKOFF_MAX = float(backoff_max)
+
+def is_busy(error):
+    """True if error means another connection holds a lock we need."""
+    code = getattr(error, "sqlite_errorcode", None)
+    if code is not None:
+        return code & 0xFF in _BUSY_CODES
+    message = str(error)
+    return "database is locked" in message or "database table is locked" in message
+
+def backoff_delay(attempt):
+    """Seconds to sleep after failed attempt number `attempt` (1-based)."""
+    return min(BACKOFF_MAX, BACKOFF_BASE * 2 ** (attempt - 1)) * random.uniform(0.5, 1.0)
+
+class _Retry(Exception):
+    """Raised by raise_if_busy to hand a busy attempt back to retry_on_busy."""
+
+class _Stats:
+    __slots__ = ("calls", "retried_calls", "retries", "gave_up", "backoff", "seconds", "lock_waits")
+
+    def __init__(self):
+        self.calls = 0
+        self.retried_calls = 0
+        self.retries = 0
+        self.gave_up = 0
+        self.backoff = 0.0
+        self.seconds = deque(maxlen=instrumentation.SAMPLES_KEPT)
+        self.lock_waits = deque(maxlen=instrumentation.SAMPLES_KEPT)
+
+def _stats_for(name):
+    stats = _stats.get(name)
+    if stats is None:
+        stats = _stats[name] = _Stats()
+    return stats
+
+def raise_if_busy(error):
+    """
+    Call from a write function's sqlite3.Error handler, after rolling back. Hands a busy error
+    back to the surrounding retry_on_busy while it has attempts left; otherwise returns, so the
+    function reports the failure the way it always has.
+    """
+    if not is_busy(error):
+        return
+    if getattr(_state, "attempts_left", 0) > 0:
+        raise _Retry(error)
+    _state.gave_up = True
+
+def retry_on_busy(func):
+    """Decorator for database write functions: retries the whole call on SQLITE_BUSY."""
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        if getattr(_state, "name", None) is not None: # Called from another write function; it retries
+            return func(*args, **kwargs)
+        _state.name = func.__name__
+        _state.gave_up = False
+        start = time.perf_counter()
+        attempt, backoff = 1, 0.0
+        try:
+            while True:
+                _state.attempts_left = MAX_ATTEMPTS - attempt
+                try:
+                    return func(*args, **kwargs)
+                except _Retry:
+                    delay = backoff_delay(attempt)
+                    time.sleep(delay)
+                    backoff += delay
+                    attempt += 1
+        finally:
+            seconds = time.perf_counter() - start
+            with _lock:
+                stats = _stats_for(func.__name__)
+                stats.calls += 1
+                stats.retries += attempt - 1
+                stats.retried_calls += attempt > 1
+                stats.gave_up += _state.gave_up
+                stats.backoff += backoff
+                stats.seconds.append(seconds)
+            _state.name = None
+            _state.attempts_left = 0
+    return wrapper
+
+def begin_immediate(cursor):
+    """Starts a write transaction, recording how long it waited for the write lock."""
+    start = time.perf_counter()
+    try:
+        cursor.execute("BEGIN IMMEDIATE")
+    finally: # A wait that ended in SQLITE_BUSY counts too
+        name = getattr(_state, "name", None)
+        if name is not None:
+            with _lock:
+                _stats_for(name).lock_waits.append(time.perf_counter() - start)
+
+# --- Statistics ---
+
+def _ms(sorted_values, p):
+    value = instrumentation.percentile(sorted_values, p)
+    return value * 1000 if value is not None else None
+
+def contention_stats():
+    """
+    {function: {calls, retried_calls, retries, gave_up, backoff_ms, p50_ms, p95_ms,
+    lock_wait_p50_ms, lock_wait_p95_ms}} over the recent calls of each write function.
+    Latencies include retries and backoff; lock waits are None for functions that don't take
+    the write lock up front.
+    """
+    with _lock:
+        snapshot = {name: (stats.calls, stats.retried_calls, stats.retries, stats.gave_up, stats.backoff,
+                           sorted(stats.seconds), sorted(stats.lock_waits))
+                    for name, stats in _stats.items()}
+    result = {}
+    for name, (calls, retried_calls, retries, gave_up, backoff, seconds, lock_waits) in snapshot.items():
+        result[name] = {"calls": calls, "retried_calls": retried_calls, "retries": retries, "gave_up": gave_up,
+                        "backoff_ms": backoff * 1000, "p50_ms": _ms(seconds, 50), "p95_ms": _ms(seconds, 95),
+                        "lock_wait_p50_ms": _ms(lock_waits, 50), "lock_wait_p95_ms": _ms(lock_waits, 95)}
+    return result
+
+def reset():
+    """Forgets all contention statistics."""
+    with _lock:
+        _stats.clear()
+
+# --- Request Keys ---
+# A caller that retries an add after losing the reply (a dropped service connection, a
+# double-clicked button) passes the same request key both times. The key is stored in the
+# same transaction as the write, so the second call finds it and returns the first result
+# instead of applying the write again. Keys are forgotten after REQUEST_KEY_MAX_AGE. created
+# is epoch milliseconds, like every other stored time (schema version 13; see timestamps.py).
+
+REQUEST_KEY_MAX_AGE = timedelta(days=7)
+
+def create_request_key_table(cursor):
+    """Creates request_key: one row per applied keyed write."""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS request_key (
+            key TEXT PRIMARY KEY,
+            transaction_id INTEGER,
+            created TIMESTAMP NOT NULL
+        ) WITHOUT ROWID
+    ''')
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_request_key_created ON request_key (created)")
+
+def convert_request_key_times(cursor):
+    """
+    Rewrites created, stored as text by sqlite3's datetime adapter before schema version 13,
+    as epoch milliseconds. Keys whose time can't be read are dropped: they would never expire.
+    """
+    timestamps.register_functions(cursor.connection)
+    cursor.execute("UPDATE request_key SET created = epoch_ms(created) WHERE typeof(created) = 'text'")
+    cursor.execute("DELETE FROM request_key WHERE typeof(created) = 'text'")
+
+def find_request(cursor, key):
+    """Returns (transaction_id,) if a write with this key was already applied, else None."""
+    cursor.execute("SELECT transaction_id FROM request_key WHERE key = ?", (key,))
+    return cursor.fetchone()
+
+def remember_request(cursor, key, transaction_id):
+    """Records key as applied. Call inside the write transaction it belongs to."""
+    cursor.execute("INSERT INTO request_key (key, transaction_id, created) VALUES (?, ?, ?)",
+                   (key, transaction_id, timestamps.now()))
+
+def prune_request_keys(conn):
+    """Deletes keys older than REQUEST_KEY_MAX_AGE. Returns the number deleted."""
+    cutoff = timestamps.now() - REQUEST_KEY_MAX_AGE // timedelta(milliseconds=1)
+    if not conn.execute("SELECT EXISTS(SELECT 1 FROM request_key WHERE created < ?)", (cutoff,)).fetchone()[0]:
+        return 0 # Nothing to do; don't take the write lock
+    cursor = conn.cursor()
+    try:
+        cursor.execute("BEGIN IMMEDIATE")
+        cursor.execute("DELETE FROM request_key WHERE created < ?", (cutoff,))
+        conn.commit()
+        return cursor.rowcount
+    except Exception:
+        conn.rollback()
+        raise
@@ -0,0 +1,52 @@
+import argparse
+import csv
+import database as db
+
+REQUIRED_COLUMNS = ("course_code", "action", "quantity")
+
+def read_transactions_csv(path):
+    """
+    Reads an issue sheet into a list of row dicts for db.add_transactions_bulk().
+    Header names are matched case-insensitively; unknown columns are ignored.
+    Raises ValueError if a required column is missing.
+    """
+    with open(path, newline="", encoding="utf-8-sig") as f:
+        reader = csv.DictReader(f)
+        header = {name.strip().lower(): name for name in (reader.fieldnames or []) if name}
+        missing = [column for column in REQUIRED_COLUMNS if column not in header]
+        if missing:
+            raise ValueError(f"CSV is missing required column(s): {', '.join(missing)}")
+        columns = [(field, header[field]) for field in db.BULK_FIELDS if field in header]
+        return [{field: (raw.get(name) or "").strip() for field, name in columns} for raw in reader]
+
+def import_transactions_csv(path, skip_invalid=False, source=None):
+    """
+    Imports a CSV of transactions in a single database transaction.
+    Returns (success, message, errors) like db.add_transactions_bulk, with errors keyed by CSV line
+    number (the header is line 1). source is the database module (default) or an InventoryClient.
+    """
+    try:
+        rows = read_transactions_csv(path)
+    except (OSError, ValueError, csv.Error) as e:
+        return False, f"Could not read CSV: {e}", []
+    if not rows:
+        return False, "CSV has no data rows.", []
+    success, message, errors = (source or db).add_transactions_bulk(rows, skip_invalid=skip_invalid)
+    return success, message, [(row_number + 1, error) for row_number, error in errors]
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Import transactions from a CSV issue sheet.")
+    parser.add_argument("csv_file")
+    parser.add_argument("--skip-invalid", action="store_true",
+                        help="Import the valid rows even if some rows are invalid")
+    parser.add_argument("--db", default=db.DB_NAME, help="Database file (default: %(default)s)")
+    args = parser.parse_args()
+
+    db.set_database(args.db)
+    db.create_tables()
+    success, message, errors = import_transactions_csv(args.csv_file, skip_invalid=args.skip_invalid)
+    for line_number, error in errors:
+        print(f"line {line_number}: {error}")
+    print(message)
+    db.close_db()
+    raise SystemExit(0 if success else 1)
@@ -1,47 +1,108 @@
+import functools
+import heapq
+import os
 import sqlite3
-from datetime import datetime
+import archive
+import balances
+from catalog import StockCatalog
+from connection import ConnectionManager
+import contention
+import instrumentation
+import ledger
+import live_filter
+import migrations
+import search
+import snapshots
+import timestamps
 
 DB_NAME = 'inventory.db'
+# Text filters match any substring with LIKE. FTS5 (see search.py) is faster on a large log but
+# only matches from the start of a word ("asics" no longer finds "Basics"), so it is opt-in
+USE_FTS_SEARCH = os.environ.get("INVENTORY_FTS_SEARCH", "") not in ("", "0")
+
+_manager = ConnectionManager(DB_NAME)
+_catalog = StockCatalog() # Cached stock table; see catalog.py
+
+def set_database(db_name):
+    """Points the module at a different database file, closing any open connections."""
+    global DB_NAME, _manager, _catalog
+    _manager.close_all()
+    DB_NAME = db_name
+    _manager = ConnectionManager(db_name)
+    _catalog = StockCatalog()
+
+def _fresh_catalog():
+    """Returns the stock catalog, reloading it first if another process changed the database."""
+    _catalog.ensure_fresh(connect_db())
+    return _catalog
 
 def connect_db():
-    """Establishes a connection to the SQLite database."""
-    return sqlite3.connect(DB_NAME)
+    """Returns this thread's long-lived connection to the SQLite database."""
+    return _manager.connection()
+
+def close_db():
+    """Closes all managed connections. Call on application shutdown."""
+    _manager.close_all()
+
+def close_thread_db():
+    """Closes the calling thread's connection. Call at the end of a short-lived worker thread."""
+    _manager.close_current()
+
+def interrupt_thread(thread_id):
+    """Aborts the query running on another thread's connection (e.g. a listing nobody is waiting for)."""
+    _manager.interrupt(thread_id)
+
+def _write(func):
+    """
+    Decorator for write functions: retried on SQLITE_BUSY (see contention.py), then keeps the
+    WAL short. Like the public read functions it is traced, so its statements are attributed to it.
+    """
+    retrying = contention.retry_on_busy(func)
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        result = retrying(*args, **kwargs)
+        _manager.checkpoint_if_large()
+        return result
+    return instrumentation.traced(wrapper)
+
+def _attach_archive(conn, create=False):
+    """Attaches the archive database (see archive.py) if it exists. Returns True if attached."""
+    return archive.attach(conn, archive.archive_path(DB_NAME), create)
+
+def _use_fts(conn):
+    """True when text filters should go through the FTS5 index instead of LIKE."""
+    return USE_FTS_SEARCH and search.has_search_index(conn)
 
-def create_tables():
-    """Creates the stock and transaction_log tables if they don't already exist."""
+@instrumentation.traced
+def search_uses_fts():
+    """True if text filters match word prefixes through the FTS5 index, False if they match substrings."""
+    return _use_fts(connect_db())
+
+@instrumentation.traced
+def create_tables(maintenance=True):
+    """
+    Creates or upgrades the schema to the latest version (see migrations.py), then runs
+    run_maintenance() unless maintenance is False. A current schema costs one PRAGMA read and
+    one index probe for log times still to be converted.
+    """
     conn = connect_db()
-    cursor = conn.cursor()
-    
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS stock (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            course_code TEXT NOT NULL UNIQUE,
-            title TEXT,
-            language TEXT,
-            quantity INTEGER NOT NULL DEFAULT 0
-        )
-    ''')
-    
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS transaction_log (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            stock_id INTEGER NOT NULL,
-            enrolment_no TEXT,
-            action TEXT NOT NULL CHECK (action IN ('in', 'out')),
-            quantity INTEGER NOT NULL,
-            transaction_time TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            name TEXT,
-            remarks TEXT,
-            phone TEXT,
-            FOREIGN KEY (stock_id) REFERENCES stock (id)
-        )
-    ''')
-    
-    conn.commit()
-    conn.close()
+    if migrations.get_version(conn) < migrations.LATEST_VERSION:
+        _attach_archive(conn) # Tables built from the log count the archived rows too
+        migrations.migrate(conn)
+    migrations.convert_log_times(conn) # Resumes an interrupted conversion too
+    if maintenance:
+        run_maintenance()
+
+@instrumentation.traced
+def run_maintenance():
+    """Takes the daily stock snapshot if it is due and forgets expired request keys."""
+    conn = connect_db()
+    snapshots.checkpoint_if_stale(conn)
+    contention.prune_request_keys(conn)
 
 # --- Stock Functions ---
 
+@_write
 def add_stock(course_code, title, language, quantity):
     """Adds a new stock item to the database."""
     conn = connect_db()
@@ -51,23 +112,43 @@ def add_stock(course_code, title, language, quantity):
             INSERT INTO stock (course_code, title, language, quantity)
             VALUES (?, ?, ?, ?)
         ''', (course_code, title, language, int(quantity)))
-        conn.commit()
+        _catalog.commit(conn, [cursor.lastrowid])
         return True, "Stock added successfully."
     except sqlite3.IntegrityError:
+        conn.rollback()
         return False, f"Book '{course_code}' already exists."
     except Exception as e:
+        conn.rollback()
+        contention.raise_if_busy(e)
         return False, f"Error adding stock: {e}"
-    finally:
-        conn.close()
 
-def get_all_stock(filters=None):
-    """Retrieves all stock items, optionally applying filters."""
+@instrumentation.traced
+def get_all_stock(filters=None, sort_by="course_code", descending=False):
+    """
+    Retrieves all stock items, optionally applying filters, ordered by sort_by (one of
+    STOCK_SORT_COLUMNS; ties go by id). An unknown sort_by raises ValueError.
+    """
+    if sort_by not in STOCK_SORT_COLUMNS:
+        raise ValueError(f"Stock can't be sorted by '{sort_by}'. Choose from: {', '.join(STOCK_SORT_COLUMNS)}.")
+    if not filters or not any(filters.values()):
+        return _fresh_catalog().all_rows(sort_by, descending) # Unfiltered listing comes straight from the cache
     conn = connect_db()
-    cursor = conn.cursor()
+    use_fts = _use_fts(conn)
+    # A substring filter has to read every row, and the cache holds every row: filter it there
+    # unless the filter can't be mirrored in memory (see live_filter.py)
+    predicate = live_filter.stock_predicate(filters, use_fts)
+    if predicate is not None:
+        return [row for row in _fresh_catalog().all_rows(sort_by, descending) if predicate(row)]
+    query, params = _stock_query(filters, sort_by, descending, use_fts)
+    return conn.execute(query, params).fetchall()
+
+def _stock_query(filters, sort_by="course_code", descending=False, use_fts=False):
+    """Builds get_all_stock's SELECT for filters, through the FTS5 index if use_fts. Returns (query, params)."""
     query = "SELECT id, course_code, title, language, quantity FROM stock"
     params = []
     if filters:
         conditions = []
+        text_filters = {}
         for col, val in filters.items():
             if val:
                 # Adjust column names for query if necessary
@@ -77,34 +158,37 @@ def get_all_stock(filters=None):
                 elif col == "language": db_col = "language"
                 else: continue # Skip unknown filter keys
 
+                text_filters[db_col] = val
+        expression = search.match_expression(text_filters) if text_filters and use_fts else None
+        if expression:
+            conditions.append("id IN (SELECT rowid FROM stock_fts WHERE stock_fts MATCH ?)")
+            params.append(expression)
+        else:
+            for db_col, val in text_filters.items():
                 conditions.append(f"{db_col} LIKE ?")
                 params.append(f"%{val}%")
         if conditions:
             query += " WHERE " + " AND ".join(conditions)
-    query += " ORDER BY course_code"
-    cursor.execute(query, params)
-    stock_items = cursor.fetchall()
-    conn.close()
-    return stock_items
+    direction = "DESC" if descending else "ASC"
+    query += f" ORDER BY {sort_by} {direction}, id {direction}"
+    return query, params
 
+@instrumentation.traced
 def get_stock_by_id(stock_id):
     """Retrieves a specific stock item by its ID."""
-    conn = connect_db()
-    cursor = conn.cursor()
-    cursor.execute("SELECT id, course_code, title, language, quantity FROM stock WHERE id = ?", (stock_id,))
-    stock_item = cursor.fetchone()
-    conn.close()
-    return stock_item
+    return _fresh_catalog().get_by_id(stock_id)
 
+@instrumentation.traced
 def get_stock_by_name(course_code):
     """Retrieves a specific stock item by its name."""
-    conn = connect_db()
-    cursor = conn.cursor()
-    cursor.execute("SELECT id, course_code, title, language, quantity FROM stock WHERE course_code = ?", (course_code,))
-    stock_item = cursor.fetchone()
-    conn.close()
-    return stock_item
+    return _fresh_catalog().get_by_code(course_code)
+
+@instrumentation.traced
+def get_course_codes():
+    """Returns every course code, sorted, for pickers such as the transaction form."""
+    return _fresh_catalog().course_codes()
 
+@_write
 def update_stock(stock_id, course_code, title, language, quantity):
     """Updates an existing stock item."""
     conn = connect_db()
@@ -115,43 +199,57 @@ def update_stock(stock_id, course_code, title, language, quantity):
             SET course_code = ?, title = ?, language = ?, quantity = ?
             WHERE id = ?
         ''', (course_code, title, language, int(quantity), stock_id))
-        conn.commit()
+        _catalog.commit(conn, [stock_id])
         if cursor.rowcount == 0:
             return False, "Stock item not found or no changes made."
         return True, "Stock updated successfully."
     except sqlite3.IntegrityError:
+        conn.rollback()
         return False, f"Course Code '{course_code}' might already exist for another item."
     except Exception as e:
+        conn.rollback()
+        contention.raise_if_busy(e)
         return False, f"Error updating stock: {e}"
-    finally:
-        conn.close()
 
+@_write
 def delete_stock(stock_id):
     """Deletes a stock item if no transactions are associated with it."""
     conn = connect_db()
     cursor = conn.cursor()
     try:
-        cursor.execute("SELECT COUNT(*) FROM transaction_log WHERE stock_id = ?", (stock_id,))
-        if cursor.fetchone()[0] > 0:
+        has_archive = _attach_archive(conn) # Archived history must keep its stock row too
+        # Hold the write lock across the check and the delete so no transaction can sneak in between
+        contention.begin_immediate(cursor)
+        cursor.execute("SELECT EXISTS(SELECT 1 FROM transaction_log WHERE stock_id = ?)", (stock_id,))
+        if cursor.fetchone()[0] or (has_archive and archive.stock_has_archived_rows(conn, stock_id)):
+            conn.rollback()
             return False, "Cannot delete stock: it has associated transactions. Please delete transactions first."
         
+        cursor.execute("DELETE FROM stock_snapshot WHERE stock_id = ?", (stock_id,))
         cursor.execute("DELETE FROM stock WHERE id = ?", (stock_id,))
-        conn.commit()
+        _catalog.commit(conn, [stock_id])
         if cursor.rowcount == 0:
             return False, "Stock item not found."
         return True, "Stock deleted successfully."
     except Exception as e:
         conn.rollback()
+        contention.raise_if_busy(e)
         return False, f"Error deleting stock: {e}"
-    finally:
-        conn.close()
 
 # --- Internal Stock Quantity Adjustment ---
 def _adjust_stock_quantity(cursor, stock_id, quantity_delta):
     """
     Adjusts stock quantity. Raises ValueError on issues.
     Assumes it's called within an existing transaction (cursor is passed).
+    A single conditional UPDATE does the check and the write, so concurrent writers can't lose
+    updates or oversell; the extra SELECT only runs on the failure path to explain why.
     """
+    cursor.execute(
+        "UPDATE stock SET quantity = quantity + ? WHERE id = ? AND quantity + ? >= 0",
+        (quantity_delta, stock_id, quantity_delta))
+    if cursor.rowcount == 1:
+        return
+
     cursor.execute("SELECT quantity FROM stock WHERE id = ?", (stock_id,))
     stock_row = cursor.fetchone()
     if not stock_row:
@@ -159,23 +257,31 @@ def _adjust_stock_quantity(cursor, stock_id, quantity_delta):
     
     current_quantity = stock_row[0]
     new_quantity = current_quantity + quantity_delta
-    
-    if new_quantity < 0:
-        raise ValueError(f"Stock for ID {stock_id} would be negative ({new_quantity}). Current: {current_quantity}, Change: {quantity_delta}.")
-        
-    cursor.execute("UPDATE stock SET quantity = ? WHERE id = ?", (new_quantity, stock_id))
+    raise ValueError(f"Stock for ID {stock_id} would be negative ({new_quantity}). Current: {current_quantity}, Change: {quantity_delta}.")
 
 # --- Transaction Functions ---
 
-def add_transaction(stock_id, enrolment_no, action, quantity, name, remarks, phone):
-    """Adds a new transaction and updates stock quantity."""
+def _result(success, message, with_id, row_id=None):
+    """Builds the (success, message) result, plus the new row id when the caller asked for it."""
+    return (success, message, row_id) if with_id else (success, message)
+
+@_write
+def add_transaction(stock_id, enrolment_no, action, quantity, name, remarks, phone, return_id=False,
+                    request_key=None):
+    """
+    Adds a new transaction and updates stock quantity.
+    With return_id=True the result is (success, message, transaction_id) so callers can show the
+    new row without re-reading the log; transaction_id is None on failure.
+    request_key makes the call safe to repeat: if a transaction was already added with the same
+    key, nothing is written and the result names that transaction (see contention.py).
+    """
     conn = connect_db()
     cursor = conn.cursor()
     
     try:
         quantity = int(quantity)
         if quantity <= 0:
-            return False, "Transaction quantity must be a positive integer."
+            return _result(False, "Transaction quantity must be a positive integer.", return_id)
 
         # Determine change in stock quantity based on action
         if action == 'out':
@@ -183,7 +289,15 @@ def add_transaction(stock_id, enrolment_no, action, quantity, name, remarks, pho
         elif action == 'in':
             stock_quantity_change = quantity
         else:
-            return False, "Invalid action. Must be 'in' or 'out'."
+            return _result(False, "Invalid action. Must be 'in' or 'out'.", return_id)
+
+        # Take the write lock up front rather than upgrading a read lock mid-transaction
+        contention.begin_immediate(cursor)
+        if request_key is not None:
+            previous = contention.find_request(cursor, request_key)
+            if previous:
+                conn.rollback()
+                return _result(True, "Transaction was already recorded.", return_id, previous[0])
 
         # Adjust stock quantity (will raise ValueError if stock goes negative on 'out')
         _adjust_stock_quantity(cursor, stock_id, stock_quantity_change)
@@ -192,44 +306,276 @@ def add_transaction(stock_id, enrolment_no, action, quantity, name, remarks, pho
         cursor.execute('''
             INSERT INTO transaction_log (stock_id, enrolment_no, action, quantity, transaction_time, name, remarks, phone)
             VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-        ''', (stock_id, enrolment_no, action, quantity, datetime.now(), name, remarks, phone))
+        ''', (stock_id, enrolment_no, action, quantity, timestamps.now(), name, remarks, phone))
+        transaction_id = cursor.lastrowid
+        if request_key is not None:
+            contention.remember_request(cursor, request_key, transaction_id)
+        if snapshots.snapshot_due(transaction_id, transaction_id):
+            snapshots.take_snapshot(cursor)
         
-        conn.commit()
-        return True, "Transaction added successfully and stock updated."
+        _catalog.commit(conn, [stock_id])
+        return _result(True, "Transaction added successfully and stock updated.", return_id, transaction_id)
     except ValueError as e: # Catches errors from _adjust_stock_quantity or int conversion
         conn.rollback()
-        return False, str(e)
+        return _result(False, str(e), return_id)
     except sqlite3.Error as e:
         conn.rollback()
-        return False, f"Database error: {e}"
-    finally:
-        conn.close()
+        contention.raise_if_busy(e)
+        return _result(False, f"Database error: {e}", return_id)
+
+BULK_FIELDS = ("course_code", "action", "quantity", "enrolment_no", "name", "remarks", "phone")
 
-def get_all_transactions(filters=None):
-    """Retrieves all transactions, joined with stock to show course_code."""
+def _stock_by_course_code(cursor, course_codes, chunk_size=500):
+    """Resolves course codes to {course_code: (stock_id, quantity)} with a few IN queries."""
+    course_codes = list(course_codes)
+    found = {}
+    for start in range(0, len(course_codes), chunk_size):
+        chunk = course_codes[start:start + chunk_size]
+        placeholders = ", ".join("?" * len(chunk))
+        cursor.execute(f"SELECT course_code, id, quantity FROM stock WHERE course_code IN ({placeholders})", chunk)
+        for course_code, stock_id, quantity in cursor.fetchall():
+            found[course_code] = (stock_id, quantity)
+    return found
+
+@_write
+def add_transactions_bulk(rows, skip_invalid=False, request_key=None):
+    """
+    Adds many transactions in one database transaction.
+    rows is an iterable of dicts keyed by BULK_FIELDS (course_code, action and quantity are required).
+    Every row is validated before anything is written, including that the running stock balance
+    never goes negative in row order. By default one invalid row aborts the whole batch; with
+    skip_invalid=True the valid rows are still committed.
+    Returns (success, message, errors) where errors is a list of (row_number, message), 1-based.
+    With a request_key, repeating an import that already succeeded writes nothing.
+    """
+    success, message, errors, _ = _insert_transactions(rows, skip_invalid, request_key)
+    return success, message, errors
+
+def _last_transaction_id(cursor):
+    """The highest transaction id ever issued, from sqlite_sequence (0 before the first insert)."""
+    row = cursor.execute("SELECT seq FROM sqlite_sequence WHERE name = 'transaction_log'").fetchone()
+    return row[0] if row else 0
+
+def _insert_transactions(rows, skip_invalid, request_key):
+    """add_transactions_bulk's work; also returns the new transaction ids, in row order."""
     conn = connect_db()
     cursor = conn.cursor()
-    query = """
+    rows = list(rows)
+    errors = []
+    parsed = [] # (row_number, course_code, action, quantity, row)
+    for row_number, row in enumerate(rows, start=1):
+        course_code = (row.get("course_code") or "").strip()
+        action = (row.get("action") or "").strip().lower()
+        if not course_code:
+            errors.append((row_number, "Course Code is required."))
+            continue
+        if action not in ('in', 'out'):
+            errors.append((row_number, "Invalid action. Must be 'in' or 'out'."))
+            continue
+        try:
+            quantity = int(row.get("quantity"))
+        except (TypeError, ValueError):
+            errors.append((row_number, "Quantity must be a valid integer."))
+            continue
+        if quantity <= 0:
+            errors.append((row_number, "Transaction quantity must be a positive integer."))
+            continue
+        parsed.append((row_number, course_code, action, quantity, row))
+
+    try:
+        # Take the write lock before reading quantities so the balance check can't go stale
+        contention.begin_immediate(cursor)
+        if request_key is not None and contention.find_request(cursor, request_key):
+            conn.rollback()
+            return True, "This import was already applied.", [], []
+        stock = _stock_by_course_code(cursor, {item[1] for item in parsed})
+
+        balances = {course_code: quantity for course_code, (_, quantity) in stock.items()}
+        deltas = {} # stock_id -> net quantity change
+        log_rows = []
+        now = timestamps.now()
+        for row_number, course_code, action, quantity, row in parsed:
+            if course_code not in stock:
+                errors.append((row_number, f"Stock item '{course_code}' not found."))
+                continue
+            change = quantity if action == 'in' else -quantity
+            if balances[course_code] + change < 0:
+                errors.append((row_number, f"Stock for '{course_code}' would be negative ({balances[course_code] + change})."))
+                continue
+            balances[course_code] += change
+            stock_id = stock[course_code][0]
+            deltas[stock_id] = deltas.get(stock_id, 0) + change
+            log_rows.append((stock_id, row.get("enrolment_no"), action, quantity, now,
+                             row.get("name"), row.get("remarks"), row.get("phone")))
+
+        errors.sort()
+        if errors and not skip_invalid:
+            conn.rollback()
+            return False, f"{len(errors)} of {len(rows)} rows are invalid; nothing was imported.", errors, []
+
+        cursor.executemany('''
+            INSERT INTO transaction_log (stock_id, enrolment_no, action, quantity, transaction_time, name, remarks, phone)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        ''', log_rows)
+        # AUTOINCREMENT never reuses an id (unlike MAX(id) + 1 after the newest row was deleted), and
+        # under the write lock the rows just inserted took consecutive ids up to the sequence value
+        first_id = _last_transaction_id(cursor) - len(log_rows) + 1
+        # One UPDATE per distinct stock item, not per row
+        cursor.executemany("UPDATE stock SET quantity = quantity + ? WHERE id = ?",
+                           [(delta, stock_id) for stock_id, delta in deltas.items() if delta])
+        if request_key is not None:
+            contention.remember_request(cursor, request_key, first_id if log_rows else None)
+        if log_rows and snapshots.snapshot_due(first_id, first_id + len(log_rows) - 1):
+            snapshots.take_snapshot(cursor)
+        _catalog.commit(conn, deltas)
+        message = f"Imported {len(log_rows)} transactions."
+        if errors:
+            message += f" Skipped {len(errors)} invalid rows."
+        return True, message, errors, list(range(first_id, first_id + len(log_rows)))
+    except sqlite3.Error as e:
+        conn.rollback()
+        contention.raise_if_busy(e)
+        return False, f"Database error: {e}", errors, []
+
+@_write
+def checkout_cart(items, enrolment_no, name, remarks, phone, action='out', request_key=None):
+    """
+    Records several books for one student at once: items is a list of (course_code, quantity).
+    Every item is checked against stock in one query and either all are recorded, in a single
+    database transaction, or none are.
+    Returns (success, message, transaction_ids) with the new ids in item order. A repeated
+    request_key writes nothing and returns no ids.
+    """
+    items = list(items)
+    if not items:
+        return False, "The cart is empty.", []
+    rows = [{"course_code": course_code, "action": action, "quantity": quantity, "enrolment_no": enrolment_no,
+             "name": name, "remarks": remarks, "phone": phone} for course_code, quantity in items]
+    success, message, errors, transaction_ids = _insert_transactions(rows, False, request_key)
+    if errors:
+        lines = [error if items[row_number - 1][0] in error else f"{items[row_number - 1][0]}: {error}"
+                 for row_number, error in errors]
+        return False, "Nothing was recorded:\n" + "\n".join(lines), []
+    if success and transaction_ids:
+        message = f"Checked out {len(transaction_ids)} items."
+    elif success:
+        message = "This checkout was already recorded."
+    return success, message, transaction_ids
+
+# --- Sorting ---
+# The columns a listing can be ordered by; anything else is refused, so ORDER BY never takes
+# arbitrary input. Stock is small and cached (catalog.py), so any of its columns will do. The
+# log only sorts by indexed columns, with the id as tie-break, so a sorted page is a walk of an
+# index from the previous page's (value, id) key however deep it is.
+STOCK_SORT_COLUMNS = ("id", "course_code", "title", "language", "quantity")
+TRANSACTION_SORT_COLUMNS = { # sort_by -> (SQL column, its index in a listing row)
+    "transaction_time": ("t.transaction_time", 5),
+    "id": ("t.id", 0),
+    "course_code": ("s.course_code", 1), # Walks stock by its UNIQUE index, then each item's rows
+    "enrolment_no": ("t.enrolment_no", 2),
+    "quantity": ("t.quantity", 4),
+}
+_NULLABLE_SORT_COLUMNS = {"enrolment_no"} # NULL sorts first ascending, last descending
+
+def _transaction_sort(sort_by):
+    """(SQL column, row index) for sort_by; ValueError if it isn't in TRANSACTION_SORT_COLUMNS."""
+    if sort_by not in TRANSACTION_SORT_COLUMNS:
+        raise ValueError(f"Transactions can't be sorted by '{sort_by}'. "
+                         f"Choose from: {', '.join(TRANSACTION_SORT_COLUMNS)}.")
+    return TRANSACTION_SORT_COLUMNS[sort_by]
+
+def _order_by(sort_by, descending):
+    column, _ = _transaction_sort(sort_by)
+    direction = "DESC" if descending else "ASC"
+    return f" ORDER BY {column} {direction}, t.id {direction}"
+
+def _row_order(sort_by):
+    """The merge key for listing rows from several logs, matching _order_by (see _sql_order)."""
+    _, index = _transaction_sort(sort_by)
+    return lambda row: (_sql_order(row[index]), row[0])
+
+def _sql_order(value):
+    """
+    Sort key ordering mixed values as SQLite does: NULL, then numbers, then text (such as a
+    stored time that timestamps.py couldn't convert).
+    """
+    if value is None:
+        return (0, 0)
+    if isinstance(value, str):
+        return (2, value)
+    return (1, value)
+
+def _page_segments(sort_by, key, ascending):
+    """
+    [(conditions, params)] selecting the rows past key (None: from the start) in the order an
+    ascending or descending query reaches them. Row value comparisons skip NULL, so the NULL
+    block of a nullable column (first ascending, last descending) is read as a segment of its own.
+    """
+    column, _ = _transaction_sort(sort_by)
+    past = ">" if ascending else "<"
+    if sort_by not in _NULLABLE_SORT_COLUMNS:
+        return [([f"({column}, t.id) {past} (?, ?)"], list(key))] if key is not None else [([], [])]
+    nulls = ([f"{column} IS NULL"], [])
+    values = ([f"{column} IS NOT NULL"], [])
+    if key is not None and key[0] is None: # Inside the NULL block
+        nulls = ([f"{column} IS NULL", f"t.id {past} ?"], [key[1]])
+        if not ascending:
+            values = None # The values came before it
+    elif key is not None:
+        values = ([f"({column}, t.id) {past} (?, ?)"], list(key))
+        if ascending:
+            nulls = None # The NULL block came before it
+    segments = [nulls, values] if ascending else [values, nulls]
+    return [segment for segment in segments if segment is not None]
+
+def _transaction_query(filters, archived=False, sort_by="transaction_time", use_fts=None):
+    """
+    Builds the SELECT ... FROM ... JOIN shared by the transaction listings, with the join order
+    suited to sort_by. With archived=True it reads the attached archive's log instead of the hot one.
+    use_fts overrides whether text filters go through the FTS5 index (None: as _use_fts decides).
+    Returns (query, conditions, params); callers finish it with _statement.
+    transaction_time is returned as stored (epoch milliseconds); see timestamps.format_timestamp.
+    """
+    log = archive.ARCHIVE_SCHEMA + ".transaction_log" if archived else "transaction_log"
+    query = f"""
         SELECT 
             t.id, 
             s.course_code, 
             t.enrolment_no, 
             t.action, 
             t.quantity, 
-            STRFTIME('%Y-%m-%d %H:%M:%S', t.transaction_time), 
+            t.transaction_time, 
             t.name, 
             t.remarks, 
             t.phone,
             t.stock_id  -- Keep for internal use if needed (e.g. for delete)
-        FROM transaction_log t
-        JOIN stock s ON t.stock_id = s.id
     """
+    # Unless filtering by course, CROSS JOIN pins transaction_log as the outer loop so the
+    # ORDER BY walks the sort column's index instead of sorting the whole log. Sorting by course
+    # code pins stock outside instead, filtered or not, so a page stops after the items it needs.
+    if sort_by == "course_code":
+        query += f" FROM stock s CROSS JOIN {log} t ON t.stock_id = s.id"
+    elif filters and filters.get("course_code"):
+        query += f" FROM {log} t JOIN stock s ON t.stock_id = s.id"
+    else:
+        query += f" FROM {log} t CROSS JOIN stock s ON t.stock_id = s.id"
+    conditions = [archive.NOT_IN_HOT_LOG] if archived else []
     params = []
     if filters:
-        conditions = []
-        # Supported filters: course_code, enrolment_no, action, name, remarks, phone
+        text_filters = {}
+        # Supported filters: course_code, enrolment_no, action, name, remarks, phone, date_from, date_to
         for key, val in filters.items():
             if val:
+                # Together a range scan of idx_transaction_log_time
+                if key == "date_from": # Inclusive; a date means from the start of that day
+                    conditions.append("t.transaction_time >= ?")
+                    params.append(timestamps.bound(val))
+                    continue
+                elif key == "date_to": # Inclusive; a date means up to the end of that day
+                    conditions.append("t.transaction_time < ?")
+                    params.append(timestamps.bound(val, end=True))
+                    continue
+
                 db_col = None
                 if key == "course_code": db_col = "s.course_code"
                 elif key == "enrolment_no": db_col = "t.enrolment_no"
@@ -243,45 +589,195 @@ def get_all_transactions(filters=None):
                         conditions.append(f"{db_col} = ?")
                         params.append(val)
                     else:
-                        conditions.append(f"{db_col} LIKE ?")
-                        params.append(f"%{val}%")
+                        text_filters[key] = (db_col, val)
+
+        # course_code is indexed in stock_fts, the other text columns in transaction_fts (hot log only)
+        if use_fts is None:
+            use_fts = bool(text_filters) and _use_fts(connect_db())
+        use_fts = use_fts and not archived
+        course_filter = {key: val for key, (_, val) in text_filters.items() if key == "course_code"}
+        log_filters = {key: val for key, (_, val) in text_filters.items() if key != "course_code"}
+        for fts_table, key_col, group in (("stock_fts", "t.stock_id", course_filter),
+                                          ("transaction_fts", "t.id", log_filters)):
+            expression = search.match_expression(group) if use_fts and group else None
+            if expression:
+                conditions.append(f"{key_col} IN (SELECT rowid FROM {fts_table} WHERE {fts_table} MATCH ?)")
+                params.append(expression)
+            else: # Fall back to substring LIKE
+                for key in group:
+                    db_col, val = text_filters[key]
+                    conditions.append(f"{db_col} LIKE ?")
+                    params.append(f"%{val}%")
+    return query, conditions, params
+
+def _statement(query, conditions, order=""):
+    """A _transaction_query query with its conditions as the WHERE clause, then order."""
+    return query + (" WHERE " + " AND ".join(conditions) if conditions else "") + order
+
+def _log_sources(conn, include_archive):
+    """The logs a listing reads: the hot one, plus the archive when asked for and present."""
+    return [False, True] if include_archive and _attach_archive(conn) else [False]
+
+@instrumentation.traced
+def get_all_transactions(filters=None, include_archive=False, sort_by="transaction_time", descending=True):
+    """
+    Retrieves all transactions, joined with stock to show course_code, newest first unless
+    sort_by (one of TRANSACTION_SORT_COLUMNS) and descending say otherwise.
+    filters may hold date_from/date_to (a date, datetime, 'YYYY-MM-DD[ HH:MM:SS]' string or epoch
+    milliseconds; both inclusive, a bare date covering its whole day) besides the text filters;
+    a malformed date or an unknown sort_by raises ValueError.
+    include_archive=True also returns rows moved to the archive database (see archive.py).
+    """
+    conn = connect_db()
+    cursor = conn.cursor()
+    results = []
+    for archived in _log_sources(conn, include_archive):
+        query, conditions, params = _transaction_query(filters, archived=archived, sort_by=sort_by)
+        cursor.execute(_statement(query, conditions, _order_by(sort_by, descending)), params)
+        results.append(cursor.fetchall())
+    if len(results) == 1:
+        return results[0]
+    return list(heapq.merge(*results, key=_row_order(sort_by), reverse=descending))
+
+@instrumentation.traced
+def get_transactions_page(filters=None, after=None, before=None, limit=200, include_archive=False,
+                          sort_by="transaction_time", descending=True):
+    """
+    Retrieves one page of transactions, newest first unless sort_by (one of
+    TRANSACTION_SORT_COLUMNS) and descending say otherwise, using keyset pagination on
+    (sort value, id) so deep pages cost the same as the first one.
+    Pass after=<key> for the next page or before=<key> for the previous one.
+    Returns (rows, first_key, last_key); rows have the same shape as get_all_transactions
+    and the keys are None when the page is empty.
+    With include_archive=True the page is merged from the hot log and the archive.
+    """
+    conn = connect_db()
+    cursor = conn.cursor()
+    limit = int(limit)
+    _, index = _transaction_sort(sort_by)
+    # Walking back towards the start reads the index the other way; flip the page back afterwards
+    backwards = after is None and before is not None
+    ascending = descending if backwards else not descending
+    order = _order_by(sort_by, not ascending) + " LIMIT ?"
+    pages = []
+    for archived in _log_sources(conn, include_archive):
+        query, conditions, params = _transaction_query(filters, archived=archived, sort_by=sort_by)
+        page = []
+        for extra_conditions, extra_params in _page_segments(sort_by, before if backwards else after, ascending):
+            cursor.execute(_statement(query, conditions + extra_conditions, order),
+                           params + extra_params + [limit - len(page)])
+            page += cursor.fetchall()
+            if len(page) >= limit:
+                break
+        pages.append(page)
+    if len(pages) == 1:
+        page = pages[0]
+    else: # Each source returned its best `limit` rows; the page is the best `limit` of those
+        page = list(heapq.merge(*pages, key=_row_order(sort_by), reverse=not ascending))[:limit]
+    if backwards:
+        page.reverse()
+    if not page:
+        return [], None, None
+    return page, (page[0][index], page[0][0]), (page[-1][index], page[-1][0])
+
+def _iter_query(conn, query, params, chunk_size):
+    cursor = conn.cursor()
+    cursor.execute(query, params)
+    try:
+        while True:
+            chunk = cursor.fetchmany(chunk_size)
+            if not chunk:
+                break
+            yield from chunk
+    finally:
+        cursor.close()
+
+@instrumentation.traced
+def iter_transactions(filters=None, chunk_size=1000, include_archive=False, sort_by="transaction_time",
+                      descending=True):
+    """
+    Yields transactions one at a time, in get_all_transactions order, reading the cursor in
+    fetchmany chunks so memory stays flat however large the log is. Rows match get_all_transactions.
+    """
+    conn = connect_db()
+    streams = []
+    for archived in _log_sources(conn, include_archive):
+        query, conditions, params = _transaction_query(filters, archived=archived, sort_by=sort_by)
+        streams.append(_iter_query(conn, _statement(query, conditions, _order_by(sort_by, descending)), params,
+                                   chunk_size))
+    if len(streams) == 1:
+        yield from streams[0]
+    else:
+        yield from heapq.merge(*streams, key=_row_order(sort_by), reverse=descending)
+
+@instrumentation.traced
+def count_transactions(filters=None, include_archive=False):
+    """Counts the transactions matching filters without fetching them."""
+    conn = connect_db()
+    total = 0
+    for archived in _log_sources(conn, include_archive):
+        query, conditions, params = _transaction_query(filters, archived=archived)
+        query = "SELECT COUNT(*) FROM (" + query
         if conditions:
             query += " WHERE " + " AND ".join(conditions)
-    
-    query += " ORDER BY t.transaction_time DESC"
-    cursor.execute(query, params)
-    transactions = cursor.fetchall()
-    conn.close()
-    return transactions
+        query += ")"
+        total += conn.execute(query, params).fetchone()[0]
+    return total
 
-def get_transaction_by_id(transaction_id):
-    """Retrieves a specific transaction by its ID, with course_code."""
+@instrumentation.traced
+def get_transaction_row(transaction_id, include_archive=False):
+    """
+    Retrieves one transaction in the listing shape used by get_all_transactions, plus its
+    keyset key (transaction_time, id). Returns (row, key), or (None, None) if it doesn't exist.
+    """
+    conn = connect_db()
+    for archived in _log_sources(conn, include_archive):
+        query, conditions, params = _transaction_query(None, archived=archived)
+        conditions.append("t.id = ?")
+        row = conn.execute(query + " WHERE " + " AND ".join(conditions), params + [transaction_id]).fetchone()
+        if row is not None:
+            return row, (row[5], row[0])
+    return None, None
+
+@instrumentation.traced
+def get_transaction_by_id(transaction_id, include_archive=False):
+    """
+    Retrieves a specific transaction by its ID, with course_code.
+    Archived transactions (include_archive=True) are found too but can't be edited or deleted.
+    """
     conn = connect_db()
     cursor = conn.cursor()
-    cursor.execute("""
-        SELECT 
-            t.id, t.stock_id, s.course_code, t.enrolment_no, t.action, t.quantity, 
-            STRFTIME('%Y-%m-%d %H:%M:%S', t.transaction_time), t.name, t.remarks, t.phone
-        FROM transaction_log t
-        JOIN stock s ON t.stock_id = s.id
-        WHERE t.id = ?
-    """, (transaction_id,))
-    transaction = cursor.fetchone() # Returns (trans_id, stock_id, course_code, ...)
-    conn.close()
-    return transaction
+    for table in [f"{archive.ARCHIVE_SCHEMA}.transaction_log" if archived else "transaction_log"
+                  for archived in _log_sources(conn, include_archive)]:
+        cursor.execute(f"""
+            SELECT 
+                t.id, t.stock_id, s.course_code, t.enrolment_no, t.action, t.quantity, 
+                t.transaction_time, t.name, t.remarks, t.phone
+            FROM {table} t
+            JOIN stock s ON t.stock_id = s.id
+            WHERE t.id = ?
+        """, (transaction_id,))
+        transaction = cursor.fetchone() # Returns (trans_id, stock_id, course_code, ...)
+        if transaction is not None:
+            return transaction
+    return None
 
+@_write
 def delete_transaction(transaction_id):
     """Deletes a transaction and reverts the stock quantity change."""
     conn = connect_db()
     cursor = conn.cursor()
     try:
+        # Lock before reading so the row can't be deleted by another counter in the meantime
+        contention.begin_immediate(cursor)
         # Get transaction details to revert stock quantity
-        cursor.execute("SELECT stock_id, action, quantity FROM transaction_log WHERE id = ?", (transaction_id,))
+        cursor.execute("SELECT stock_id, action, quantity, transaction_time FROM transaction_log WHERE id = ?", (transaction_id,))
         transaction_data = cursor.fetchone()
         if not transaction_data:
+            conn.rollback()
             return False, "Transaction not found."
 
-        stock_id, action, trans_quantity = transaction_data
+        stock_id, action, trans_quantity, transaction_time = transaction_data
         stock_quantity_change = 0
         if action == 'in': # Reverting an 'in' means decreasing stock
             stock_quantity_change = -trans_quantity
@@ -290,10 +786,12 @@ def delete_transaction(transaction_id):
         
         # Adjust stock quantity. _adjust_stock_quantity will raise ValueError if it goes negative.
         _adjust_stock_quantity(cursor, stock_id, stock_quantity_change)
+        # Snapshots taken after the row was logged included it; take it out of them too
+        snapshots.revise_snapshots(cursor, stock_id, transaction_time, stock_quantity_change)
 
         # Delete the transaction
         cursor.execute("DELETE FROM transaction_log WHERE id = ?", (transaction_id,))
-        conn.commit()
+        _catalog.commit(conn, [stock_id])
         if cursor.rowcount == 0: # Should not happen if fetchone() succeeded
              return False, "Transaction not found during delete."
         return True, "Transaction deleted successfully and stock updated."
@@ -302,10 +800,10 @@ def delete_transaction(transaction_id):
         return False, f"Failed to adjust stock: {e}. Transaction not deleted."
     except sqlite3.Error as e:
         conn.rollback()
+        contention.raise_if_busy(e)
         return False, f"Database error: {e}"
-    finally:
-        conn.close()
 
+@_write
 def update_transaction_details(transaction_id, enrolment_no, name, remarks, phone):
     """Updates non-critical details of a transaction (enrolment_no, name, remarks, phone)."""
     conn = connect_db()
@@ -322,9 +820,194 @@ def update_transaction_details(transaction_id, enrolment_no, name, remarks, phon
         return True, "Transaction details updated successfully."
     except sqlite3.Error as e:
         conn.rollback()
+        contention.raise_if_busy(e)
         return False, f"Database error updating transaction: {e}"
-    finally:
-        conn.close()
+
+# --- Stock History ---
+
+def _log_deltas(conn, start, end, stock_id):
+    """snapshots.log_deltas, plus the archived rows when [start, end) reaches back into them."""
+    deltas = snapshots.log_deltas(conn, start, end, stock_id)
+    through = archive.archived_through(conn)
+    if through is not None and (start is None or start <= through) and _attach_archive(conn):
+        for sid, delta in archive.archived_deltas(conn, start, end, stock_id).items():
+            deltas[sid] = deltas.get(sid, 0) + delta
+    return deltas
+
+@instrumentation.traced
+def get_stock_as_of(timestamp, stock_id=None):
+    """
+    Reconstructs stock quantities as they were at timestamp (date, datetime, string or epoch
+    milliseconds; a bare date means the end of that day). Starts from the nearest snapshot (see snapshots.py) and replays only
+    the log between it and timestamp, so lookups don't slow down as the log grows.
+    Returns rows shaped like get_all_stock(), or a single row (None if not found) with stock_id.
+    Quantities set directly through update_stock are not logged and so are not reconstructed.
+    """
+    conn = connect_db()
+    catalog = _fresh_catalog()
+    if stock_id is not None:
+        row = catalog.get_by_id(stock_id)
+        rows = [row] if row else []
+    else:
+        rows = catalog.all_rows()
+    end = timestamps.bound(timestamp, end=True) # Log rows before this are counted
+
+    # Use whichever base is closest in time: a snapshot before the moment (replay forward), or
+    # the first snapshot after it, or failing that the live stock table (replay backward)
+    earlier, later = snapshots.nearest_snapshots(conn, end)
+    candidates = []
+    if earlier is not None:
+        candidates.append((end - earlier, earlier, 1))
+    if later is not None:
+        candidates.append((later - end, later, -1))
+    else:
+        candidates.append((timestamps.now() - end, None, -1))
+    _, base, direction = min(candidates, key=lambda candidate: candidate[0])
+
+    quantities = {}
+    if base is not None:
+        covered = base + 1 # A snapshot includes the rows logged at its own time
+        quantities = snapshots.snapshot_quantities(conn, base, stock_id)
+        if direction > 0:
+            deltas = _log_deltas(conn, covered, end, stock_id)
+        else:
+            deltas = _log_deltas(conn, end, covered, stock_id)
+        for sid, delta in deltas.items():
+            if sid in quantities:
+                quantities[sid] += direction * delta
+
+    # Items the snapshot doesn't know (added since, or no snapshot used): walk back from the live quantity
+    missing = [row for row in rows if row[0] not in quantities]
+    if missing:
+        deltas = _log_deltas(conn, end, None, stock_id)
+        for row in missing:
+            quantities[row[0]] = row[4] - deltas.get(row[0], 0)
+
+    result = [row[:4] + (quantities[row[0]],) for row in rows]
+    if stock_id is not None:
+        return result[0] if result else None
+    return result
+
+@_write
+def take_stock_snapshot():
+    """Checkpoints every stock quantity now. Snapshots are also taken automatically (see snapshots.py)."""
+    conn = connect_db()
+    cursor = conn.cursor()
+    try:
+        contention.begin_immediate(cursor)
+        snapshot_time = snapshots.take_snapshot(cursor)
+        conn.commit()
+        return True, f"Stock snapshot taken at {timestamps.format_timestamp(snapshot_time)}."
+    except sqlite3.Error as e:
+        conn.rollback()
+        contention.raise_if_busy(e)
+        return False, f"Database error: {e}"
+
+@_write
+def verify_stock_ledger(repair=False):
+    """
+    Checks every stock quantity against its opening balance plus the net of its transactions
+    (see ledger.py). Only the transactions logged since the previous check are read. Returns
+    (consistent, message, drift), drift being [(course_code, stock_id, quantity, expected)].
+    With repair=True drifted quantities are set back to what the log says.
+    """
+    conn = connect_db()
+    cursor = conn.cursor()
+    try:
+        _attach_archive(conn) # Rows archived since the last check still count
+        contention.begin_immediate(cursor)
+        checkpoint, through, drift = ledger.verify(cursor, timestamps.now())
+        if drift and repair:
+            ledger.repair(cursor, drift)
+        _catalog.commit(conn, [stock_id for _, stock_id, _, _ in drift] if repair else ())
+    except sqlite3.Error as e:
+        conn.rollback()
+        contention.raise_if_busy(e)
+        return False, f"Database error: {e}", []
+    checked = f"Checked transactions {checkpoint + 1} to {through}." if through > checkpoint else "No new transactions."
+    if not drift:
+        return True, f"{checked} Stock quantities match the log.", []
+    message = f"{checked} {len(drift)} stock items differ from the log."
+    return False, message + (" Repaired." if repair else ""), drift
+
+# --- Student Balances ---
+
+@instrumentation.traced
+def get_outstanding_for_student(enrolment_no):
+    """
+    The items enrolment_no has taken out and not returned, read from the student_balance ledger
+    (see balances.py) with one index range read, already in course order:
+    [(stock_id, course_code, title, outstanding, last_out)] by course_code, where last_out is
+    the newest issue in epoch milliseconds.
+    """
+    return connect_db().execute('''
+        SELECT b.stock_id, b.course_code, s.title, b.outstanding, b.last_out
+        FROM student_balance b
+        CROSS JOIN stock s ON s.id = b.stock_id
+        WHERE b.enrolment_no = ? AND b.outstanding > 0
+        ORDER BY b.course_code
+    ''', ((enrolment_no or "").strip(),)).fetchall()
+
+@_write
+def check_student_balances(repair=False):
+    """
+    Rebuilds every student balance from the log (archive included) and compares it with the
+    ledger. Returns (consistent, message, mismatches), mismatches as balances.check() gives
+    them. With repair=True a ledger that differs is replaced by the rebuilt rows.
+    """
+    conn = connect_db()
+    cursor = conn.cursor()
+    try:
+        _attach_archive(conn)
+        # One transaction, so a write landing mid-check can't show up as a difference
+        if repair:
+            contention.begin_immediate(cursor)
+        else:
+            cursor.execute("BEGIN")
+        mismatches = balances.check(conn)
+        if mismatches and repair:
+            balances.repair(cursor)
+        conn.commit()
+    except sqlite3.Error as e:
+        conn.rollback()
+        contention.raise_if_busy(e)
+        return False, f"Database error: {e}", []
+    if not mismatches:
+        return True, "Student balances match the log.", []
+    message = f"{len(mismatches)} student balances differ from the log."
+    return False, message + (" Repaired." if repair else ""), mismatches
+
+# --- Archive ---
+
+@_write
+def archive_transactions(before, batch_size=archive.DEFAULT_BATCH_SIZE, vacuum=False, progress=None):
+    """
+    Moves transactions logged before `before` (a date means the start of that day) to the archive
+    database in batches of batch_size, each committed separately so other counters only wait
+    for one batch at a time. Stock quantities, snapshots and report summaries are unaffected;
+    listings see archived rows with include_archive=True. With vacuum=True the hot database file
+    is compacted afterwards. progress(rows_moved_so_far) is called after each batch.
+    """
+    conn = connect_db()
+    try:
+        cutoff = timestamps.bound(before)
+        _attach_archive(conn, create=True)
+        moved = 0
+        while True:
+            count = archive.archive_batch(conn, contention.begin_immediate, cutoff, batch_size)
+            moved += count
+            if progress:
+                progress(moved)
+            if count < batch_size:
+                break
+        if vacuum and moved:
+            conn.execute("VACUUM main")
+        return True, f"Archived {moved} transactions logged before {timestamps.format_timestamp(cutoff)}."
+    except ValueError as e: # Malformed date
+        return False, f"Invalid date: {e}"
+    except sqlite3.Error as e:
+        contention.raise_if_busy(e)
+        return False, f"Database error: {e}"
 
 if __name__ == '__main__':
     create_tables()
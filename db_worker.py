@@ -0,0 +1,200 @@
+import functools
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+import instrumentation
+
+class _ActionTimer:
+    """A user action in progress: open until its handler returns, done when no jobs are pending."""
+    __slots__ = ("name", "start", "end", "pending", "open", "submitted")
+
+    def __init__(self, name):
+        self.name = name
+        self.start = time.perf_counter()
+        self.end = self.start
+        self.pending = 0
+        self.open = True
+        self.submitted = False
+
+def timed_action(method):
+    """
+    Decorator for InventoryApp handlers: records how long the action takes from the call until the
+    results of all the database jobs it started are back on the Tk thread (see DBWorker.action).
+    """
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self.db_worker.action(method.__name__):
+            return method(self, *args, **kwargs)
+    return wrapper
+
+class DBWorker:
+    """
+    Runs database calls on a single background thread so the Tk mainloop never blocks.
+    That thread owns its own connection (database.connect_db() is per thread) and runs jobs in
+    submission order, so a refresh submitted after a write always sees the write.
+    Results are handed back to the Tk thread through a queue drained by root.after().
+    """
+    POLL_MS = 15
+
+    def __init__(self, root, on_busy_change=None, on_error=None, interrupt=None):
+        self.root = root
+        self.on_busy_change = on_busy_change # Called with True/False when work starts/finishes
+        self.on_error = on_error # Default error_callback for jobs that don't pass one
+        self.interrupt = interrupt # interrupt(thread_id) aborts the query running on the worker thread, if given
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="db-worker")
+        self._results = queue.Queue()
+        self._pending = 0
+        self._generations = {} # key -> id of the newest job submitted under that key
+        self._futures = {} # key -> (future, job id, interruptible) of the newest job, so superseded ones can be stopped
+        self._running_lock = threading.Lock()
+        self._running = None # (job id, thread id) of the job executing right now
+        self._next_job_id = 0
+        self._polling = False
+        self._closed = False
+        self._action = None # _ActionTimer that new jobs are counted against, if any
+
+    def submit(self, func, *args, callback=None, error_callback=None, key=None, interruptible=False, **kwargs):
+        """
+        Queues func(*args, **kwargs) on the worker thread.
+        callback(result) or error_callback(exception) then runs on the Tk thread.
+        Jobs sharing a key supersede each other: an older job that hasn't started is cancelled,
+        and an older result that arrives late is dropped. An interruptible job (a read; never a
+        write) that is already running when superseded has its query aborted as well.
+        """
+        if self._closed:
+            return None
+        self._next_job_id += 1
+        job_id = self._next_job_id
+        if key is not None:
+            self._supersede(key)
+            self._generations[key] = job_id
+
+        action = self._action
+        if action is not None:
+            action.pending += 1
+            action.submitted = True
+        future = self._executor.submit(self._run, job_id, func, args, kwargs)
+        future.add_done_callback(lambda f: self._results.put((f, key, job_id, callback, error_callback, action)))
+        if key is not None:
+            self._futures[key] = (future, job_id, interruptible)
+        self._pending += 1
+        if self._pending == 1 and self.on_busy_change:
+            self.on_busy_change(True)
+        if not self._polling:
+            self._polling = True
+            self.root.after(self.POLL_MS, self._poll)
+        return future
+
+    def cancel(self, key):
+        """Stops the newest job submitted under key, as a newer submit would, without starting another."""
+        self._supersede(key)
+        self._generations.pop(key, None) # Its result, if it still arrives, is dropped
+
+    def has_pending(self, key):
+        """True while the newest job submitted under key hasn't delivered its result."""
+        return key in self._futures
+
+    def _supersede(self, key):
+        entry = self._futures.pop(key, None)
+        if entry is None:
+            return
+        future, job_id, interruptible = entry
+        if future.cancel():
+            self._job_done()
+        elif interruptible and self.interrupt:
+            # Held while checking so the interrupt can't land on a job started after this one
+            with self._running_lock:
+                if self._running is not None and self._running[0] == job_id:
+                    self.interrupt(self._running[1])
+
+    def _run(self, job_id, func, args, kwargs):
+        # Runs on the worker thread
+        with self._running_lock:
+            self._running = (job_id, threading.get_ident())
+        try:
+            return func(*args, **kwargs)
+        finally:
+            with self._running_lock:
+                self._running = None
+
+    def _job_done(self):
+        self._pending -= 1
+        if self._pending == 0 and self.on_busy_change:
+            self.on_busy_change(False)
+
+    def _poll(self):
+        # Runs on the Tk thread: deliver every finished job, then keep polling while work is queued
+        while True:
+            try:
+                future, key, job_id, callback, error_callback, action = self._results.get_nowait()
+            except queue.Empty:
+                break
+            if action is not None:
+                action.end = time.perf_counter()
+            try:
+                self._deliver(future, key, job_id, callback, error_callback, action)
+            finally:
+                if action is not None:
+                    action.pending -= 1
+                    self._finish_action(action)
+        if self._pending > 0 and not self._closed:
+            self.root.after(self.POLL_MS, self._poll)
+        else:
+            self._polling = False
+
+    def _deliver(self, future, key, job_id, callback, error_callback, action):
+        if future.cancelled():
+            return # Already accounted for when it was cancelled
+        self._job_done()
+        if key is not None:
+            if self._generations.get(key) != job_id:
+                return # Superseded by a newer job with the same key
+            self._futures.pop(key, None)
+        # Jobs submitted from the callback belong to the same action
+        outer, self._action = self._action, action
+        try:
+            error = future.exception()
+            if error is not None:
+                error_callback = error_callback or self.on_error
+                if error_callback:
+                    error_callback(error)
+                else:
+                    self.root.report_callback_exception(type(error), error, error.__traceback__)
+            elif callback:
+                callback(future.result())
+        finally:
+            self._action = outer
+
+    @contextmanager
+    def action(self, name):
+        """
+        Times a user action named name: from now until the result of the last job submitted inside
+        the block (or by the callbacks of those jobs) reaches the Tk thread. Time the callbacks
+        spend waiting in message boxes is therefore not counted. The result goes to
+        instrumentation.record_action. Nested actions join the outer one; does nothing while
+        instrumentation is disabled.
+        """
+        if self._action is not None or not instrumentation.ENABLED:
+            yield
+            return
+        action = self._action = _ActionTimer(name)
+        try:
+            yield
+        finally:
+            self._action = None
+            action.open = False
+            self._finish_action(action)
+
+    def _finish_action(self, action):
+        if action.open or action.pending or action.start is None:
+            return
+        if action.submitted: # Actions that did no database work (e.g. failed validation) aren't recorded
+            instrumentation.record_action(action.name, action.end - action.start)
+        action.start = None # Recorded once
+
+    def shutdown(self):
+        """Cancels queued jobs and waits for the running one to finish."""
+        self._closed = True
+        self._executor.shutdown(wait=True, cancel_futures=True)
@@ -0,0 +1,68 @@
+import argparse
+import csv
+import json
+import database as db
+import timestamps
+
+EXPORT_COLUMNS = ("id", "course_code", "enrolment_no", "action", "quantity", "transaction_time",
+                  "name", "remarks", "phone", "stock_id")
+FORMATS = ("csv", "jsonl")
+
+def export_transactions(path, fmt="csv", filters=None, progress=None, chunk_size=1000, source=None,
+                        include_archive=False):
+    """
+    Streams the transaction log to a CSV or JSON Lines file without loading it into memory.
+    filters takes the same keys as db.get_all_transactions, including date_from/date_to.
+    progress, if given, is called as progress(rows_written, total_rows) after every chunk and
+    may return False to cancel the export.
+    source is the database module (default) or an InventoryClient. include_archive=True also
+    exports rows moved to the archive database.
+    Returns the number of rows written.
+    """
+    source = source or db
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown export format '{fmt}'. Must be one of: {', '.join(FORMATS)}.")
+    total = source.count_transactions(filters, include_archive=include_archive) if progress else None
+
+    written = 0
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        if fmt == "csv":
+            writer = csv.writer(f)
+            writer.writerow(EXPORT_COLUMNS)
+            write_row = writer.writerow
+        else:
+            def write_row(row):
+                f.write(json.dumps(dict(zip(EXPORT_COLUMNS, row)), ensure_ascii=False))
+                f.write("\n")
+
+        for row in source.iter_transactions(filters, chunk_size=chunk_size, include_archive=include_archive):
+            write_row(row[:5] + (timestamps.format_timestamp(row[5]),) + row[6:])
+            written += 1
+            if progress and written % chunk_size == 0:
+                if progress(written, total) is False:
+                    break
+    if progress:
+        progress(written, total)
+    return written
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Export the transaction log to CSV or JSON Lines.")
+    parser.add_argument("output")
+    parser.add_argument("--format", choices=FORMATS, help="Defaults to the output file extension, else csv")
+    parser.add_argument("--from", dest="date_from", help="First day to include (YYYY-MM-DD)")
+    parser.add_argument("--to", dest="date_to", help="Last day to include (YYYY-MM-DD)")
+    for key in ("course_code", "enrolment_no", "action", "name", "remarks", "phone"):
+        parser.add_argument("--" + key.replace("_", "-"), dest=key)
+    parser.add_argument("--include-archive", action="store_true", help="Also export archived transactions")
+    parser.add_argument("--db", default=db.DB_NAME, help="Database file (default: %(default)s)")
+    args = parser.parse_args()
+
+    fmt = args.format or ("jsonl" if args.output.lower().endswith((".jsonl", ".json")) else "csv")
+    filters = {key: getattr(args, key) for key in ("course_code", "enrolment_no", "action", "name",
+                                                   "remarks", "phone", "date_from", "date_to")}
+    db.set_database(args.db)
+    rows = export_transactions(args.output, fmt, filters,
+                               progress=lambda done, total: print(f"\r{done}/{total} rows", end="", flush=True),
+                               include_archive=args.include_archive)
+    print(f"\nExported {rows} transactions to {args.output}.")
+    db.close_db()
@@ -0,0 +1,293 @@
+import functools
+import inspect
+import logging
+import os
+import sqlite3
+import sys
+import threading
+import time
+from collections import deque
+
+# --- Query Instrumentation ---
+# Every connection is opened with InstrumentedConnection (see connection.py). While ENABLED is
+# False it hands out plain sqlite3 cursors, so the only cost is one Python call per
+# conn.execute()/conn.cursor(). While enabled, each statement is timed from execute until its
+# rows have been fetched, attributed to the public operation it ran under (the outermost
+# function marked @traced, e.g. database.checkout_cart, rather than the helper that issued it),
+# and written to the slow-query log if it took longer than SLOW_QUERY_MS.
+
+ENABLED = os.environ.get("INVENTORY_INSTRUMENT", "") not in ("", "0")
+SLOW_QUERY_MS = 100.0
+SLOW_LOG_PATH = "slow_queries.log"
+SAMPLES_KEPT = 2000 # Latency samples kept per caller / per action for the percentiles
+RECENT_KEPT = 500 # Most recent statements kept for inspection
+
+slow_log = logging.getLogger("inventory.slow_queries")
+slow_log.propagate = False
+
+_lock = threading.Lock()
+_statement_samples = {} # caller -> deque of (seconds, rows)
+_action_samples = {} # action name -> deque of seconds
+_recent = deque(maxlen=RECENT_KEPT) # QueryRecord, newest last
+_log_handler = None
+_context = threading.local() # .operation: name of the outermost traced call running on this thread
+
+def configure(enabled=None, slow_query_ms=None, log_path=None):
+    """Turns instrumentation on or off and sets the slow-query threshold and log file."""
+    global ENABLED, SLOW_QUERY_MS, SLOW_LOG_PATH, _log_handler
+    if slow_query_ms is not None:
+        SLOW_QUERY_MS = float(slow_query_ms)
+    if log_path is not None and log_path != SLOW_LOG_PATH:
+        SLOW_LOG_PATH = log_path
+        if _log_handler is not None:
+            slow_log.removeHandler(_log_handler)
+            _log_handler.close()
+            _log_handler = None
+    if enabled is not None:
+        ENABLED = bool(enabled)
+
+def _write_slow(record):
+    global _log_handler
+    if _log_handler is None:
+        # Opened on the first slow query, so a disabled or fast session never creates the file
+        _log_handler = logging.FileHandler(SLOW_LOG_PATH, encoding="utf-8", delay=True)
+        _log_handler.setFormatter(logging.Formatter("%(asctime)s %(message)s"))
+        slow_log.addHandler(_log_handler)
+        slow_log.setLevel(logging.INFO)
+    slow_log.info("%.1f ms rows=%d caller=%s sql=%s", record.seconds * 1000, record.rows, record.caller,
+                  " ".join(record.sql.split()))
+
+_DONE = object() # next() default marking an exhausted generator
+
+def traced(func):
+    """
+    Decorator for the public operations (the database.py and reports.py functions): statements
+    run anywhere beneath a call, helpers in other modules included, are attributed to it, or to
+    the outermost one when such calls nest. A generator is attributed while it is advanced.
+    """
+    name = f"{func.__module__}.{func.__name__}"
+    if inspect.isgeneratorfunction(func):
+        @functools.wraps(func)
+        def generator(*args, **kwargs):
+            items = func(*args, **kwargs)
+            try:
+                while True:
+                    if not ENABLED or getattr(_context, "operation", None) is not None:
+                        item = next(items, _DONE)
+                    else:
+                        _context.operation = name
+                        try:
+                            item = next(items, _DONE)
+                        finally:
+                            _context.operation = None
+                    if item is _DONE:
+                        return
+                    yield item
+            finally:
+                items.close()
+        return generator
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        if not ENABLED or getattr(_context, "operation", None) is not None:
+            return func(*args, **kwargs)
+        _context.operation = name
+        try:
+            return func(*args, **kwargs)
+        finally:
+            _context.operation = None
+    return wrapper
+
+def _caller():
+    """
+    Names the operation a statement belongs to: the traced call running on this thread, or
+    failing that the first function up the stack outside this module.
+    """
+    operation = getattr(_context, "operation", None)
+    if operation is not None:
+        return operation
+    frame = sys._getframe(2)
+    while frame is not None and frame.f_globals.get("__name__") == __name__:
+        frame = frame.f_back
+    if frame is None:
+        return "?"
+    return f"{frame.f_globals.get('__name__', '?')}.{frame.f_code.co_name}"
+
+class QueryRecord:
+    """One executed statement: its SQL, calling function, total latency and rows returned."""
+    __slots__ = ("sql", "caller", "started", "seconds", "rows", "finished")
+
+    def __init__(self, sql, caller):
+        self.sql = sql
+        self.caller = caller
+        self.started = time.time()
+        self.seconds = 0.0
+        self.rows = 0
+        self.finished = False
+
+    def finish(self):
+        if self.finished:
+            return
+        self.finished = True
+        with _lock:
+            samples = _statement_samples.get(self.caller)
+            if samples is None:
+                samples = _statement_samples[self.caller] = deque(maxlen=SAMPLES_KEPT)
+            samples.append((self.seconds, self.rows))
+            _recent.append(self)
+        if self.seconds * 1000 >= SLOW_QUERY_MS:
+            _write_slow(self)
+
+class InstrumentedCursor(sqlite3.Cursor):
+    """Cursor that times execute and every fetch, and counts the rows fetched."""
+    _record = None
+
+    def _start(self, sql):
+        if self._record is not None:
+            self._record.finish()
+        self._record = QueryRecord(sql, _caller())
+
+    def _timed(self, method, *args):
+        start = time.perf_counter()
+        try:
+            return method(*args)
+        finally:
+            self._record.seconds += time.perf_counter() - start
+
+    def execute(self, sql, parameters=()):
+        self._start(sql)
+        self._timed(super().execute, sql, parameters)
+        if self.description is None: # Not a query; nothing to fetch
+            self._record.rows = max(self.rowcount, 0)
+            self._record.finish()
+        return self
+
+    def executemany(self, sql, seq_of_parameters):
+        self._start(sql)
+        self._timed(super().executemany, sql, seq_of_parameters)
+        self._record.rows = max(self.rowcount, 0)
+        self._record.finish()
+        return self
+
+    def fetchone(self):
+        if self._record is None:
+            return super().fetchone()
+        row = self._timed(super().fetchone)
+        if row is None:
+            self._record.finish()
+        else:
+            self._record.rows += 1
+        return row
+
+    def fetchmany(self, size=None):
+        if self._record is None:
+            return super().fetchmany(size if size is not None else self.arraysize)
+        size = size if size is not None else self.arraysize
+        rows = self._timed(super().fetchmany, size)
+        self._record.rows += len(rows)
+        if len(rows) < size:
+            self._record.finish()
+        return rows
+
+    def fetchall(self):
+        if self._record is None:
+            return super().fetchall()
+        rows = self._timed(super().fetchall)
+        self._record.rows += len(rows)
+        self._record.finish()
+        return rows
+
+    def __next__(self):
+        if self._record is None:
+            return super().__next__()
+        try:
+            row = self._timed(super().__next__)
+        except StopIteration:
+            self._record.finish()
+            raise
+        self._record.rows += 1
+        return row
+
+    def close(self):
+        if self._record is not None:
+            self._record.finish()
+        super().close()
+
+    def __del__(self):
+        # Statements read with a single fetchone() end here
+        if self._record is not None:
+            self._record.finish()
+
+class InstrumentedConnection(sqlite3.Connection):
+    """Connection factory: plain cursors while disabled, InstrumentedCursor while enabled."""
+    def cursor(self, factory=None):
+        if factory is None:
+            factory = InstrumentedCursor if ENABLED else sqlite3.Cursor
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        if not ENABLED:
+            return super().execute(sql, parameters)
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        if not ENABLED:
+            return super().executemany(sql, seq_of_parameters)
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+# --- Actions ---
+
+def record_action(name, seconds):
+    """Adds one latency sample for a user-facing action (see DBWorker.action)."""
+    with _lock:
+        samples = _action_samples.get(name)
+        if samples is None:
+            samples = _action_samples[name] = deque(maxlen=SAMPLES_KEPT)
+        samples.append(seconds)
+
+# --- Statistics ---
+
+def percentile(sorted_values, p):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return None
+    rank = max(1, -(-len(sorted_values) * p // 100)) # ceil(n * p / 100)
+    return sorted_values[int(rank) - 1]
+
+def _summary(seconds):
+    ordered = sorted(seconds)
+    return {"count": len(ordered),
+            "p50_ms": percentile(ordered, 50) * 1000,
+            "p95_ms": percentile(ordered, 95) * 1000,
+            "p99_ms": percentile(ordered, 99) * 1000}
+
+def action_stats():
+    """{action: {count, p50_ms, p95_ms, p99_ms}} over the recent samples of each action."""
+    with _lock:
+        samples = {name: list(values) for name, values in _action_samples.items()}
+    return {name: _summary(values) for name, values in samples.items() if values}
+
+def statement_stats():
+    """{caller: {count, rows, p50_ms, p95_ms, p99_ms}} over the recent statements of each caller."""
+    with _lock:
+        samples = {caller: list(values) for caller, values in _statement_samples.items()}
+    stats = {}
+    for caller, values in samples.items():
+        if values:
+            stats[caller] = _summary([seconds for seconds, _ in values])
+            stats[caller]["rows"] = sum(rows for _, rows in values)
+    return stats
+
+def recent_statements():
+    """The most recent statements as (started, caller, ms, rows, sql), newest first."""
+    with _lock:
+        records = list(_recent)
+    return [(record.started, record.caller, record.seconds * 1000, record.rows, record.sql)
+            for record in reversed(records)]
+
+def reset():
+    """Forgets all collected samples."""
+    with _lock:
+        _statement_samples.clear()
+        _action_samples.clear()
+        _recent.clear()
@@ -0,0 +1,145 @@
+import archive
+
+# --- Stock Ledger ---
+# stock.quantity is changed in place by _adjust_stock_quantity, and update_stock can set it to
+# anything without logging why. stock_ledger keeps, per stock item, an opening balance and the
+# net of its transactions up to a checkpoint (ledger_state.verified_through, the last
+# transaction id counted), so opening + net is what the quantity should be. verify() adds only
+# the rows logged since the checkpoint (a primary key range read), moves the checkpoint, and
+# compares against the stock table. transaction_log ids are AUTOINCREMENT and never reused, so
+# "id > checkpoint" is exactly the uncounted rows.
+#
+# The opening balance is the quantity an item was added with; for items that existed when the
+# ledger was created it is whatever makes their quantity at that time agree with the log.
+# Triggers take counted rows back out when they are deleted (archiving moves rows rather than
+# deleting them, so it is skipped, as in summaries.py).
+
+_DELTA = "CASE action WHEN 'in' THEN quantity ELSE -quantity END"
+
+def _counted(row, sign):
+    """Trigger statement adding (sign=1) or removing (sign=-1) an already-counted log row from the ledger."""
+    return f'''
+        UPDATE stock_ledger
+        SET net = net + {sign} * CASE {row}.action WHEN 'in' THEN {row}.quantity ELSE -{row}.quantity END
+        WHERE stock_id = {row}.stock_id
+          AND {row}.id <= (SELECT verified_through FROM ledger_state);'''
+
+_TRIGGERS = (
+    '''
+    CREATE TRIGGER IF NOT EXISTS ledger_stock_ai AFTER INSERT ON stock BEGIN
+        INSERT OR REPLACE INTO stock_ledger (stock_id, opening, net) VALUES (new.id, new.quantity, 0);
+    END''',
+    '''
+    CREATE TRIGGER IF NOT EXISTS ledger_stock_ad AFTER DELETE ON stock BEGIN
+        DELETE FROM stock_ledger WHERE stock_id = old.id;
+    END''',
+    f'''
+    CREATE TRIGGER IF NOT EXISTS ledger_ad AFTER DELETE ON transaction_log
+    WHEN (SELECT archiving FROM log_archive) IS NOT 1
+    BEGIN{_counted("old", -1)}
+    END''',
+    f'''
+    CREATE TRIGGER IF NOT EXISTS ledger_au AFTER UPDATE OF stock_id, action, quantity ON transaction_log
+    BEGIN{_counted("old", -1)}{_counted("new", 1)}
+    END''',
+)
+
+def create_ledger_tables(cursor):
+    """
+    Creates stock_ledger, ledger_state and the triggers, with the current quantities taken as
+    correct: every log row so far (archive included, if attached) is counted, and each opening
+    balance is the quantity minus that net.
+    """
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS stock_ledger (
+            stock_id INTEGER PRIMARY KEY,
+            opening INTEGER NOT NULL, -- Quantity before any logged transaction
+            net INTEGER NOT NULL -- Net of the transactions up to ledger_state.verified_through
+        )
+    ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS ledger_state (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            verified_through INTEGER NOT NULL DEFAULT 0, -- Last transaction id counted
+            verified_at INTEGER -- Epoch milliseconds of the last verify()
+        )
+    ''')
+    cursor.execute("INSERT OR IGNORE INTO ledger_state (id) VALUES (1)")
+    for trigger in _TRIGGERS:
+        cursor.execute(trigger)
+    through = _newest_id(cursor)
+    deltas = _deltas(cursor.connection, 0, through)
+    cursor.execute("DELETE FROM stock_ledger")
+    cursor.executemany("INSERT INTO stock_ledger (stock_id, opening, net) VALUES (?, ?, ?)",
+                       [(stock_id, quantity - deltas.get(stock_id, 0), deltas.get(stock_id, 0))
+                        for stock_id, quantity in cursor.execute("SELECT id, quantity FROM stock").fetchall()])
+    cursor.execute("UPDATE ledger_state SET verified_through = ?", (through,))
+
+def _newest_id(cursor):
+    """The highest transaction id ever issued (deleted and archived rows included), or 0."""
+    row = cursor.execute("SELECT seq FROM sqlite_sequence WHERE name = 'transaction_log'").fetchone()
+    return row[0] if row else 0
+
+def _deltas(conn, after_id, through_id):
+    """{stock_id: net quantity change} of the log rows with after_id < id <= through_id, archived ones included."""
+    deltas = dict(conn.execute(f'''
+        SELECT stock_id, SUM({_DELTA}) FROM main.transaction_log
+        WHERE id > ? AND id <= ? GROUP BY stock_id
+    ''', (after_id, through_id)).fetchall())
+    if archive.is_attached(conn):
+        for stock_id, delta in conn.execute(f'''
+            SELECT t.stock_id, SUM({_DELTA}) FROM {archive.ARCHIVE_SCHEMA}.transaction_log t
+            WHERE t.id > ? AND t.id <= ? AND {archive.NOT_IN_HOT_LOG} GROUP BY t.stock_id
+        ''', (after_id, through_id)):
+            deltas[stock_id] = deltas.get(stock_id, 0) + delta
+    return deltas
+
+def verify(cursor, verified_at):
+    """
+    Counts the log rows added since the checkpoint, moves the checkpoint to the newest id, and
+    compares every stock quantity with opening + net. Call inside a write transaction (with
+    the archive attached, if there is one). Returns (rows_counted_from, rows_counted_through,
+    drift), drift being [(course_code, stock_id, quantity, expected)] by course_code.
+    """
+    checkpoint = cursor.execute("SELECT verified_through FROM ledger_state").fetchone()[0]
+    through = _newest_id(cursor)
+    if through > checkpoint:
+        cursor.executemany("UPDATE stock_ledger SET net = net + ? WHERE stock_id = ?",
+                           [(delta, stock_id) for stock_id, delta in _deltas(cursor.connection, checkpoint, through).items()])
+    cursor.execute("UPDATE ledger_state SET verified_through = ?, verified_at = ?", (through, verified_at))
+    drift = cursor.execute('''
+        SELECT s.course_code, s.id, s.quantity, l.opening + l.net
+        FROM stock s
+        LEFT JOIN stock_ledger l ON l.stock_id = s.id
+        WHERE l.stock_id IS NULL OR s.quantity <> l.opening + l.net
+        ORDER BY s.course_code
+    ''').fetchall()
+    return checkpoint, through, drift
+
+def repair(cursor, drift):
+    """
+    Sets each drifted quantity back to what the ledger says (an item with no ledger row is
+    given one that accepts its quantity). Call inside the write transaction verify() ran in.
+    """
+    for _, stock_id, quantity, expected in drift:
+        if expected is None:
+            cursor.execute("INSERT INTO stock_ledger (stock_id, opening, net) VALUES (?, ?, 0)", (stock_id, quantity))
+        else:
+            cursor.execute("UPDATE stock SET quantity = ? WHERE id = ?", (expected, stock_id))
+
+if __name__ == '__main__':
+    import argparse
+    import database as db
+    parser = argparse.ArgumentParser(description="Check stock quantities against the transaction log since the last check.")
+    parser.add_argument("--repair", action="store_true", help="Set drifted quantities back to what the log says")
+    parser.add_argument("--db", default=db.DB_NAME)
+    args = parser.parse_args()
+
+    db.set_database(args.db)
+    db.create_tables()
+    consistent, message, drift = db.verify_stock_ledger(repair=args.repair)
+    for course_code, _, quantity, expected in drift:
+        print(f"{course_code}: quantity {quantity}, log says {expected}")
+    print(message)
+    db.close_db()
+    raise SystemExit(0 if consistent or args.repair else 1)
@@ -0,0 +1,114 @@
+import search
+import timestamps
+
+# --- Live Filtering ---
+# The app filters as the user types. While a filter only gets narrower (text appended to a
+# value, or a condition added) every row it matches is already among the rows shown, so the
+# app re-applies it to those rows instead of querying again. The predicates here mirror the
+# WHERE clauses database.py builds: FTS5 token prefixes when the search index is in use (per
+# group of columns, as in get_all_stock and _transaction_query), substring LIKE otherwise.
+
+# filter key -> index of the column in a displayed row
+STOCK_TEXT_COLUMNS = {"course_code": 1, "title": 2, "language": 3}
+TRANSACTION_TEXT_COLUMNS = {"course_code": 1, "enrolment_no": 2, "name": 6, "remarks": 7, "phone": 8}
+TRANSACTION_EXACT_COLUMNS = {"action": 3}
+TRANSACTION_TIME_COLUMN = 5 # transaction_time, epoch milliseconds as stored; date_from/date_to bound it
+DATE_KEYS = ("date_from", "date_to")
+
+# Columns that share one MATCH expression (one falls back to LIKE, the whole group does)
+STOCK_GROUPS = (("course_code", "title", "language"),)
+TRANSACTION_GROUPS = (("course_code",), ("enrolment_no", "name", "remarks", "phone"))
+
+def narrows(old, new):
+    """
+    True if every row matching the filters new also matches old, so new can be applied to
+    old's results. old is None when nothing has been shown yet. Text values may only be
+    extended and must contain a word (a value without one switches its group to LIKE); a date
+    range may only shrink.
+    """
+    if old is None:
+        return False
+    for key in set(old) | set(new):
+        previous, value = old.get(key) or "", new.get(key) or ""
+        if key in DATE_KEYS:
+            continue
+        if key in STOCK_TEXT_COLUMNS or key in TRANSACTION_TEXT_COLUMNS:
+            if not value.startswith(previous):
+                return False
+            if any(text and search.match_expression({key: text}) is None for text in (previous, value)):
+                return False
+        elif previous and previous != value: # Exact conditions may be added, not changed
+            return False
+    if any(old.get(key) or new.get(key) for key in DATE_KEYS):
+        try:
+            (old_low, old_high), (low, high) = _date_range(old), _date_range(new)
+        except ValueError:
+            return False
+        if old_low is not None and (low is None or low < old_low):
+            return False
+        if old_high is not None and (high is None or high > old_high):
+            return False
+    return True
+
+def _date_range(filters):
+    # [low, high) in epoch milliseconds, as _transaction_query bounds transaction_time; None is open
+    low = timestamps.bound(filters["date_from"]) if filters.get("date_from") else None
+    high = timestamps.bound(filters["date_to"], end=True) if filters.get("date_to") else None
+    return low, high
+
+def _in_range(stamp, low, high):
+    # As SQLite compares: NULL passes no bound, and text (a time left unconverted, see
+    # timestamps.py) sorts after every number, so it passes a lower bound but never an upper one
+    if stamp is None:
+        return low is None and high is None
+    if isinstance(stamp, str):
+        return high is None
+    return (low is None or stamp >= low) and (high is None or stamp < high)
+
+def _group_matchers(filters, group, use_fts):
+    values = {key: filters[key] for key in group if filters.get(key)}
+    if not values:
+        return []
+    if use_fts and search.match_expression(values):
+        matchers = [(key, search.prefix_matcher(value)) for key, value in values.items()]
+        if any(matcher is None for _, matcher in matchers):
+            return None
+        return matchers
+    return [(key, search.like_matcher(value)) for key, value in values.items()]
+
+def _predicate(filters, text_columns, groups, exact_columns, use_fts, time_column=None):
+    dated = time_column is not None
+    if any(value and key not in text_columns and key not in exact_columns and not (dated and key in DATE_KEYS)
+           for key, value in filters.items()):
+        return None
+    low, high = None, None
+    if dated:
+        try:
+            low, high = _date_range(filters)
+        except ValueError:
+            return None # Let the query report it
+    checks = []
+    for group in groups:
+        matchers = _group_matchers(filters, group, use_fts)
+        if matchers is None:
+            return None
+        checks.extend((text_columns[key], matcher) for key, matcher in matchers)
+    exact = [(index, filters[key]) for key, index in exact_columns.items() if filters.get(key)]
+
+    def matches(row):
+        return ((not dated or _in_range(row[time_column], low, high))
+                and all(row[index] == value for index, value in exact)
+                and all(matcher(row[index]) for index, matcher in checks))
+    return matches
+
+def stock_predicate(filters, use_fts):
+    """row -> bool for get_all_stock(filters) rows, or None if the filters can't be evaluated in memory."""
+    return _predicate(filters or {}, STOCK_TEXT_COLUMNS, STOCK_GROUPS, {}, use_fts)
+
+def transaction_predicate(filters, use_fts):
+    """
+    row -> bool for transaction listing rows (hot log only: the archive is always matched with
+    LIKE), or None if the filters can't be evaluated in memory.
+    """
+    return _predicate(filters or {}, TRANSACTION_TEXT_COLUMNS, TRANSACTION_GROUPS, TRANSACTION_EXACT_COLUMNS,
+                      use_fts, TRANSACTION_TIME_COLUMN)
@@ -0,0 +1,347 @@
+import re
+import sqlite3
+import archive
+import balances
+import contention
+import ledger
+import search
+import snapshots
+import summaries
+import timestamps
+
+# --- Migrations ---
+# Each migration upgrades the schema by one version. The applied version is stored in
+# PRAGMA user_version, so an existing inventory.db is upgraded in place on next start.
+# Never edit a released migration; append a new one instead.
+
+def _create_base_tables(cursor):
+    """Version 1: the original stock and transaction_log tables."""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS stock (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            course_code TEXT NOT NULL UNIQUE,
+            title TEXT,
+            language TEXT,
+            quantity INTEGER NOT NULL DEFAULT 0
+        )
+    ''')
+
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS transaction_log (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            stock_id INTEGER NOT NULL,
+            enrolment_no TEXT,
+            action TEXT NOT NULL CHECK (action IN ('in', 'out')),
+            quantity INTEGER NOT NULL,
+            transaction_time TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            name TEXT,
+            remarks TEXT,
+            phone TEXT,
+            FOREIGN KEY (stock_id) REFERENCES stock (id)
+        )
+    ''')
+
+def _index_transaction_log(cursor):
+    """Version 2: indexes for the hot transaction_log queries."""
+    # Covers the "has transactions?" check in delete_stock and per-stock in/out sums
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_transaction_log_stock
+        ON transaction_log (stock_id, action, quantity)
+    ''')
+    # Newest-first listing; the implicit rowid suffix makes it (transaction_time, id)
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_transaction_log_time
+        ON transaction_log (transaction_time)
+    ''')
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_transaction_log_enrolment_no
+        ON transaction_log (enrolment_no)
+    ''')
+
+def _create_search_index(cursor):
+    """Version 3: FTS5 search tables for the text filters (skipped if FTS5 is unavailable)."""
+    search.create_search_index(cursor)
+
+def _create_stock_snapshot(cursor):
+    """Version 4: periodic stock snapshots for point-in-time quantities."""
+    snapshots.create_snapshot_table(cursor)
+
+def _create_report_summaries(cursor):
+    """Version 5: monthly summary tables behind the reports."""
+    summaries.create_summary_tables(cursor)
+
+def _create_request_keys(cursor):
+    """Version 6: request keys that make repeated adds idempotent."""
+    contention.create_request_key_table(cursor)
+
+def _create_log_archive(cursor):
+    """Version 7: archive bookkeeping; archiving no longer shrinks the report summaries."""
+    archive.create_archive_state(cursor)
+    summaries.keep_archived_rows(cursor)
+
+def _epoch_timestamps(cursor):
+    """
+    Version 8: transaction_time, snapshot times and archived_through become epoch milliseconds
+    (see timestamps.py). The small tables are converted here. The log can hold millions of rows,
+    so this only marks the switch: convert_log_times() rewrites it afterwards, a batch per
+    transaction, and resumes after an interruption. Until then its text times sort after every
+    converted one. An archive file is converted when it is next attached.
+    """
+    timestamps.register_functions(cursor.connection)
+    cursor.execute("UPDATE stock_snapshot SET snapshot_time = epoch_ms(snapshot_time) WHERE typeof(snapshot_time) = 'text'")
+    cursor.execute('''
+        UPDATE log_archive SET archived_through = epoch_ms(archived_through)
+        WHERE typeof(archived_through) = 'text'
+    ''')
+
+def _create_student_balances(cursor):
+    """Version 9: per-student outstanding balances kept by triggers (filled from the archive too, if attached)."""
+    balances.create_balance_table(cursor)
+
+def _create_stock_ledger(cursor):
+    """Version 10: opening balances and a checkpoint for verifying stock quantities against the log."""
+    ledger.create_ledger_tables(cursor)
+
+def _index_sort_columns(cursor):
+    """Version 11: indexes for sorting the listings by quantity (see database.TRANSACTION_SORT_COLUMNS)."""
+    # Lowest stock first (the other sortable stock columns are covered or the table is tiny)
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_stock_quantity
+        ON stock (quantity)
+    ''')
+    # Largest issues first; the implicit rowid suffix makes it the (quantity, id) page key
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_transaction_log_quantity
+        ON transaction_log (quantity)
+    ''')
+
+def _balance_course_codes(cursor):
+    """Version 12: student_balance rows carry their course_code, indexed for a student's items in course order."""
+    balances.rebuild_balance_table(cursor)
+
+def _epoch_request_keys(cursor):
+    """Version 13: request_key.created becomes epoch milliseconds too (it was adapter-formatted text)."""
+    contention.convert_request_key_times(cursor)
+
+MIGRATIONS = [
+    (1, _create_base_tables),
+    (2, _index_transaction_log),
+    (3, _create_search_index),
+    (4, _create_stock_snapshot),
+    (5, _create_report_summaries),
+    (6, _create_request_keys),
+    (7, _create_log_archive),
+    (8, _epoch_timestamps),
+    (9, _create_student_balances),
+    (10, _create_stock_ledger),
+    (11, _index_sort_columns),
+    (12, _balance_course_codes),
+    (13, _epoch_request_keys),
+]
+
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+def get_version(conn):
+    """Returns the schema version recorded in the database file."""
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+def migrate(conn, target=None):
+    """
+    Applies every pending migration (up to target, if given), each in its own transaction.
+    Returns the list of versions that were applied.
+    """
+    applied = []
+    current = get_version(conn)
+    for version, migration in MIGRATIONS:
+        if version <= current:
+            continue
+        if target is not None and version > target:
+            break
+        cursor = conn.cursor()
+        try:
+            cursor.execute("BEGIN IMMEDIATE")
+            migration(cursor)
+            cursor.execute(f"PRAGMA user_version = {int(version)}")
+            conn.commit()
+        except sqlite3.Error:
+            conn.rollback()
+            raise
+        applied.append(version)
+    if applied:
+        conn.execute("ANALYZE") # Give the planner statistics for the new indexes
+    return applied
+
+def convert_log_times(conn):
+    """
+    Finishes version 8: rewrites any transaction_time still stored as text as epoch milliseconds
+    (timestamps.convert_text_column). Each batch commits on its own, outside migrate(); the summary
+    and balance triggers stay in place and net out, since a row's month doesn't change. Costs one
+    index probe once nothing is left. Returns the number of rows rewritten.
+    """
+    # Text sorts after every integer, so the time index finds any text values at its far end
+    if not conn.execute("SELECT EXISTS(SELECT 1 FROM transaction_log WHERE transaction_time >= '')").fetchone()[0]:
+        return 0
+    return timestamps.convert_text_column(conn, "transaction_log", "transaction_time")
+
+# --- Query Plan Check ---
+# The queries database.py runs on every refresh or mutation. None of them may read a whole
+# table: not by a full table scan, not by a full index scan unless a LIMIT stops it after a page
+# (a range bound makes it a SEARCH), and not by a temporary sort of everything it read.
+# The listing statements are generated by database.py's own builders (listing_queries), so the
+# check follows them; the fixed lookups are below.
+HOT_QUERIES = {
+    "stock by course_code": (
+        "SELECT id, course_code, title, language, quantity FROM stock WHERE course_code = ?", ("X",)),
+    "stock has transactions": (
+        "SELECT EXISTS(SELECT 1 FROM transaction_log WHERE stock_id = ?)", (1,)),
+    "transactions by enrolment_no": ("""
+        SELECT t.id FROM transaction_log t
+        JOIN stock s ON t.stock_id = s.id
+        WHERE t.enrolment_no = ?
+    """, ("E",)),
+    "nearest stock snapshot": (
+        "SELECT MAX(snapshot_time) FROM stock_snapshot WHERE snapshot_time < ?", (2**53,)),
+    "stock snapshot rows": (
+        "SELECT stock_id, quantity FROM stock_snapshot WHERE snapshot_time = ?", (2**53,)),
+    "log delta since snapshot": (
+        "SELECT stock_id, SUM(quantity) FROM transaction_log WHERE transaction_time >= ? AND transaction_time < ? GROUP BY stock_id",
+        (0, 2**53)),
+    "request key": (
+        "SELECT transaction_id FROM request_key WHERE key = ?", ("K",)),
+    "outstanding for student": ("""
+        SELECT b.stock_id, b.course_code, s.title, b.outstanding, b.last_out
+        FROM student_balance b
+        CROSS JOIN stock s ON s.id = b.stock_id
+        WHERE b.enrolment_no = ? AND b.outstanding > 0
+        ORDER BY b.course_code
+    """, ("E",)),
+    "log since the ledger checkpoint": (
+        "SELECT stock_id, SUM(quantity) FROM transaction_log WHERE id > ? AND id <= ? GROUP BY stock_id",
+        (0, 2**53)),
+    "still out, longest first": (
+        "SELECT enrolment_no, stock_id, outstanding, last_out FROM student_balance WHERE outstanding > 0 ORDER BY last_out",
+        ()),
+    "transaction by id": ("""
+        SELECT t.id, t.stock_id, s.course_code
+        FROM transaction_log t
+        JOIN stock s ON t.stock_id = s.id
+        WHERE t.id = ?
+    """, (1,)),
+}
+
+
+def listing_queries(conn):
+    """
+    {name: (sql, params)} for the transaction listing pages as get_transactions_page builds them:
+    every sort order and direction, first and next page, unfiltered and with date range, action
+    and text filters, the text ones both with LIKE and, if conn has the search index, FTS5. Plus
+    get_all_stock's FTS5 query (its LIKE filters are applied to the cached catalog, see database.py).
+    """
+    import database as db # database.py imports this module
+    fts = [False, True] if search.has_search_index(conn) else [False]
+    filter_sets = {
+        "": {},
+        "in a date range": {"date_from": "2024-01-01", "date_to": "2024-01-31"},
+        "by action": {"action": "out"},
+        "by name": {"name": "ram"},
+        "by course_code": {"course_code": "BCS"},
+    }
+    queries = {}
+    for use_fts in fts:
+        text = "FTS" if use_fts else "LIKE"
+        if use_fts:
+            for sort_by in db.STOCK_SORT_COLUMNS:
+                queries[f"stock matching, by {sort_by} ({text})"] = db._stock_query({"title": "prog"}, sort_by, False, True)
+        for label, filters in filter_sets.items():
+            texts = any(key in filters for key in ("name", "course_code"))
+            if use_fts and not texts:
+                continue
+            for sort_by in db.TRANSACTION_SORT_COLUMNS:
+                key = ("K", 1) if sort_by in ("course_code", "enrolment_no") else (1, 1)
+                for descending in (True, False):
+                    query, conditions, params = db._transaction_query(filters, sort_by=sort_by, use_fts=use_fts)
+                    order = db._order_by(sort_by, descending) + " LIMIT ?"
+                    for page, page_key in (("first", None), ("next", key)):
+                        segments = db._page_segments(sort_by, page_key, not descending)
+                        for number, (extra_conditions, extra_params) in enumerate(segments):
+                            name = (f"{page} transaction page {label}, by {sort_by} "
+                                    f"{'desc' if descending else 'asc'}" + (f" ({text})" if texts else "")
+                                    + (f" [segment {number + 1}]" if len(segments) > 1 else ""))
+                            queries[" ".join(name.split())] = (db._statement(query, conditions + extra_conditions, order),
+                                                               params + extra_params + [200])
+    return queries
+
+def _plan_problems(plan_rows, limited=False, partial_indexes=()):
+    """
+    Returns the EXPLAIN QUERY PLAN details that read a whole table: a table or index scan that no
+    LIMIT stops (limited says the statement has one), or a full temp sort after a scan, which has
+    to finish the scan, LIMIT or not. Reading all of a partial index (partial_indexes) only reads
+    the rows its WHERE selects. A temp sort of searched rows is bounded by the search, and one for
+    the RIGHT PART of the ORDER BY only sorts one outer row's matches at a time. An FTS5 MATCH
+    shows up as a VIRTUAL TABLE scan and is a search too.
+    """
+    details = [row[-1] for row in plan_rows]
+    full_sorts = [detail for detail in details if detail.startswith("USE TEMP B-TREE FOR ORDER BY")]
+    scans = [detail for detail in details
+             if detail.startswith("SCAN ") and detail != "SCAN CONSTANT ROW" and " VIRTUAL TABLE " not in detail
+             and not (" INDEX " in detail and detail.split(" INDEX ")[1].split()[0] in partial_indexes)]
+    if scans and (full_sorts or not limited):
+        return scans + full_sorts
+    return []
+
+def _schema_only(conn):
+    """
+    An in-memory database with conn's tables and indexes but no rows and no sqlite_stat1.
+    The planner then assumes its default (large) table sizes instead of the file's own
+    statistics, under which a table of a few rows is rightly scanned and sorted.
+    """
+    schema = conn.execute('''
+        SELECT name, sql FROM main.sqlite_master
+        WHERE type IN ('table', 'index') AND sql IS NOT NULL AND name NOT LIKE 'sqlite_%'
+        ORDER BY type DESC, rowid
+    ''').fetchall()
+    # A virtual table creates its own shadow tables
+    virtual = [name for name, sql in schema if sql.upper().startswith("CREATE VIRTUAL TABLE")]
+    copy = sqlite3.connect(":memory:")
+    for name, sql in schema:
+        if not any(name.startswith(table + "_") for table in virtual):
+            copy.execute(sql)
+    return copy
+
+def check_query_plans(conn, queries=None):
+    """
+    Runs EXPLAIN QUERY PLAN on each hot query (HOT_QUERIES and listing_queries, unless queries
+    is given) against conn's schema (see _schema_only), so the answer is whether the indexes
+    serve the query, whatever the size of this particular file.
+    Returns {query_name: [offending plan details]} for queries that scan; empty means all good.
+    """
+    failures = {}
+    copy = _schema_only(conn)
+    partial_indexes = {name for name, sql in copy.execute("SELECT name, sql FROM sqlite_master WHERE type = 'index'")
+                       if sql and " WHERE " in sql.upper()}
+    try:
+        for name, (sql, params) in (queries or {**HOT_QUERIES, **listing_queries(conn)}).items():
+            plan = copy.execute("EXPLAIN QUERY PLAN " + sql, params).fetchall()
+            problems = _plan_problems(plan, re.search(r"\bLIMIT\b", sql) is not None, partial_indexes)
+            if problems:
+                failures[name] = problems
+    finally:
+        copy.close()
+    return failures
+
+if __name__ == '__main__':
+    import database as db
+    conn = db.connect_db()
+    print(f"Schema version before: {get_version(conn)}")
+    applied = migrate(conn)
+    print(f"Applied migrations: {applied or 'none'}. Schema version now: {get_version(conn)}")
+    converted = convert_log_times(conn)
+    if converted:
+        print(f"Converted {converted} stored log times to epoch milliseconds.")
+    failures = check_query_plans(conn)
+    for name, problems in failures.items():
+        print(f"FAIL {name}: {'; '.join(problems)}")
+    if not failures:
+        print("All hot queries use indexes.")
+    db.close_db()
+    raise SystemExit(1 if failures else 0)
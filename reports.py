@@ -0,0 +1,185 @@
+import argparse
+from datetime import date, datetime
+import database as db
+import instrumentation
+import timestamps
+
+# --- Reports ---
+# Grouping and window functions run inside SQLite over the monthly summary tables (see
+# summaries.py) and the student balances (balances.py), so no report walks the transaction log. Periods are whole calendar months:
+# date_from/date_to take a date, datetime or 'YYYY-MM[-DD]' string and cover its month.
+
+def _month(value):
+    """Returns the 'YYYY-MM' month of a date filter, or None if it is empty."""
+    if value is None or value == "":
+        return None
+    if isinstance(value, (date, datetime)):
+        return value.strftime("%Y-%m")
+    value = value.strip()
+    try:
+        return datetime.strptime(value[:7], "%Y-%m").strftime("%Y-%m")
+    except ValueError:
+        raise ValueError(f"Invalid date '{value}'. Use YYYY-MM or YYYY-MM-DD.") from None
+
+def _month_range(date_from, date_to):
+    """Builds the WHERE condition and params selecting summary months in the period."""
+    conditions = []
+    params = []
+    month_from, month_to = _month(date_from), _month(date_to)
+    if month_from:
+        conditions.append("month >= ?")
+        params.append(month_from)
+    if month_to:
+        conditions.append("month <= ?")
+        params.append(month_to)
+    return (" AND ".join(conditions) or "1"), params
+
+@instrumentation.traced
+def course_totals(date_from=None, date_to=None):
+    """Per course: (course_code, title, qty_in, qty_out, net, transactions), by course_code."""
+    where, params = _month_range(date_from, date_to)
+    return db.connect_db().execute(f'''
+        SELECT s.course_code, s.title,
+               COALESCE(m.qty_in, 0), COALESCE(m.qty_out, 0),
+               COALESCE(m.qty_in - m.qty_out, 0), COALESCE(m.transactions, 0)
+        FROM stock s
+        LEFT JOIN (
+            SELECT stock_id, SUM(qty_in) AS qty_in, SUM(qty_out) AS qty_out, SUM(transactions) AS transactions
+            FROM monthly_stock_summary
+            WHERE {where}
+            GROUP BY stock_id
+        ) m ON m.stock_id = s.id
+        ORDER BY s.course_code
+    ''', params).fetchall()
+
+@instrumentation.traced
+def monthly_net(date_from=None, date_to=None, course_code=None):
+    """
+    Per month: (month, qty_in, qty_out, net_issued, cumulative_net_issued), oldest first.
+    net_issued is out minus in; course_code limits it to one course.
+    """
+    where, params = _month_range(date_from, date_to)
+    if course_code:
+        where += " AND stock_id = (SELECT id FROM stock WHERE course_code = ?)"
+        params.append(course_code)
+    return db.connect_db().execute(f'''
+        SELECT month, qty_in, qty_out, qty_out - qty_in,
+               SUM(qty_out - qty_in) OVER (ORDER BY month ROWS UNBOUNDED PRECEDING)
+        FROM (
+            SELECT month, SUM(qty_in) AS qty_in, SUM(qty_out) AS qty_out
+            FROM monthly_stock_summary
+            WHERE {where}
+            GROUP BY month
+        )
+        ORDER BY month
+    ''', params).fetchall()
+
+@instrumentation.traced
+def top_borrowers(date_from=None, date_to=None, limit=20):
+    """
+    The enrolment numbers that took out the most copies:
+    (rank, enrolment_no, issued, returned, outstanding, transactions), highest first.
+    """
+    where, params = _month_range(date_from, date_to)
+    return db.connect_db().execute(f'''
+        SELECT RANK() OVER (ORDER BY SUM(qty_out) DESC), enrolment_no,
+               SUM(qty_out), SUM(qty_in), SUM(qty_out) - SUM(qty_in), SUM(transactions)
+        FROM monthly_borrower_summary
+        WHERE {where}
+        GROUP BY enrolment_no
+        ORDER BY SUM(qty_out) DESC, enrolment_no
+        LIMIT ?
+    ''', params + [int(limit)]).fetchall()
+
+@instrumentation.traced
+def turnover(date_from=None, date_to=None):
+    """
+    Per course: (course_code, title, issued, opening, closing, average_stock, turnover).
+    Closing stock is the current quantity less the net change after the period, opening stock is
+    closing less the net change within it, and turnover is issued / average_stock (None when the
+    average is not positive). Quantities set directly with update_stock are not in the log.
+    """
+    month_from, month_to = _month(date_from), _month(date_to)
+    in_period = " AND ".join(
+        condition for condition in ("month >= :month_from" if month_from else "",
+                                    "month <= :month_to" if month_to else "") if condition) or "1"
+    after_period = "month > :month_to" if month_to else "0"
+    return db.connect_db().execute(f'''
+        SELECT course_code, title, issued, closing - period_net AS opening, closing,
+               (2 * closing - period_net) / 2.0 AS average_stock,
+               CASE WHEN 2 * closing - period_net > 0
+                    THEN ROUND(issued * 2.0 / (2 * closing - period_net), 2) END
+        FROM (
+            SELECT s.course_code, s.title,
+                   COALESCE(m.issued, 0) AS issued,
+                   COALESCE(m.period_net, 0) AS period_net,
+                   s.quantity - COALESCE(m.later_net, 0) AS closing
+            FROM stock s
+            LEFT JOIN (
+                SELECT stock_id,
+                       SUM(CASE WHEN {in_period} THEN qty_out ELSE 0 END) AS issued,
+                       SUM(CASE WHEN {in_period} THEN qty_in - qty_out ELSE 0 END) AS period_net,
+                       SUM(CASE WHEN {after_period} THEN qty_in - qty_out ELSE 0 END) AS later_net
+                FROM monthly_stock_summary
+                GROUP BY stock_id
+            ) m ON m.stock_id = s.id
+        )
+        ORDER BY course_code
+    ''', {"month_from": month_from, "month_to": month_to}).fetchall()
+
+@instrumentation.traced
+def still_out(date_from=None, date_to=None):
+    """
+    Copies not yet returned, from the student balances (see balances.py):
+    (enrolment_no, course_code, title, outstanding, last_issued, days_out), longest out first.
+    The period limits it to items last issued in those months, so a 'to' month alone lists
+    everything out since then or earlier (the overdue ones).
+    """
+    month_from, month_to = _month(date_from), _month(date_to)
+    conditions, params = ["b.outstanding > 0"], [timestamps.now()]
+    if month_from:
+        conditions.append("b.last_out >= ?")
+        params.append(timestamps.bound(month_from + "-01"))
+    if month_to:
+        year, month = map(int, month_to.split("-"))
+        conditions.append("b.last_out < ?")
+        params.append(timestamps.bound(date(year + month // 12, month % 12 + 1, 1)))
+    rows = db.connect_db().execute(f'''
+        SELECT b.enrolment_no, s.course_code, s.title, b.outstanding, b.last_out, (? - b.last_out) / 86400000
+        FROM student_balance b
+        JOIN stock s ON s.id = b.stock_id
+        WHERE {" AND ".join(conditions)}
+        ORDER BY b.last_out, b.enrolment_no
+    ''', params).fetchall()
+    return [row[:4] + (timestamps.format_timestamp(row[4]), row[5]) for row in rows]
+
+# Name -> (function, column headings) for the Reports tab and the command line
+REPORTS = {
+    "Course totals": (course_totals, ("Course Code", "Title", "In", "Out", "Net", "Transactions")),
+    "Monthly net issue": (monthly_net, ("Month", "In", "Out", "Net Issued", "Cumulative Net")),
+    "Top borrowers": (top_borrowers, ("Rank", "Enrolment No", "Issued", "Returned", "Outstanding", "Transactions")),
+    "Turnover": (turnover, ("Course Code", "Title", "Issued", "Opening", "Closing", "Average Stock", "Turnover")),
+    "Still out": (still_out, ("Enrolment No", "Course Code", "Title", "Outstanding", "Last Issued", "Days Out")),
+}
+
+def run_report(name, date_from=None, date_to=None):
+    """Runs a report from REPORTS. Returns (column headings, rows)."""
+    function, columns = REPORTS[name]
+    return columns, function(date_from, date_to)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Print an inventory report.")
+    parser.add_argument("report", choices=[name.lower().replace(" ", "-") for name in REPORTS])
+    parser.add_argument("--from", dest="date_from", help="First month to include (YYYY-MM)")
+    parser.add_argument("--to", dest="date_to", help="Last month to include (YYYY-MM)")
+    parser.add_argument("--db", default=db.DB_NAME, help="Database file (default: %(default)s)")
+    args = parser.parse_args()
+
+    db.set_database(args.db)
+    db.create_tables()
+    name = next(name for name in REPORTS if name.lower().replace(" ", "-") == args.report)
+    columns, rows = run_report(name, args.date_from, args.date_to)
+    print("\t".join(columns))
+    for row in rows:
+        print("\t".join("" if value is None else str(value) for value in row))
+    db.close_db()
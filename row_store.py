@@ -0,0 +1,78 @@
+import sys
+
+# --- Client-Side Row Store ---
+# The rows behind each Treeview, keyed by item id (the DB id as a string). The diff refreshes
+# compare against it and the selection handlers read from it, so clicking or arrowing through
+# a list never goes back to the database. It holds the whole listing row, including fields
+# the tree doesn't display (a transaction's stock_id).
+
+def _shared(value):
+    # Course codes, actions and names repeat across thousands of rows; keep one copy of each
+    return sys.intern(value) if type(value) is str else value
+
+class TransactionRecord:
+    """One transaction listing row (the get_transactions_page shape). __slots__ keeps the store compact."""
+    __slots__ = ("id", "course_code", "enrolment_no", "action", "quantity", "timestamp", "name", "remarks",
+                 "phone", "stock_id")
+
+    def __init__(self, id, course_code, enrolment_no, action, quantity, timestamp, name, remarks, phone, stock_id):
+        self.id = id
+        self.course_code = _shared(course_code)
+        self.enrolment_no = enrolment_no
+        self.action = _shared(action)
+        self.quantity = quantity
+        self.timestamp = timestamp
+        self.name = _shared(name)
+        self.remarks = _shared(remarks)
+        self.phone = phone
+        self.stock_id = stock_id
+
+    def as_row(self):
+        """Returns the listing tuple the record was built from."""
+        return (self.id, self.course_code, self.enrolment_no, self.action, self.quantity, self.timestamp,
+                self.name, self.remarks, self.phone, self.stock_id)
+
+    def as_detail(self):
+        """Returns the row in the get_transaction_by_id shape: (id, stock_id, course_code, enrolment_no, ...)."""
+        return (self.id, self.stock_id, self.course_code, self.enrolment_no, self.action, self.quantity,
+                self.timestamp, self.name, self.remarks, self.phone)
+
+class RowStore:
+    """
+    item id -> row for one tree. Rows go in and come out as tuples; with a record_type they are
+    held as instances of it (anything with as_row()), otherwise as the tuples themselves.
+    """
+    __slots__ = ("_rows", "_record_type")
+
+    def __init__(self, record_type=None):
+        self._rows = {}
+        self._record_type = record_type
+
+    def __contains__(self, iid):
+        return iid in self._rows
+
+    def __iter__(self):
+        return iter(self._rows)
+
+    def __len__(self):
+        return len(self._rows)
+
+    def get(self, iid):
+        """Returns the row for iid as a tuple, or None."""
+        row = self._rows.get(iid)
+        if row is None or self._record_type is None:
+            return row
+        return row.as_row()
+
+    def record(self, iid):
+        """Returns what is held for iid (a record_type instance if there is one), or None."""
+        return self._rows.get(iid)
+
+    def put(self, iid, row):
+        self._rows[iid] = self._record_type(*row) if self._record_type is not None else tuple(row)
+
+    def remove(self, iid):
+        self._rows.pop(iid, None)
+
+    def clear(self):
+        self._rows.clear()
@@ -0,0 +1,159 @@
+import functools
+import re
+import sqlite3
+import unicodedata
+
+# --- FTS5 Search Index ---
+# External-content FTS5 tables over the free-text columns of stock and transaction_log.
+# The tables store only the token index; the text itself stays in the base tables and the
+# triggers below keep the index in sync. The filters in database.py only use it when
+# USE_FTS_SEARCH is set (it matches word prefixes, not substrings); otherwise, and on builds
+# of SQLite without FTS5, they use LIKE.
+
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+# Update triggers are limited to the indexed columns so quantity changes cost nothing extra
+_TRIGGERS = (
+    '''
+    CREATE TRIGGER IF NOT EXISTS stock_fts_ai AFTER INSERT ON stock BEGIN
+        INSERT INTO stock_fts (rowid, course_code, title, language)
+        VALUES (new.id, new.course_code, new.title, new.language);
+    END''',
+    '''
+    CREATE TRIGGER IF NOT EXISTS stock_fts_ad AFTER DELETE ON stock BEGIN
+        INSERT INTO stock_fts (stock_fts, rowid, course_code, title, language)
+        VALUES ('delete', old.id, old.course_code, old.title, old.language);
+    END''',
+    '''
+    CREATE TRIGGER IF NOT EXISTS stock_fts_au AFTER UPDATE OF course_code, title, language ON stock BEGIN
+        INSERT INTO stock_fts (stock_fts, rowid, course_code, title, language)
+        VALUES ('delete', old.id, old.course_code, old.title, old.language);
+        INSERT INTO stock_fts (rowid, course_code, title, language)
+        VALUES (new.id, new.course_code, new.title, new.language);
+    END''',
+    '''
+    CREATE TRIGGER IF NOT EXISTS transaction_fts_ai AFTER INSERT ON transaction_log BEGIN
+        INSERT INTO transaction_fts (rowid, enrolment_no, name, remarks, phone)
+        VALUES (new.id, new.enrolment_no, new.name, new.remarks, new.phone);
+    END''',
+    '''
+    CREATE TRIGGER IF NOT EXISTS transaction_fts_ad AFTER DELETE ON transaction_log BEGIN
+        INSERT INTO transaction_fts (transaction_fts, rowid, enrolment_no, name, remarks, phone)
+        VALUES ('delete', old.id, old.enrolment_no, old.name, old.remarks, old.phone);
+    END''',
+    '''
+    CREATE TRIGGER IF NOT EXISTS transaction_fts_au AFTER UPDATE OF enrolment_no, name, remarks, phone ON transaction_log BEGIN
+        INSERT INTO transaction_fts (transaction_fts, rowid, enrolment_no, name, remarks, phone)
+        VALUES ('delete', old.id, old.enrolment_no, old.name, old.remarks, old.phone);
+        INSERT INTO transaction_fts (rowid, enrolment_no, name, remarks, phone)
+        VALUES (new.id, new.enrolment_no, new.name, new.remarks, new.phone);
+    END''',
+)
+
+def fts5_available(conn):
+    """Returns True if this SQLite build was compiled with FTS5."""
+    try:
+        conn.execute("CREATE VIRTUAL TABLE temp._fts5_probe USING fts5(x)")
+        conn.execute("DROP TABLE temp._fts5_probe")
+        return True
+    except sqlite3.OperationalError:
+        return False
+
+def create_search_index(cursor):
+    """
+    Creates the FTS tables and their sync triggers, then indexes existing rows.
+    Returns False (and creates nothing) when FTS5 is not available.
+    """
+    if not fts5_available(cursor.connection):
+        return False
+
+    # prefix='2 3' adds prefix indexes so short "ab*" queries don't walk the whole term list
+    cursor.execute('''
+        CREATE VIRTUAL TABLE IF NOT EXISTS stock_fts USING fts5(
+            course_code, title, language,
+            content='stock', content_rowid='id', prefix='2 3'
+        )
+    ''')
+    cursor.execute('''
+        CREATE VIRTUAL TABLE IF NOT EXISTS transaction_fts USING fts5(
+            enrolment_no, name, remarks, phone,
+            content='transaction_log', content_rowid='id', prefix='2 3'
+        )
+    ''')
+
+    for trigger in _TRIGGERS:
+        cursor.execute(trigger)
+
+    cursor.execute("INSERT INTO stock_fts (stock_fts) VALUES ('rebuild')")
+    cursor.execute("INSERT INTO transaction_fts (transaction_fts) VALUES ('rebuild')")
+    return True
+
+def has_search_index(conn):
+    """Returns True if the FTS tables exist in this database."""
+    row = conn.execute(
+        "SELECT COUNT(*) FROM sqlite_master WHERE type = 'table' AND name IN ('stock_fts', 'transaction_fts')"
+    ).fetchone()
+    return row[0] == 2
+
+def match_expression(column_values):
+    """
+    Turns {column: user text} into an FTS5 MATCH expression.
+    Every word in a value must match as a token prefix in that column ("jo sm" finds "John Smith").
+    Returns None if any value has no searchable words, in which case callers should use LIKE.
+    """
+    clauses = []
+    for column, value in column_values.items():
+        tokens = _TOKEN_RE.findall(value)
+        if not tokens:
+            return None
+        terms = " AND ".join('"' + token.replace('"', '""') + '"*' for token in tokens)
+        clauses.append(f"{column} : ({terms})")
+    return " AND ".join(clauses) if clauses else None
+
+# --- In-Memory Matching ---
+# Predicates that agree with the SQL filters above for one column's text, so a narrowed filter
+# can be re-applied to rows already fetched (see live_filter.py) without another query.
+
+_INDEX_TOKEN_RE = re.compile(r"[^\W_]+", re.UNICODE)
+
+@functools.lru_cache(maxsize=65536) # Rows are re-matched on every keystroke
+def _index_tokens(text):
+    # Approximates the unicode61 tokenizer: case-folded, diacritics removed, split on anything
+    # that isn't a letter or digit
+    if not text.isascii():
+        text = "".join(c for c in unicodedata.normalize("NFKD", text) if not unicodedata.combining(c))
+    return tuple(_INDEX_TOKEN_RE.findall(text.lower()))
+
+def prefix_matcher(value):
+    """
+    Returns text -> bool agreeing with match_expression({column: value}) on that column's text,
+    or None when value has no searchable words or isn't ASCII (unicode61 folding of non-ASCII
+    queries isn't mirrored).
+    """
+    if not value.isascii():
+        return None
+    # Each quoted query word is itself tokenized into a phrase whose last token is a prefix
+    phrases = [_index_tokens(word) for word in _TOKEN_RE.findall(value)]
+    if not phrases or not all(phrases):
+        return None
+
+    def matches(text):
+        if text is None:
+            return False
+        tokens = _index_tokens(str(text))
+        for phrase in phrases:
+            leading, last = phrase[:-1], phrase[-1]
+            if not leading:
+                if not any(token.startswith(last) for token in tokens):
+                    return False
+            elif not any(tokens[i:i + len(leading)] == leading and tokens[i + len(leading)].startswith(last)
+                         for i in range(len(tokens) - len(leading))):
+                return False
+        return True
+    return matches
+
+def like_matcher(value):
+    """Returns text -> bool agreeing with `column LIKE '%value%'` (% and _ wildcards, ASCII-only case folding)."""
+    pattern = "".join(".*" if c == "%" else "." if c == "_" else re.escape(c) for c in value)
+    regex = re.compile(pattern, re.IGNORECASE | re.ASCII | re.DOTALL)
+    return lambda text: text is not None and regex.search(str(text)) is not None
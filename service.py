@@ -0,0 +1,310 @@
+import argparse
+import asyncio
+import json
+import re
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qs, unquote, urlsplit
+import database as db
+import reports
+
+# --- Inventory Service ---
+# A headless JSON-over-HTTP front end for database.py, so several counters (or a scanner or
+# web front end) share one process that owns inventory.db. Writes go through a single writer
+# thread, one at a time, so they never contend for the SQLite write lock. Reads run on a pool
+# of reader threads; each has its own connection, and WAL lets them read while a write commits.
+# Only listens on localhost; there is no authentication.
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+MAX_BODY = 16 * 1024 * 1024 # Largest request body accepted (a big bulk import)
+
+STOCK_FILTERS = ("course_code", "title", "language")
+TRANSACTION_FILTERS = ("course_code", "enrolment_no", "action", "name", "remarks", "phone", "date_from", "date_to")
+
+class RequestError(Exception):
+    """A bad request; answered with the given HTTP status and message."""
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+def _filters(query, keys):
+    filters = {key: query[key] for key in keys if query.get(key)}
+    return filters or None
+
+def _int(value, name):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        raise RequestError(400, f"'{name}' must be an integer.") from None
+
+def _required(body, *names):
+    missing = [name for name in names if name not in body]
+    if missing:
+        raise RequestError(400, f"Missing field(s): {', '.join(missing)}")
+    return [body[name] for name in names]
+
+def _result(result):
+    """Turns a database.py (success, message[, id]) tuple into a JSON object."""
+    payload = {"success": result[0], "message": result[1]}
+    if len(result) > 2:
+        payload["id"] = result[2]
+    return payload
+
+def _include_archive(query):
+    return query.get("include_archive", "") not in ("", "0", "false")
+
+def _sort(query, default_sort_by, default_descending):
+    """sort_by and descending from the query (database.py refuses unknown columns)."""
+    descending = query.get("descending", "")
+    return {"sort_by": query.get("sort_by") or default_sort_by,
+            "descending": default_descending if descending == "" else descending not in ("0", "false")}
+
+def _page_key(query, prefix):
+    # (sort value, id); the value is JSON so it keeps its type: a number, a course code or null
+    if query.get(prefix) is None:
+        return None
+    try:
+        value = json.loads(query[prefix])
+    except json.JSONDecodeError:
+        raise RequestError(400, f"'{prefix}' must be a JSON value.") from None
+    return (value, _int(query.get(prefix + "_id"), prefix + "_id"))
+
+# --- Handlers ---
+# Each runs on a reader or writer thread and returns the JSON payload.
+# Arguments: path parameters (from the route), query parameters, JSON body.
+
+def _list_stock(params, query, body):
+    return {"rows": db.get_all_stock(_filters(query, STOCK_FILTERS), **_sort(query, "course_code", False))}
+
+def _get_stock(params, query, body):
+    return {"row": db.get_stock_by_id(_int(params["id"], "id"))}
+
+def _get_stock_by_code(params, query, body):
+    return {"row": db.get_stock_by_name(params["course_code"])}
+
+def _course_codes(params, query, body):
+    return {"course_codes": db.get_course_codes()}
+
+def _add_stock(params, query, body):
+    return _result(db.add_stock(*_required(body, "course_code", "title", "language", "quantity")))
+
+def _update_stock(params, query, body):
+    return _result(db.update_stock(_int(params["id"], "id"),
+                                   *_required(body, "course_code", "title", "language", "quantity")))
+
+def _delete_stock(params, query, body):
+    return _result(db.delete_stock(_int(params["id"], "id")))
+
+def _list_transactions(params, query, body):
+    rows, first_key, last_key = db.get_transactions_page(
+        _filters(query, TRANSACTION_FILTERS), after=_page_key(query, "after"), before=_page_key(query, "before"),
+        limit=_int(query.get("limit", 200), "limit"), include_archive=_include_archive(query),
+        **_sort(query, "transaction_time", True))
+    return {"rows": rows, "first_key": first_key, "last_key": last_key}
+
+def _count_transactions(params, query, body):
+    return {"count": db.count_transactions(_filters(query, TRANSACTION_FILTERS),
+                                           include_archive=_include_archive(query))}
+
+def _get_transaction(params, query, body):
+    return {"row": db.get_transaction_by_id(_int(params["id"], "id"), include_archive=_include_archive(query))}
+
+def _get_transaction_row(params, query, body):
+    row, key = db.get_transaction_row(_int(params["id"], "id"), include_archive=_include_archive(query))
+    return {"row": row, "key": key}
+
+def _add_transaction(params, query, body):
+    stock_id, action, quantity = _required(body, "stock_id", "action", "quantity")
+    return _result(db.add_transaction(stock_id, body.get("enrolment_no"), action, quantity, body.get("name"),
+                                      body.get("remarks"), body.get("phone"), return_id=True,
+                                      request_key=body.get("request_key")))
+
+def _add_transactions_bulk(params, query, body):
+    rows, = _required(body, "rows")
+    if not isinstance(rows, list) or not all(isinstance(row, dict) for row in rows):
+        raise RequestError(400, "'rows' must be a list of objects.")
+    success, message, errors = db.add_transactions_bulk(rows, skip_invalid=bool(body.get("skip_invalid")),
+                                                        request_key=body.get("request_key"))
+    return {"success": success, "message": message, "errors": errors}
+
+def _checkout_cart(params, query, body):
+    items, = _required(body, "items")
+    if not isinstance(items, list) or not all(isinstance(item, list) and len(item) == 2 for item in items):
+        raise RequestError(400, "'items' must be a list of [course_code, quantity] pairs.")
+    success, message, transaction_ids = db.checkout_cart(
+        items, body.get("enrolment_no"), body.get("name"), body.get("remarks"), body.get("phone"),
+        action=body.get("action", "out"), request_key=body.get("request_key"))
+    return {"success": success, "message": message, "ids": transaction_ids}
+
+def _update_transaction(params, query, body):
+    return _result(db.update_transaction_details(_int(params["id"], "id"),
+                                                 *_required(body, "enrolment_no", "name", "remarks", "phone")))
+
+def _delete_transaction(params, query, body):
+    return _result(db.delete_transaction(_int(params["id"], "id")))
+
+def _student_outstanding(params, query, body):
+    return {"rows": db.get_outstanding_for_student(params["enrolment_no"])}
+
+def _run_report(params, query, body):
+    if params["name"] not in reports.REPORTS:
+        raise RequestError(404, f"Unknown report '{params['name']}'.")
+    columns, rows = reports.run_report(params["name"], query.get("from"), query.get("to"))
+    return {"columns": columns, "rows": rows}
+
+def _health(params, query, body):
+    return {"status": "ok", "search_fts": db.search_uses_fts()}
+
+READ, WRITE = "read", "write"
+
+# (method, path pattern, handler, pool)
+ROUTES = [
+    ("GET", r"/health", _health, READ),
+    ("GET", r"/stock", _list_stock, READ),
+    ("POST", r"/stock", _add_stock, WRITE),
+    ("GET", r"/stock/(?P<id>\d+)", _get_stock, READ),
+    ("PUT", r"/stock/(?P<id>\d+)", _update_stock, WRITE),
+    ("DELETE", r"/stock/(?P<id>\d+)", _delete_stock, WRITE),
+    ("GET", r"/stock/by-code/(?P<course_code>[^/]+)", _get_stock_by_code, READ),
+    ("GET", r"/course-codes", _course_codes, READ),
+    ("GET", r"/transactions", _list_transactions, READ),
+    ("POST", r"/transactions", _add_transaction, WRITE),
+    ("POST", r"/transactions/bulk", _add_transactions_bulk, WRITE),
+    ("POST", r"/transactions/checkout", _checkout_cart, WRITE),
+    ("GET", r"/transactions/count", _count_transactions, READ),
+    ("GET", r"/transactions/(?P<id>\d+)", _get_transaction, READ),
+    ("GET", r"/transactions/(?P<id>\d+)/row", _get_transaction_row, READ),
+    ("PUT", r"/transactions/(?P<id>\d+)", _update_transaction, WRITE),
+    ("DELETE", r"/transactions/(?P<id>\d+)", _delete_transaction, WRITE),
+    ("GET", r"/students/(?P<enrolment_no>[^/]+)/outstanding", _student_outstanding, READ),
+    ("GET", r"/reports/(?P<name>[^/]+)", _run_report, READ),
+]
+_COMPILED_ROUTES = [(method, re.compile(pattern + "$"), handler, pool) for method, pattern, handler, pool in ROUTES]
+
+_REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+            413: "Payload Too Large", 500: "Internal Server Error"}
+
+class InventoryService:
+    """The asyncio HTTP server. run() serves until cancelled; start()/stop() for embedding."""
+    def __init__(self, host=DEFAULT_HOST, port=DEFAULT_PORT, readers=4):
+        self.host = host
+        self.port = port
+        self._readers = ThreadPoolExecutor(max_workers=readers, thread_name_prefix="service-reader")
+        self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="service-writer")
+        self._server = None
+
+    async def start(self):
+        self._server = await asyncio.start_server(self._handle_connection, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1] # The real port when 0 was asked for
+        return self
+
+    async def stop(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+        for pool in (self._readers, self._writer):
+            pool.shutdown(wait=True)
+        db.close_db()
+
+    async def run(self):
+        await self.start()
+        async with self._server:
+            await self._server.serve_forever()
+
+    def _route(self, method, path):
+        path_matched = False
+        for route_method, pattern, handler, pool in _COMPILED_ROUTES:
+            match = pattern.match(path)
+            if match:
+                path_matched = True
+                if route_method == method:
+                    return handler, pool, {name: unquote(value) for name, value in match.groupdict().items()}
+        raise RequestError(405 if path_matched else 404, f"No route for {method} {path}")
+
+    async def dispatch(self, method, target, body):
+        """Runs one request. Returns (status, payload)."""
+        try:
+            url = urlsplit(target)
+            handler, pool, params = self._route(method, url.path)
+            query = {key: values[-1] for key, values in parse_qs(url.query).items()}
+            data = json.loads(body) if body else {}
+            if not isinstance(data, dict):
+                raise RequestError(400, "Request body must be a JSON object.")
+            executor = self._writer if pool == WRITE else self._readers
+            payload = await asyncio.get_running_loop().run_in_executor(executor, handler, params, query, data)
+            return 200, payload
+        except RequestError as e:
+            return e.status, {"error": str(e)}
+        except json.JSONDecodeError as e:
+            return 400, {"error": f"Invalid JSON: {e}"}
+        except ValueError as e: # e.g. a malformed date filter
+            return 400, {"error": str(e)}
+        except sqlite3.Error as e:
+            return 500, {"error": f"Database error: {e}"}
+        except Exception as e: # Keep the connection and the server alive on a handler bug
+            return 500, {"error": f"{type(e).__name__}: {e}"}
+
+    async def _handle_connection(self, reader, writer):
+        # Minimal HTTP/1.1 with keep-alive: request line, headers, Content-Length body
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line.strip():
+                    break
+                try:
+                    method, target, version = request_line.decode("latin-1").split()
+                except ValueError:
+                    break
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+
+                length = int(headers.get("content-length") or 0)
+                if length > MAX_BODY:
+                    status, payload = 413, {"error": "Request body too large."}
+                    keep_alive = False
+                else:
+                    body = await reader.readexactly(length) if length else b""
+                    status, payload = await self.dispatch(method.upper(), target, body)
+                    keep_alive = version == "HTTP/1.1" and headers.get("connection", "").lower() != "close"
+
+                data = json.dumps(payload, default=str).encode("utf-8")
+                writer.write(
+                    f"HTTP/1.1 {status} {_REASONS.get(status, '')}\r\n"
+                    f"Content-Type: application/json\r\n"
+                    f"Content-Length: {len(data)}\r\n"
+                    f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n".encode("latin-1") + data)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve the inventory database over a local JSON API.")
+    parser.add_argument("--host", default=DEFAULT_HOST)
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--readers", type=int, default=4, help="Reader threads (default: %(default)s)")
+    parser.add_argument("--db", default=db.DB_NAME, help="Database file (default: %(default)s)")
+    args = parser.parse_args(argv)
+
+    db.set_database(args.db)
+    db.create_tables()
+    service = InventoryService(args.host, args.port, args.readers)
+    print(f"Serving {args.db} on http://{args.host}:{args.port}")
+    try:
+        asyncio.run(service.run())
+    except KeyboardInterrupt:
+        pass
+    finally:
+        db.close_db()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,142 @@
+import time
+from datetime import datetime, timedelta
+import timestamps
+
+# --- Stock Snapshots ---
+# stock.quantity only holds the current value. stock_snapshot checkpoints every stock quantity
+# at a point in time, so a historical quantity can be rebuilt from the nearest snapshot plus the
+# (short) stretch of transaction_log between it and the requested time, instead of replaying
+# the whole log. A snapshot taken at time S covers every log row with transaction_time <= S.
+
+SNAPSHOT_EVERY = 5000 # Checkpoint whenever the transaction id crosses a multiple of this
+SNAPSHOT_MAX_AGE = timedelta(days=1) # ...and at startup if the newest snapshot is older than this
+
+_DELTA = "CASE action WHEN 'in' THEN quantity ELSE -quantity END"
+
+def create_snapshot_table(cursor):
+    """Creates stock_snapshot and takes a first snapshot if there is any history to cover."""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS stock_snapshot (
+            snapshot_time TIMESTAMP NOT NULL,
+            stock_id INTEGER NOT NULL,
+            quantity INTEGER NOT NULL,
+            PRIMARY KEY (snapshot_time, stock_id)
+        ) WITHOUT ROWID
+    ''')
+    # Lets delete_transaction revise one stock's later snapshots without a scan
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_stock_snapshot_stock
+        ON stock_snapshot (stock_id, snapshot_time)
+    ''')
+    cursor.execute("SELECT EXISTS(SELECT 1 FROM transaction_log)")
+    if cursor.fetchone()[0]:
+        take_snapshot(cursor)
+
+def take_snapshot(cursor):
+    """
+    Records the current quantity of every stock item. Call inside a write transaction.
+    The snapshot time is never earlier than the newest log row, so it covers all of them.
+    Returns the snapshot time in epoch milliseconds.
+    """
+    snapshot_time = timestamps.now()
+    cursor.execute("SELECT MAX(transaction_time) FROM transaction_log")
+    newest = cursor.fetchone()[0]
+    if isinstance(newest, str): # Migrations before version 8 run against a text log
+        newest = timestamps.from_text(newest)
+    if newest is not None:
+        snapshot_time = max(snapshot_time, newest)
+    cursor.execute('''
+        INSERT OR REPLACE INTO stock_snapshot (snapshot_time, stock_id, quantity)
+        SELECT ?, id, quantity FROM stock
+    ''', (snapshot_time,))
+    # A row logged later in the same millisecond would count as covered; wait it out (under the
+    # write lock, so no other writer can log one meanwhile)
+    while timestamps.now() == snapshot_time:
+        time.sleep(0.0001)
+    return snapshot_time
+
+def snapshot_due(first_id, last_id):
+    """True if the transaction ids first_id..last_id cross a SNAPSHOT_EVERY boundary."""
+    return last_id // SNAPSHOT_EVERY > (first_id - 1) // SNAPSHOT_EVERY
+
+def latest_snapshot_time(conn):
+    """Returns the time of the newest snapshot in epoch milliseconds, or None if there is none."""
+    return conn.execute("SELECT MAX(snapshot_time) FROM stock_snapshot").fetchone()[0]
+
+def checkpoint_if_stale(conn):
+    """
+    Takes a snapshot if the newest one is older than SNAPSHOT_MAX_AGE and the log has moved on
+    since. Returns True if a snapshot was taken.
+    """
+    latest = latest_snapshot_time(conn)
+    if latest is not None and timestamps.to_datetime(latest) > datetime.now() - SNAPSHOT_MAX_AGE:
+        return False
+    cursor = conn.cursor()
+    cursor.execute("BEGIN IMMEDIATE")
+    try:
+        if latest is None:
+            cursor.execute("SELECT EXISTS(SELECT 1 FROM transaction_log)")
+        else:
+            cursor.execute("SELECT EXISTS(SELECT 1 FROM transaction_log WHERE transaction_time > ?)", (latest,))
+        if not cursor.fetchone()[0]:
+            conn.rollback()
+            return False
+        take_snapshot(cursor)
+        conn.commit()
+        return True
+    except Exception:
+        conn.rollback()
+        raise
+
+def revise_snapshots(cursor, stock_id, transaction_time, quantity_delta):
+    """
+    Applies quantity_delta to every snapshot of stock_id taken at or after transaction_time.
+    Used when a log row is deleted, so snapshots stay consistent with the log that remains.
+    """
+    cursor.execute('''
+        UPDATE stock_snapshot SET quantity = quantity + ?
+        WHERE stock_id = ? AND snapshot_time >= ?
+    ''', (quantity_delta, stock_id, transaction_time))
+
+def nearest_snapshots(conn, before):
+    """
+    Returns (earlier, later): the newest snapshot time < before and the oldest one >= before,
+    either of which may be None. before is in epoch milliseconds, like transaction_time.
+    """
+    earlier = conn.execute(
+        "SELECT MAX(snapshot_time) FROM stock_snapshot WHERE snapshot_time < ?", (before,)).fetchone()[0]
+    later = conn.execute(
+        "SELECT MIN(snapshot_time) FROM stock_snapshot WHERE snapshot_time >= ?", (before,)).fetchone()[0]
+    return earlier, later
+
+def snapshot_quantities(conn, snapshot_time, stock_id=None):
+    """Returns {stock_id: quantity} for one snapshot (optionally a single stock item)."""
+    if stock_id is None:
+        rows = conn.execute(
+            "SELECT stock_id, quantity FROM stock_snapshot WHERE snapshot_time = ?", (snapshot_time,))
+    else:
+        rows = conn.execute(
+            "SELECT stock_id, quantity FROM stock_snapshot WHERE snapshot_time = ? AND stock_id = ?",
+            (snapshot_time, stock_id))
+    return dict(rows.fetchall())
+
+def log_deltas(conn, start=None, end=None, stock_id=None):
+    """
+    Returns {stock_id: net quantity change} over the log rows with start <= transaction_time < end.
+    Either bound may be None for open-ended. With both bounds the transaction_time index limits
+    the cost to the rows in the range.
+    """
+    conditions = []
+    params = []
+    if start is not None:
+        conditions.append("transaction_time >= ?")
+        params.append(start)
+    if end is not None:
+        conditions.append("transaction_time < ?")
+        params.append(end)
+    if stock_id is not None:
+        conditions.append("stock_id = ?")
+        params.append(stock_id)
+    where = " WHERE " + " AND ".join(conditions) if conditions else ""
+    rows = conn.execute(f"SELECT stock_id, SUM({_DELTA}) FROM transaction_log{where} GROUP BY stock_id", params)
+    return dict(rows.fetchall())
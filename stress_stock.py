@@ -0,0 +1,85 @@
+import argparse
+import multiprocessing
+import os
+import random
+import tempfile
+import database as db
+
+# Multi-process stress check for stock adjustment: several processes issue and revert
+# transactions against the same few stock items at once, then the final quantities are
+# compared against the transaction log. Any lost update or oversell shows up as a mismatch.
+
+INITIAL_QUANTITY = 20
+
+def _worker(db_path, stock_ids, operations, seed):
+    db.set_database(db_path)
+    rng = random.Random(seed)
+    own_ids = [] # Transactions this process created and may delete again
+    counts = {"added": 0, "deleted": 0, "rejected": 0}
+    for _ in range(operations):
+        if own_ids and rng.random() < 0.3:
+            success, _ = db.delete_transaction(own_ids.pop(rng.randrange(len(own_ids))))
+            counts["deleted" if success else "rejected"] += 1
+        else:
+            action = "out" if rng.random() < 0.6 else "in"
+            success, _, transaction_id = db.add_transaction(
+                rng.choice(stock_ids), f"E{seed}", action, rng.randint(1, 5),
+                "stress", "", "", return_id=True)
+            if success:
+                own_ids.append(transaction_id)
+                counts["added"] += 1
+            else:
+                counts["rejected"] += 1
+    db.close_db()
+    return counts
+
+def run(processes=4, operations=500, items=3):
+    """Runs the stress test in a scratch database. Returns a list of problems (empty if all is well)."""
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "stress.db")
+        db.set_database(db_path)
+        db.create_tables()
+        for i in range(items):
+            db.add_stock(f"STRESS{i}", "Stress item", "en", INITIAL_QUANTITY)
+        stock_ids = [row[0] for row in db.get_all_stock()]
+        db.close_db()
+
+        context = multiprocessing.get_context("spawn")
+        with context.Pool(processes) as pool:
+            results = pool.starmap(_worker, [(db_path, stock_ids, operations, seed) for seed in range(processes)])
+        for seed, counts in enumerate(results):
+            print(f"process {seed}: {counts}")
+
+        db.set_database(db_path)
+        conn = db.connect_db()
+        problems = []
+        for stock_id, quantity, net in conn.execute('''
+            SELECT s.id, s.quantity,
+                   COALESCE(SUM(CASE t.action WHEN 'in' THEN t.quantity ELSE -t.quantity END), 0)
+            FROM stock s LEFT JOIN transaction_log t ON t.stock_id = s.id
+            GROUP BY s.id
+        '''):
+            expected = INITIAL_QUANTITY + net
+            print(f"stock {stock_id}: quantity {quantity}, expected {expected}")
+            if quantity != expected:
+                problems.append(f"stock {stock_id}: quantity {quantity} != {expected} from the log")
+            if quantity < 0:
+                problems.append(f"stock {stock_id}: negative quantity {quantity}")
+        consistent, message, _ = db.verify_stock_ledger()
+        if not consistent:
+            problems.append(f"ledger: {message}")
+        db.close_db()
+        return problems
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Hammer add/delete_transaction from several processes.")
+    parser.add_argument("--processes", type=int, default=4)
+    parser.add_argument("--operations", type=int, default=500, help="Operations per process")
+    parser.add_argument("--items", type=int, default=3, help="Stock items to contend on")
+    args = parser.parse_args()
+
+    problems = run(args.processes, args.operations, args.items)
+    for problem in problems:
+        print("FAIL:", problem)
+    print("OK" if not problems else f"{len(problems)} problem(s)")
+    raise SystemExit(1 if problems else 0)
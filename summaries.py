@@ -0,0 +1,113 @@
+import timestamps
+
+# --- Report Summary Tables ---
+# Per-month aggregates of transaction_log, kept in step with the log by the triggers below.
+# The reports in reports.py read these instead of the log, so their cost depends on the number
+# of months x items (or borrowers), not on how many millions of log rows there are.
+
+_TABLES = (
+    '''
+    CREATE TABLE IF NOT EXISTS monthly_stock_summary (
+        month TEXT NOT NULL,
+        stock_id INTEGER NOT NULL,
+        qty_in INTEGER NOT NULL,
+        qty_out INTEGER NOT NULL,
+        transactions INTEGER NOT NULL,
+        PRIMARY KEY (month, stock_id)
+    ) WITHOUT ROWID''',
+    '''
+    CREATE TABLE IF NOT EXISTS monthly_borrower_summary (
+        month TEXT NOT NULL,
+        enrolment_no TEXT NOT NULL,
+        qty_in INTEGER NOT NULL,
+        qty_out INTEGER NOT NULL,
+        transactions INTEGER NOT NULL,
+        PRIMARY KEY (month, enrolment_no)
+    ) WITHOUT ROWID''',
+)
+
+def _apply(row, sign):
+    """Trigger statements that add (sign=1) or remove (sign=-1) one log row from both summaries."""
+    month = timestamps.sql_month(f"{row}.transaction_time")
+    qty_in = f"CASE {row}.action WHEN 'in' THEN {sign} * {row}.quantity ELSE 0 END"
+    qty_out = f"CASE {row}.action WHEN 'out' THEN {sign} * {row}.quantity ELSE 0 END"
+    statements = f'''
+        INSERT INTO monthly_stock_summary (month, stock_id, qty_in, qty_out, transactions)
+        VALUES ({month}, {row}.stock_id, {qty_in}, {qty_out}, {sign})
+        ON CONFLICT (month, stock_id) DO UPDATE SET
+            qty_in = qty_in + excluded.qty_in,
+            qty_out = qty_out + excluded.qty_out,
+            transactions = transactions + excluded.transactions;
+        INSERT INTO monthly_borrower_summary (month, enrolment_no, qty_in, qty_out, transactions)
+        SELECT {month}, {row}.enrolment_no, {qty_in}, {qty_out}, {sign}
+        WHERE COALESCE({row}.enrolment_no, '') <> ''
+        ON CONFLICT (month, enrolment_no) DO UPDATE SET
+            qty_in = qty_in + excluded.qty_in,
+            qty_out = qty_out + excluded.qty_out,
+            transactions = transactions + excluded.transactions;'''
+    if sign < 0: # Drop groups that no longer have any rows
+        statements += f'''
+        DELETE FROM monthly_stock_summary
+        WHERE month = {month} AND stock_id = {row}.stock_id AND transactions = 0;
+        DELETE FROM monthly_borrower_summary
+        WHERE month = {month} AND enrolment_no = {row}.enrolment_no AND transactions = 0;'''
+    return statements
+
+_TRIGGERS = (
+    f'''
+    CREATE TRIGGER IF NOT EXISTS summary_ai AFTER INSERT ON transaction_log BEGIN{_apply("new", 1)}
+    END''',
+    f'''
+    CREATE TRIGGER IF NOT EXISTS summary_ad AFTER DELETE ON transaction_log BEGIN{_apply("old", -1)}
+    END''',
+    # Detail edits (name, remarks, phone) don't touch the summaries
+    f'''
+    CREATE TRIGGER IF NOT EXISTS summary_au
+    AFTER UPDATE OF stock_id, enrolment_no, action, quantity, transaction_time ON transaction_log
+    BEGIN{_apply("old", -1)}{_apply("new", 1)}
+    END''',
+)
+
+def create_summary_tables(cursor):
+    """Creates the summary tables and their triggers, then fills them from the existing log."""
+    for table in _TABLES:
+        cursor.execute(table)
+    for trigger in _TRIGGERS:
+        cursor.execute(trigger)
+
+    cursor.execute("DELETE FROM monthly_stock_summary")
+    cursor.execute(f'''
+        INSERT INTO monthly_stock_summary (month, stock_id, qty_in, qty_out, transactions)
+        SELECT {timestamps.sql_month("transaction_time")}, stock_id,
+               SUM(CASE action WHEN 'in' THEN quantity ELSE 0 END),
+               SUM(CASE action WHEN 'out' THEN quantity ELSE 0 END),
+               COUNT(*)
+        FROM transaction_log
+        GROUP BY 1, 2
+    ''')
+    cursor.execute("DELETE FROM monthly_borrower_summary")
+    cursor.execute(f'''
+        INSERT INTO monthly_borrower_summary (month, enrolment_no, qty_in, qty_out, transactions)
+        SELECT {timestamps.sql_month("transaction_time")}, enrolment_no,
+               SUM(CASE action WHEN 'in' THEN quantity ELSE 0 END),
+               SUM(CASE action WHEN 'out' THEN quantity ELSE 0 END),
+               COUNT(*)
+        FROM transaction_log
+        WHERE COALESCE(enrolment_no, '') <> ''
+        GROUP BY 1, 2
+    ''')
+
+# Since version 7: rows moved out by archive.py stay counted
+_DELETE_KEEPING_ARCHIVED = f'''
+    CREATE TRIGGER IF NOT EXISTS summary_ad AFTER DELETE ON transaction_log
+    WHEN (SELECT archiving FROM log_archive) IS NOT 1
+    BEGIN{_apply("old", -1)}
+    END'''
+
+def keep_archived_rows(cursor):
+    """
+    Recreates the delete trigger so rows moved out by archive.py stay counted: the summaries
+    keep covering archived months without the archive being attached.
+    """
+    cursor.execute("DROP TRIGGER IF EXISTS summary_ad")
+    cursor.execute(_DELETE_KEEPING_ARCHIVED)
@@ -0,0 +1,23 @@
+import os
+import sys
+import pytest
+
+# The modules live at the repository root, next to this directory
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import database as db
+
+@pytest.fixture
+def inventory(tmp_path):
+    """database.py pointed at a fresh, migrated database file in tmp_path; yields the module."""
+    db.set_database(str(tmp_path / "inventory.db"))
+    db.create_tables()
+    yield db
+    db.close_db()
+
+@pytest.fixture
+def stocked(inventory):
+    """inventory with two stock items: BCS-001 (id 1, quantity 10) and MCO-002 (id 2, quantity 5)."""
+    assert inventory.add_stock("BCS-001", "Programming", "English", 10)[0]
+    assert inventory.add_stock("MCO-002", "Economics", "Hindi", 5)[0]
+    return inventory
@@ -0,0 +1,69 @@
+import pytest
+import archive
+import timestamps
+
+@pytest.fixture
+def logged(stocked):
+    """stocked with transactions 1-5, logged on 1-5 January 2024 (alternately for items 1 and 2)."""
+    db = stocked
+    conn = db.connect_db()
+    for day in range(1, 6):
+        success, _, transaction_id = db.add_transaction(1 + day % 2, f"E{day}", "out", 1, "", "", "", return_id=True)
+        assert success
+        conn.execute("UPDATE transaction_log SET transaction_time = ? WHERE id = ?",
+                     (timestamps.bound(f"2024-01-0{day}"), transaction_id))
+        conn.commit()
+    return db
+
+def _ids(rows):
+    return [row[0] for row in rows]
+
+def test_archived_rows_leave_the_hot_log_but_stay_listed(logged):
+    db = logged
+    everything = db.get_all_transactions()
+    batches = []
+    success, message = db.archive_transactions("2024-01-04", batch_size=2, progress=batches.append)
+    assert success, message
+    assert batches == [2, 3]
+    assert _ids(db.get_all_transactions()) == [5, 4]
+    assert db.get_all_transactions(include_archive=True) == everything
+    assert db.count_transactions() == 2 and db.count_transactions(include_archive=True) == 5
+    assert db.get_transaction_row(1) == (None, None)
+    assert db.get_transaction_row(1, include_archive=True)[0] == everything[-1]
+    assert archive.archived_through(db.connect_db()) == timestamps.bound("2024-01-03")
+
+    # Paging merges the two logs
+    seen, key = [], None
+    while True:
+        rows, _, key = db.get_transactions_page(after=key, limit=2, include_archive=True)
+        if not rows:
+            break
+        seen += _ids(rows)
+    assert seen == [5, 4, 3, 2, 1]
+
+def test_archiving_keeps_quantities_balances_and_history(logged):
+    db = logged
+    before = [db.get_stock_by_id(stock_id) for stock_id in (1, 2)]
+    as_of = db.get_stock_as_of(timestamps.bound("2024-01-03"))
+    assert db.archive_transactions("2024-01-04")[0]
+    assert [db.get_stock_by_id(stock_id) for stock_id in (1, 2)] == before
+    assert db.get_stock_as_of(timestamps.bound("2024-01-03")) == as_of
+    assert db.check_student_balances()[0]
+    assert db.get_outstanding_for_student("E1")[0][:4] == (2, "MCO-002", "Economics", 1)
+    # Archived history still belongs to its stock item
+    assert not db.delete_stock(2)[0]
+
+def test_interrupted_batch_is_finished_by_the_next_run(logged):
+    db = logged
+    conn = db.connect_db()
+    # A batch that stopped after copying row 1 to the archive, before deleting it from the hot log
+    archive.attach(conn, archive.archive_path(db.DB_NAME), create=True)
+    conn.execute(f"INSERT INTO {archive.ARCHIVE_SCHEMA}.transaction_log SELECT * FROM main.transaction_log WHERE id = 1")
+    conn.commit()
+    assert _ids(db.get_all_transactions(include_archive=True)) == [5, 4, 3, 2, 1] # Read once
+    assert db.count_transactions(include_archive=True) == 5
+
+    assert db.archive_transactions("2024-01-03")[0]
+    assert _ids(db.get_all_transactions()) == [5, 4, 3]
+    assert _ids(db.get_all_transactions(include_archive=True)) == [5, 4, 3, 2, 1]
+    assert db.verify_stock_ledger()[0]
@@ -0,0 +1,17 @@
+def test_outstanding_items_come_back_in_course_order(stocked):
+    db = stocked
+    assert db.add_stock("ACC-003", "Accounts", "English", 4)[0]
+    for stock_id in (2, 1, 3):
+        assert db.add_transaction(stock_id, "E1", "out", 2, "", "", "")[0]
+    assert db.add_transaction(1, "E1", "in", 2, "", "", "")[0] # Returned in full
+    assert db.add_transaction(2, "E2", "out", 1, "", "", "")[0]
+    assert [row[:4] for row in db.get_outstanding_for_student(" E1 ")] == [
+        (3, "ACC-003", "Accounts", 2), (2, "MCO-002", "Economics", 2)]
+
+def test_renaming_an_item_reorders_its_balances(stocked):
+    db = stocked
+    assert db.add_transaction(1, "E1", "out", 1, "", "", "")[0]
+    assert db.add_transaction(2, "E1", "out", 1, "", "", "")[0]
+    assert db.update_stock(1, "ZOO-001", "Programming", "English", 9)[0]
+    assert [row[1] for row in db.get_outstanding_for_student("E1")] == ["MCO-002", "ZOO-001"]
+    assert db.check_student_balances()[0]
@@ -0,0 +1,53 @@
+import csv_import
+
+def _row(course_code, action, quantity, enrolment_no="E1"):
+    return {"course_code": course_code, "action": action, "quantity": quantity, "enrolment_no": enrolment_no}
+
+def test_bulk_rows_are_applied_in_one_go(stocked):
+    db = stocked
+    success, message, errors = db.add_transactions_bulk([
+        _row("BCS-001", "out", "4"), _row("MCO-002", "out", 5), _row("BCS-001", "in", 1), _row("BCS-001", "out", 7)])
+    assert success and errors == [], message
+    assert [db.get_stock_by_id(stock_id)[4] for stock_id in (1, 2)] == [0, 0]
+    assert [(row[1], row[3], row[4]) for row in db.get_all_transactions(sort_by="id", descending=False)] == [
+        ("BCS-001", "out", 4), ("MCO-002", "out", 5), ("BCS-001", "in", 1), ("BCS-001", "out", 7)]
+    assert db.verify_stock_ledger()[0] and db.check_student_balances()[0]
+
+def test_one_invalid_row_aborts_the_batch_unless_skipped(stocked):
+    db = stocked
+    rows = [_row("BCS-001", "out", 8), _row("BCS-001", "out", 3), _row("XXX", "in", 1), _row("MCO-002", "lend", 1),
+            _row("MCO-002", "in", "two"), _row("MCO-002", "out", 5)]
+    success, _, errors = db.add_transactions_bulk(rows)
+    assert not success
+    assert [number for number, _ in errors] == [2, 3, 4, 5] # Row 2 would take BCS-001 below zero after row 1
+    assert db.count_transactions() == 0 and db.get_stock_by_id(1)[4] == 10
+
+    success, message, errors = db.add_transactions_bulk(rows, skip_invalid=True)
+    assert success and "Skipped 4" in message and len(errors) == 4
+    assert [db.get_stock_by_id(stock_id)[4] for stock_id in (1, 2)] == [2, 0]
+
+def test_repeated_import_with_a_request_key_writes_once(stocked):
+    db = stocked
+    rows = [_row("BCS-001", "out", 1)]
+    assert db.add_transactions_bulk(rows, request_key="sheet-1")[0]
+    assert db.add_transactions_bulk(rows, request_key="sheet-1")[1] == "This import was already applied."
+    assert db.count_transactions() == 1
+
+def test_csv_import_reports_errors_by_line(stocked, tmp_path):
+    db = stocked
+    path = tmp_path / "sheet.csv"
+    path.write_text("Course_Code,Action,Quantity,Enrolment_No,Extra\n"
+                    "BCS-001,out,2,E1,x\n"
+                    "MCO-002,out,9,E2,x\n"
+                    "MCO-002,in,1,E3,x\n", encoding="utf-8")
+    success, _, errors = csv_import.import_transactions_csv(str(path))
+    assert not success and [line for line, _ in errors] == [3]
+    success, _, errors = csv_import.import_transactions_csv(str(path), skip_invalid=True)
+    assert success and [line for line, _ in errors] == [3]
+    assert [row[2] for row in db.get_all_transactions(sort_by="id", descending=False)] == ["E1", "E3"]
+
+def test_csv_without_a_required_column_is_refused(stocked, tmp_path):
+    path = tmp_path / "sheet.csv"
+    path.write_text("course_code,quantity\nBCS-001,1\n", encoding="utf-8")
+    success, message, _ = csv_import.import_transactions_csv(str(path))
+    assert not success and "action" in message
@@ -0,0 +1,98 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from catalog import StockCatalog
+from instrumentation import InstrumentedConnection
+import database as db
+
+def _table_quantity(stock_id):
+    return db.connect_db().execute("SELECT quantity FROM stock WHERE id = ?", (stock_id,)).fetchone()[0]
+
+def test_catalog_follows_writes(stocked):
+    assert db.get_stock_by_id(1)[4] == 10
+    assert db.add_transaction(1, "E1", "out", 3, "", "", "")[0]
+    assert db.get_stock_by_id(1)[4] == 7
+    assert db.update_stock(1, "BCS-101", "Programming", "English", 20)[0]
+    assert db.get_stock_by_name("BCS-001") is None
+    assert db.get_stock_by_name("BCS-101")[4] == 20
+    assert db.delete_stock(2)[0]
+    assert db.get_stock_by_id(2) is None
+    assert db.get_course_codes() == ["BCS-101"]
+
+def test_reload_right_after_a_commit_does_not_count_the_change_twice(stocked, monkeypatch):
+    reader = ThreadPoolExecutor(1)
+    try:
+        reader.submit(db.get_stock_by_id, 1).result()
+        original_commit = InstrumentedConnection.commit
+        def commit_then_reader_reloads(conn):
+            original_commit(conn)
+            # The reader reloads between the commit and the catalog update (or waits for the update)
+            try:
+                reader.submit(db.get_stock_by_id, 1).result(timeout=0.5)
+            except TimeoutError:
+                pass
+        monkeypatch.setattr(InstrumentedConnection, "commit", commit_then_reader_reloads)
+        assert db.add_transaction(1, "E1", "out", 3, "", "", "")[0]
+        monkeypatch.undo()
+        assert _table_quantity(1) == 7
+        assert reader.submit(db.get_stock_by_id, 1).result()[4] == 7
+        assert db.get_stock_by_id(1)[4] == 7
+    finally:
+        reader.submit(db.close_thread_db).result()
+        reader.shutdown()
+
+def test_readers_taking_turns_do_not_reload(stocked, monkeypatch):
+    db.get_stock_by_id(1)
+    loads = []
+    original_load = StockCatalog._load
+    monkeypatch.setattr(StockCatalog, "_load", lambda catalog, conn: (loads.append(conn), original_load(catalog, conn)))
+    first, second = ThreadPoolExecutor(1), ThreadPoolExecutor(1)
+    try:
+        for _ in range(5):
+            first.submit(db.get_stock_by_id, 1).result()
+            second.submit(db.get_stock_by_id, 1).result()
+    finally:
+        for pool in (first, second):
+            pool.submit(db.close_thread_db).result()
+            pool.shutdown()
+    assert len(loads) == 2 # Each connection's first check only
+
+def test_readers_reloading_during_writes_never_count_a_change_twice(stocked):
+    # The service's shape: one writer thread, several reader threads sharing the catalog
+    stop = threading.Event()
+    errors = []
+
+    def reader():
+        try:
+            while not stop.is_set():
+                db.get_stock_by_id(1)
+                db.get_all_stock()
+        except Exception as e:
+            errors.append(e)
+        finally:
+            db.close_thread_db()
+
+    def writer():
+        try:
+            for i in range(200):
+                action = "in" if i % 2 == 0 else "out"
+                assert db.add_transaction(1, f"E{i}", action, 1 + i % 3, "", "", "")[0]
+                # The writer's own commits don't move its data_version, so it never reloads:
+                # whatever the catalog holds now is what it will keep serving
+                cached = db.get_stock_by_id(1)[4]
+                actual = _table_quantity(1)
+                if cached != actual:
+                    errors.append(AssertionError(f"after write {i}: catalog {cached}, table {actual}"))
+                    return
+        except Exception as e:
+            errors.append(e)
+
+    readers = [threading.Thread(target=reader) for _ in range(4)]
+    for thread in readers:
+        thread.start()
+    writing = threading.Thread(target=writer)
+    writing.start()
+    writing.join()
+    stop.set()
+    for thread in readers:
+        thread.join()
+    assert not errors, errors[0]
@@ -0,0 +1,36 @@
+def test_checkout_returns_the_ids_it_inserted(stocked):
+    db = stocked
+    assert db.checkout_cart([("BCS-001", 1), ("MCO-002", 2)], "E1", "Asha", "", "")[2] == [1, 2]
+    success, message, ids = db.checkout_cart([("BCS-001", 1), ("MCO-002", 1)], "E1", "Asha", "", "")
+    assert success
+    for transaction_id, course_code in zip(ids, ("BCS-001", "MCO-002")):
+        assert db.get_transaction_by_id(transaction_id)[2] == course_code
+
+def test_checkout_ids_after_deleting_the_newest_transaction(stocked):
+    # AUTOINCREMENT doesn't reuse the deleted id, so MAX(id) + 1 would be one behind
+    db = stocked
+    db.add_transaction(1, "E1", "out", 1, "", "", "")
+    _, _, newest = db.add_transaction(1, "E1", "out", 1, "", "", "", return_id=True)
+    assert db.delete_transaction(newest)[0]
+
+    success, _, ids = db.checkout_cart([("BCS-001", 1), ("MCO-002", 1)], "E2", "Ravi", "", "")
+    assert success and ids == [newest + 1, newest + 2]
+    assert [db.get_transaction_row(transaction_id)[0][2] for transaction_id in ids] == ["E2", "E2"]
+
+def test_checkout_is_all_or_nothing(stocked):
+    db = stocked
+    success, message, ids = db.checkout_cart([("BCS-001", 1), ("MCO-002", 6)], "E1", "", "", "")
+    assert not success and ids == [] and "MCO-002" in message
+    assert db.count_transactions() == 0
+    assert db.get_stock_by_id(1)[4] == 10
+
+def test_bulk_request_key_remembers_the_first_inserted_id(stocked):
+    db = stocked
+    _, _, newest = db.add_transaction(1, "E1", "in", 1, "", "", "", return_id=True)
+    db.delete_transaction(newest)
+    assert db.add_transactions_bulk([{"course_code": "BCS-001", "action": "in", "quantity": 2}], request_key="K")[0]
+    conn = db.connect_db()
+    assert conn.execute("SELECT transaction_id FROM request_key WHERE key = 'K'").fetchone()[0] == newest + 1
+    assert db.add_transactions_bulk([{"course_code": "BCS-001", "action": "in", "quantity": 2}],
+                                    request_key="K")[1] == "This import was already applied."
+    assert db.get_stock_by_id(1)[4] == 12
@@ -0,0 +1,69 @@
+import sqlite3
+import threading
+from datetime import timedelta
+import pytest
+import contention
+import timestamps
+
+@pytest.fixture
+def contended(stocked, monkeypatch):
+    """stocked with a 20 ms busy timeout and short backoff, plus a second connection to hold the write lock."""
+    monkeypatch.setattr(contention, "BUSY_TIMEOUT_MS", 20)
+    monkeypatch.setattr(contention, "BACKOFF_BASE", 0.02)
+    monkeypatch.setattr(contention, "BACKOFF_MAX", 0.1)
+    stocked.close_db() # Reopened with the short timeout
+    contention.reset()
+    blocker = sqlite3.connect(stocked.DB_NAME, isolation_level=None, check_same_thread=False)
+    yield stocked, blocker
+    blocker.close()
+    contention.reset()
+
+def test_busy_write_is_retried_until_the_lock_is_free(contended):
+    db, blocker = contended
+    blocker.execute("BEGIN IMMEDIATE")
+    threading.Timer(0.1, blocker.execute, ("COMMIT",)).start()
+    success, message = db.add_transaction(1, "E1", "out", 2, "", "", "")
+    assert success, message
+    stats = contention.contention_stats()["add_transaction"]
+    assert stats["calls"] == 1 and stats["retries"] >= 1 and stats["gave_up"] == 0
+    assert db.get_stock_by_id(1)[4] == 8
+
+def test_write_gives_up_after_max_attempts(contended, monkeypatch):
+    db, blocker = contended
+    monkeypatch.setattr(contention, "MAX_ATTEMPTS", 2)
+    blocker.execute("BEGIN IMMEDIATE")
+    try:
+        success, message = db.add_transaction(1, "E1", "out", 2, "", "", "")
+    finally:
+        blocker.execute("ROLLBACK")
+    assert not success and "locked" in message
+    stats = contention.contention_stats()["add_transaction"]
+    assert stats["retries"] == 1 and stats["gave_up"] == 1
+    assert db.get_stock_by_id(1)[4] == 10
+
+def test_replayed_request_key_returns_the_first_result(stocked):
+    db = stocked
+    first = db.add_transaction(1, "E1", "out", 2, "", "", "", return_id=True, request_key="req-1")
+    replay = db.add_transaction(1, "E1", "out", 2, "", "", "", return_id=True, request_key="req-1")
+    assert first[0] and replay[0]
+    assert replay[1] == "Transaction was already recorded."
+    assert replay[2] == first[2]
+    assert db.count_transactions() == 1
+    assert db.get_stock_by_id(1)[4] == 8
+    other = db.add_transaction(1, "E1", "out", 2, "", "", "", return_id=True, request_key="req-2")
+    assert other[2] == first[2] + 1
+
+def test_old_request_keys_are_pruned(stocked):
+    db = stocked
+    assert db.add_transaction(1, "E1", "out", 1, "", "", "", request_key="old")[0]
+    assert db.add_transaction(1, "E1", "out", 1, "", "", "", request_key="new")[0]
+    conn = db.connect_db()
+    created = conn.execute("SELECT created FROM request_key WHERE key = 'old'").fetchone()[0]
+    assert isinstance(created, int) and abs(created - timestamps.now()) < 60_000 # Epoch milliseconds
+    conn.execute("UPDATE request_key SET created = ? WHERE key = 'old'",
+                 (created - contention.REQUEST_KEY_MAX_AGE // timedelta(milliseconds=1) - 1,))
+    conn.commit()
+    assert contention.prune_request_keys(conn) == 1
+    # Forgotten, so the same key is a new write
+    assert db.add_transaction(1, "E1", "out", 1, "", "", "", request_key="old")[1] != "Transaction was already recorded."
+    assert db.add_transaction(1, "E1", "out", 1, "", "", "", request_key="new")[1] == "Transaction was already recorded."
@@ -0,0 +1,70 @@
+import csv
+import json
+import pytest
+import export
+import timestamps
+
+@pytest.fixture
+def logged(stocked):
+    """stocked with 25 transactions on 1-25 January 2024, E1 to E5 in turn, every fifth one an 'in'."""
+    db = stocked
+    assert db.update_stock(2, "MCO-002", "Economics", "Hindi", 50)[0]
+    conn = db.connect_db()
+    for day in range(1, 26):
+        success, _, transaction_id = db.add_transaction(1 + day % 2, f"E{day % 5 + 1}", "in" if day % 5 == 0 else "out",
+                                                        1, f"Student {day}", "", "", return_id=True)
+        assert success
+        conn.execute("UPDATE transaction_log SET transaction_time = ? WHERE id = ?",
+                     (timestamps.bound(f"2024-01-{day:02d} 09:00"), transaction_id))
+        conn.commit()
+    return db
+
+def _listed(db, filters=None, **kwargs):
+    return [row[:5] + (timestamps.format_timestamp(row[5]),) + row[6:] for row in db.get_all_transactions(filters, **kwargs)]
+
+def test_csv_export_matches_the_listing(logged, tmp_path):
+    db = logged
+    path = tmp_path / "log.csv"
+    assert export.export_transactions(str(path), "csv", chunk_size=4) == 25
+    with open(path, newline="", encoding="utf-8") as f:
+        rows = list(csv.reader(f))
+    assert tuple(rows[0]) == export.EXPORT_COLUMNS
+    assert rows[1:] == [[str(value) for value in row] for row in _listed(db)]
+
+@pytest.mark.parametrize("filters", [{"enrolment_no": "E3"}, {"action": "in", "course_code": "MCO"},
+                                     {"date_from": "2024-01-10", "date_to": "2024-01-12"}, {"name": "student 1"}])
+def test_jsonl_export_honours_filters(logged, tmp_path, filters):
+    db = logged
+    path = tmp_path / "log.jsonl"
+    written = export.export_transactions(str(path), "jsonl", filters)
+    with open(path, encoding="utf-8") as f:
+        records = [json.loads(line) for line in f]
+    listed = _listed(db, filters)
+    assert written == len(records) == len(listed) > 0
+    assert [tuple(record[column] for column in export.EXPORT_COLUMNS) for record in records] == listed
+
+def test_progress_is_reported_per_chunk_and_can_cancel(logged, tmp_path):
+    calls = []
+    assert export.export_transactions(str(tmp_path / "log.csv"), progress=lambda *args: calls.append(args),
+                                      chunk_size=10) == 25
+    assert calls == [(10, 25), (20, 25), (25, 25)]
+    assert export.export_transactions(str(tmp_path / "log.csv"), progress=lambda done, total: done < 10,
+                                      chunk_size=5) == 10
+
+def test_iteration_reads_the_cursor_in_chunks(logged):
+    rows = logged.iter_transactions(chunk_size=4)
+    assert next(rows) == logged.get_all_transactions()[0]
+    rows.close() # Stopping early releases the cursor
+
+def test_archived_rows_are_exported_on_request(logged, tmp_path):
+    db = logged
+    assert db.archive_transactions("2024-01-10")[0]
+    assert export.export_transactions(str(tmp_path / "hot.csv")) == 16
+    path = tmp_path / "all.jsonl"
+    assert export.export_transactions(str(path), "jsonl", include_archive=True) == 25
+    with open(path, encoding="utf-8") as f:
+        assert [json.loads(line)["id"] for line in f] == list(range(25, 0, -1))
+
+def test_unknown_format_is_refused(logged, tmp_path):
+    with pytest.raises(ValueError):
+        export.export_transactions(str(tmp_path / "log.xml"), "xml")
@@ -0,0 +1,42 @@
+import pytest
+import search
+
+@pytest.fixture
+def catalogued(inventory):
+    """An empty inventory with MCS011 "Computer Basics" and one transaction against it by EN12345."""
+    db = inventory
+    assert db.add_stock("MCS011", "Computer Basics", "English", 10)[0]
+    assert db.add_stock("BCS-001", "Programming", "Hindi", 10)[0]
+    assert db.add_transaction(1, "EN12345", "out", 1, "Asha", "lab kit", "9811012345")[0]
+    assert db.add_transaction(2, "EN99999", "out", 1, "Ravi", "", "")[0]
+    return db
+
+def _codes(rows):
+    return [row[1] for row in rows]
+
+@pytest.mark.parametrize("filters", [{"course_code": "011"}, {"course_code": "mcs0"}, {"title": "asics"},
+                                     {"title": "BASICS"}, {"course_code": "S01", "language": "ngl"}])
+def test_stock_filters_match_any_substring(catalogued, filters):
+    assert _codes(catalogued.get_all_stock(filters)) == ["MCS011"]
+
+@pytest.mark.parametrize("filters", [{"enrolment_no": "12345"}, {"course_code": "011"}, {"name": "sha"},
+                                     {"remarks": "kit"}, {"phone": "012"}, {"course_code": "011", "action": "out"}])
+def test_transaction_filters_match_any_substring(catalogued, filters):
+    assert [row[2] for row in catalogued.get_all_transactions(filters)] == ["EN12345"]
+
+def test_action_filter_is_exact(catalogued):
+    assert catalogued.get_all_transactions({"action": "ou"}) == []
+
+def test_like_is_the_default(catalogued):
+    assert not catalogued.search_uses_fts()
+
+def test_fts_is_opt_in_and_matches_word_prefixes(catalogued, monkeypatch):
+    db = catalogued
+    if not search.has_search_index(db.connect_db()):
+        pytest.skip("SQLite built without FTS5")
+    monkeypatch.setattr(db, "USE_FTS_SEARCH", True)
+    assert db.search_uses_fts()
+    assert _codes(db.get_all_stock({"title": "basi"})) == ["MCS011"]
+    assert [row[2] for row in db.get_all_transactions({"name": "ash", "course_code": "mcs"})] == ["EN12345"]
+    # Word prefixes only: the trade-off that keeps it opt-in
+    assert db.get_all_stock({"title": "asics"}) == []
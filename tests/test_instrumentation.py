@@ -0,0 +1,38 @@
+import pytest
+import instrumentation
+
+@pytest.fixture
+def instrumented(stocked, tmp_path):
+    instrumentation.configure(enabled=True, log_path=str(tmp_path / "slow_queries.log"))
+    instrumentation.reset()
+    yield stocked
+    instrumentation.configure(enabled=False)
+    instrumentation.reset()
+
+def _callers():
+    return {caller for _, caller, _, _, _ in instrumentation.recent_statements()}
+
+def test_statements_in_helpers_are_attributed_to_the_public_function(instrumented):
+    db = instrumented
+    success, _, _ = db.checkout_cart([("BCS-001", 1), ("MCO-002", 2)], "E1", "", "", "", request_key="cart-1")
+    assert success
+    # _insert_transactions, contention.find_request/remember_request, snapshots.snapshot_due...
+    assert _callers() == {"database.checkout_cart"}
+    assert "database.checkout_cart" in instrumentation.statement_stats()
+
+def test_nested_public_calls_count_towards_the_outer_one(instrumented):
+    db = instrumented
+    db.get_stock_by_id(1) # Loads the catalog under its own name
+    instrumentation.reset()
+    db.create_tables() # Runs run_maintenance()
+    assert _callers() == {"database.create_tables"}
+
+def test_generators_are_attributed_while_advanced(instrumented):
+    db = instrumented
+    assert db.add_transaction(1, "E1", "out", 1, "", "", "")[0]
+    instrumentation.reset()
+    rows = db.iter_transactions(chunk_size=1)
+    next(rows)
+    db.get_stock_by_name("BCS-001") # Between two steps: counted under its own name
+    list(rows)
+    assert _callers() == {"database.iter_transactions", "database.get_stock_by_name"}
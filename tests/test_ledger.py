@@ -0,0 +1,37 @@
+import timestamps
+
+def test_verify_counts_only_new_transactions(stocked):
+    db = stocked
+    for action, quantity in (("out", 3), ("in", 1), ("out", 2)):
+        assert db.add_transaction(1, "E1", action, quantity, "", "", "")[0]
+    consistent, message, drift = db.verify_stock_ledger()
+    assert consistent and drift == []
+    assert message.startswith("Checked transactions 1 to 3.")
+    assert db.verify_stock_ledger()[1].startswith("No new transactions.")
+
+def test_drift_is_reported_and_repaired(stocked):
+    db = stocked
+    assert db.add_transaction(1, "E1", "out", 3, "", "", "")[0]
+    assert db.update_stock(1, "BCS-001", "Programming", "English", 50)[0] # Not logged
+    consistent, _, drift = db.verify_stock_ledger()
+    assert not consistent
+    assert drift == [("BCS-001", 1, 50, 7)]
+    assert db.get_stock_by_id(1)[4] == 50 # Only reported
+
+    consistent, message, drift = db.verify_stock_ledger(repair=True)
+    assert drift == [("BCS-001", 1, 50, 7)] and "epaired" in message
+    assert db.get_stock_by_id(1)[4] == 7
+    assert db.connect_db().execute("SELECT quantity FROM stock WHERE id = 1").fetchone()[0] == 7
+    assert db.verify_stock_ledger() == (True, "No new transactions. Stock quantities match the log.", [])
+
+def test_deleted_and_archived_transactions_stay_consistent(stocked):
+    db = stocked
+    for _ in range(3):
+        assert db.add_transaction(2, "E1", "out", 1, "", "", "")[0]
+    assert db.verify_stock_ledger()[0]
+    assert db.delete_transaction(2)[0] # Already counted: the trigger takes it back out
+    assert db.add_transaction(2, "E2", "in", 2, "", "", "")[0]
+    assert db.archive_transactions(timestamps.now() + 1000)[0]
+    consistent, _, drift = db.verify_stock_ledger()
+    assert consistent, drift
+    assert db.get_stock_by_id(2)[4] == 5
@@ -0,0 +1,73 @@
+import pytest
+import live_filter
+import search
+import timestamps
+
+ROWS = [ # stock_id, enrolment_no, action, quantity, name, remarks, day (None: left as unconverted text)
+    (1, "EN12345", "out", 2, "Asha Rao", "lab kit", 3),
+    (2, "EN12345", "in", 1, "Asha Rao", "", 5),
+    (1, "EN67890", "out", 1, "Ravi Kumar", "spare", 10),
+    (2, None, "in", 4, "", "restock", 12),
+    (1, "EN67890", "in", 1, "Ravi Kumar", "returned late", None),
+]
+
+FILTERS = [
+    {},
+    {"enrolment_no": "12345"},
+    {"enrolment_no": "EN1"},
+    {"name": "rao"},
+    {"name": "Ravi K", "remarks": "late"},
+    {"course_code": "001"},
+    {"course_code": "MCO", "action": "in"},
+    {"action": "out"},
+    {"date_from": "2024-01-05"},
+    {"date_to": "2024-01-10"},
+    {"date_from": "2024-01-04", "date_to": "2024-01-11"},
+    {"date_from": "2024-01-04", "action": "in"},
+    {"date_to": "2024-01-31", "name": "ravi"},
+]
+
+@pytest.fixture
+def logged(stocked):
+    db = stocked
+    conn = db.connect_db()
+    for stock_id, enrolment_no, action, quantity, name, remarks, day in ROWS:
+        success, _, transaction_id = db.add_transaction(stock_id, enrolment_no, action, quantity, name, remarks, "",
+                                                        return_id=True)
+        assert success
+        time = timestamps.bound(f"2024-01-{day:02d} 12:00") if day else "sometime"
+        conn.execute("UPDATE transaction_log SET transaction_time = ? WHERE id = ?", (time, transaction_id))
+        conn.commit()
+    return db
+
+@pytest.mark.parametrize("use_fts", [False, True])
+@pytest.mark.parametrize("filters", FILTERS)
+def test_predicate_agrees_with_the_query(logged, monkeypatch, filters, use_fts):
+    db = logged
+    if use_fts:
+        if not search.has_search_index(db.connect_db()):
+            pytest.skip("SQLite built without FTS5")
+        monkeypatch.setattr(db, "USE_FTS_SEARCH", True)
+    predicate = live_filter.transaction_predicate(filters, db.search_uses_fts())
+    if predicate is None:
+        pytest.skip("Not evaluated in memory")
+    shown = db.get_all_transactions()
+    assert [row for row in shown if predicate(row)] == db.get_all_transactions(filters)
+
+def test_unconverted_time_passes_a_lower_bound_only(logged):
+    unconverted = next(row for row in logged.get_all_transactions() if isinstance(row[5], str))
+    assert live_filter.transaction_predicate({"date_from": "2024-01-01"}, False)(unconverted)
+    assert not live_filter.transaction_predicate({"date_to": "2030-01-01"}, False)(unconverted)
+
+@pytest.mark.parametrize("filters", [{"course_code": "bcs"}, {"title": "ram"}, {"language": "HIN", "title": "Eco"}])
+def test_stock_predicate_agrees_with_the_query(stocked, filters):
+    db = stocked
+    predicate = live_filter.stock_predicate(filters, db.search_uses_fts())
+    assert [row for row in db.get_all_stock() if predicate(row)] == db.get_all_stock(filters)
+
+def test_narrowing_needs_extended_text_and_a_smaller_range():
+    assert live_filter.narrows({"name": "ra"}, {"name": "rav", "action": "in"})
+    assert not live_filter.narrows({"name": "rav"}, {"name": "ra"})
+    assert live_filter.narrows({"date_from": "2024-01-01"}, {"date_from": "2024-01-05", "date_to": "2024-01-09"})
+    assert not live_filter.narrows({"date_to": "2024-01-09"}, {"date_to": "2024-01-10"})
+    assert not live_filter.narrows(None, {})
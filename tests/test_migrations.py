@@ -0,0 +1,87 @@
+import os
+import shutil
+import sqlite3
+import pytest
+import migrations
+import search
+import timestamps
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+@pytest.fixture
+def conn(tmp_path):
+    conn = sqlite3.connect(str(tmp_path / "inventory.db"))
+    yield conn
+    conn.close()
+
+def test_fresh_database_reaches_the_latest_version(conn):
+    assert migrations.migrate(conn) == [version for version, _ in migrations.MIGRATIONS]
+    assert migrations.get_version(conn) == migrations.LATEST_VERSION
+    assert migrations.migrate(conn) == []
+    assert migrations.check_query_plans(conn) == {}
+
+def test_existing_data_is_carried_through(conn):
+    migrations.migrate(conn, target=7)
+    conn.execute("INSERT INTO stock (course_code, title, language, quantity) VALUES ('BCS-001', 'Programming', 'English', 7)")
+    conn.executemany('''
+        INSERT INTO transaction_log (stock_id, enrolment_no, action, quantity, transaction_time)
+        VALUES (1, ?, ?, ?, ?)
+    ''', [("E1", "in", 10, "2024-01-05 09:30:00"), ("E2", "out", 3, "2024-02-10 14:00:00.250000")])
+    conn.commit()
+
+    assert migrations.migrate(conn) == list(range(8, migrations.LATEST_VERSION + 1))
+    assert migrations.convert_log_times(conn) == 2
+    times = [row[0] for row in conn.execute("SELECT transaction_time FROM transaction_log ORDER BY id")]
+    assert times == [timestamps.from_text("2024-01-05 09:30:00"), timestamps.from_text("2024-02-10 14:00:00.250")]
+    assert conn.execute("SELECT enrolment_no, course_code, outstanding FROM student_balance WHERE outstanding > 0").fetchall() == [
+        ("E2", "BCS-001", 3)]
+    assert conn.execute("SELECT opening, net FROM stock_ledger WHERE stock_id = 1").fetchone() == (0, 7)
+    assert migrations.check_query_plans(conn) == {}
+
+def test_shipped_database_passes_the_plan_check(tmp_path):
+    path = str(tmp_path / "shipped.db")
+    shutil.copy(os.path.join(REPO, "inventory.db"), path)
+    conn = sqlite3.connect(path)
+    try:
+        migrations.migrate(conn)
+        assert migrations.check_query_plans(conn) == {}
+    finally:
+        conn.close()
+
+def test_plan_check_reports_a_scan(conn):
+    migrations.migrate(conn)
+    failures = migrations.check_query_plans(conn, {"by title": ("SELECT id FROM stock WHERE title = ?", ("x",))})
+    assert failures == {"by title": ["SCAN stock"]}
+
+def test_plan_check_reports_a_full_index_scan_without_a_limit(conn):
+    migrations.migrate(conn)
+    listing = "SELECT id FROM transaction_log ORDER BY transaction_time"
+    failures = migrations.check_query_plans(conn, {"all": (listing, ()), "page": (listing + " LIMIT ?", (200,))})
+    assert failures == {"all": ["SCAN transaction_log USING COVERING INDEX idx_transaction_log_time"]}
+
+def test_listing_pages_are_checked_as_database_builds_them(conn):
+    migrations.migrate(conn)
+    queries = migrations.listing_queries(conn)
+    sql = " ".join(sql for sql, _ in queries.values())
+    assert "LIKE" in sql and "t.transaction_time >= ?" in sql and "t.action = ?" in sql
+    if search.has_search_index(conn):
+        assert "transaction_fts MATCH" in sql and "stock_fts MATCH" in sql
+    assert "(t.quantity, t.id) < (?, ?)" in sql and "t.enrolment_no IS NULL" in sql # Next pages, NULL block too
+
+def test_request_key_times_become_epoch_milliseconds(conn):
+    migrations.migrate(conn, target=12)
+    conn.executemany("INSERT INTO request_key (key, transaction_id, created) VALUES (?, 1, ?)",
+                     [("a", "2024-01-05 09:30:00.125000"), ("b", "not a time")])
+    conn.commit()
+    assert migrations.migrate(conn) == [13]
+    assert conn.execute("SELECT key, created FROM request_key").fetchall() == [
+        ("a", timestamps.from_text("2024-01-05 09:30:00.125"))]
+
+def test_current_schema_costs_no_migration_and_maintenance_can_wait(inventory, monkeypatch):
+    calls = []
+    monkeypatch.setattr(migrations, "migrate", calls.append)
+    monkeypatch.setattr(inventory, "run_maintenance", lambda: calls.append("maintenance"))
+    inventory.create_tables(maintenance=False)
+    assert calls == []
+    inventory.create_tables()
+    assert calls == ["maintenance"]
@@ -0,0 +1,88 @@
+import pytest
+import database
+import timestamps
+
+ENROLMENTS = ["E2", None, "E1", "E2", None, "E3", "E1", None, "E2"] # Repeats and a NULL block
+
+@pytest.fixture
+def logged(stocked):
+    """stocked with nine transactions on distinct days, some without an enrolment_no and some with equal quantities."""
+    db = stocked
+    conn = db.connect_db()
+    for number, enrolment_no in enumerate(ENROLMENTS, start=1):
+        success, _, transaction_id = db.add_transaction(1 + number % 2, enrolment_no, "in", 1 + number % 3, "", "", "",
+                                                        return_id=True)
+        assert success
+        conn.execute("UPDATE transaction_log SET transaction_time = ? WHERE id = ?",
+                     (timestamps.bound(f"2024-01-{number:02d}"), transaction_id))
+        conn.commit()
+    return db
+
+def _pages(db, limit, **kwargs):
+    """Every row, reading forward page by page; then every row again, reading backward from the last page."""
+    forward, pages, key = [], [], None
+    while True:
+        rows, first, last = db.get_transactions_page(after=key, limit=limit, **kwargs)
+        if not rows:
+            break
+        forward += rows
+        pages.append((rows, first))
+        key = last
+    key = pages[-1][1] if pages else None
+    backward = list(pages[-1][0]) if pages else []
+    while key is not None:
+        rows, first, _ = db.get_transactions_page(before=key, limit=limit, **kwargs)
+        backward = rows + backward
+        key = first if rows else None
+    return forward, backward
+
+@pytest.mark.parametrize("sort_by", list(database.TRANSACTION_SORT_COLUMNS))
+@pytest.mark.parametrize("descending", [True, False])
+def test_pages_cover_the_listing_in_order(logged, sort_by, descending):
+    db = logged
+    listing = db.get_all_transactions(sort_by=sort_by, descending=descending)
+    assert len(listing) == len(ENROLMENTS)
+    for limit in (1, 2, 4):
+        forward, backward = _pages(db, limit, sort_by=sort_by, descending=descending)
+        assert forward == listing
+        assert backward == listing
+
+def test_null_enrolment_block_sits_first_ascending_and_last_descending(logged):
+    db = logged
+    ascending = [row[2] for row in db.get_all_transactions(sort_by="enrolment_no", descending=False)]
+    assert ascending == [None, None, None, "E1", "E1", "E2", "E2", "E2", "E3"]
+    # A page boundary inside the NULL block
+    rows, _, last = db.get_transactions_page(limit=2, sort_by="enrolment_no", descending=False)
+    assert [row[2] for row in rows] == [None, None] and last[0] is None
+    rows, _, _ = db.get_transactions_page(after=last, limit=2, sort_by="enrolment_no", descending=False)
+    assert [row[2] for row in rows] == [None, "E1"]
+
+@pytest.mark.parametrize("sort_by", ["enrolment_no", "transaction_time", "course_code"])
+def test_pages_merge_the_archive(logged, sort_by):
+    db = logged
+    listing = db.get_all_transactions(sort_by=sort_by, descending=False)
+    assert db.archive_transactions("2024-01-05")[0]
+    assert db.get_all_transactions(include_archive=True, sort_by=sort_by, descending=False) == listing
+    forward, backward = _pages(db, 2, include_archive=True, sort_by=sort_by, descending=False)
+    assert forward == listing
+    assert backward == listing
+
+@pytest.mark.parametrize("filters", [{"action": "in", "course_code": "BCS"}, {"enrolment_no": "E2"},
+                                     {"date_from": "2024-01-03", "date_to": "2024-01-07"}])
+def test_filtered_pages_cover_the_filtered_listing(logged, filters):
+    db = logged
+    listing = db.get_all_transactions(filters)
+    assert listing and len(listing) < len(ENROLMENTS)
+    assert db.count_transactions(filters) == len(listing)
+    forward, backward = _pages(db, 2, filters=filters)
+    assert forward == listing
+    assert backward == listing
+
+def test_a_rows_key_opens_the_page_after_it(logged):
+    db = logged
+    listing = db.get_all_transactions()
+    row, key = db.get_transaction_row(listing[3][0])
+    assert row == listing[3]
+    assert db.get_transactions_page(after=key, limit=3)[0] == listing[4:7]
+    assert db.get_transactions_page(before=key, limit=3)[0] == listing[0:3]
+    assert db.get_transaction_row(999) == (None, None)
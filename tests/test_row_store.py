@@ -0,0 +1,93 @@
+from types import SimpleNamespace
+from app import InventoryApp
+from row_store import RowStore, TransactionRecord
+
+class FakeTree:
+    """The ttk.Treeview calls the tree helpers make, on a plain list of (iid, values), counting each kind."""
+    def __init__(self, columns):
+        self.columns = columns
+        self.items = []
+        self.calls = {"insert": 0, "item": 0, "delete": 0, "move": 0}
+
+    def __getitem__(self, option):
+        assert option == "columns"
+        return self.columns
+
+    def get_children(self):
+        return tuple(iid for iid, _ in self.items)
+
+    def index(self, iid):
+        return self.get_children().index(iid)
+
+    def insert(self, parent, index, iid, values):
+        self.calls["insert"] += 1
+        self.items.insert(len(self.items) if index == "end" else index, (iid, values))
+
+    def item(self, iid, values):
+        self.calls["item"] += 1
+        self.items[self.index(iid)] = (iid, values)
+
+    def delete(self, *iids):
+        self.calls["delete"] += len(iids)
+        self.items = [item for item in self.items if item[0] not in iids]
+
+    def move(self, iid, parent, index):
+        self.calls["move"] += 1
+        item = self.items.pop(self.index(iid))
+        self.items.insert(index, item)
+
+def _view(tree, record_type=None):
+    """The parts of InventoryApp its tree helpers use, around one tree (standing in for the transaction tree)."""
+    app = SimpleNamespace(trans_tree=tree, tree_rows={tree: RowStore(record_type)})
+    for name in ("_display_values", "sync_tree", "upsert_tree_row", "remove_tree_rows"):
+        setattr(app, name, getattr(InventoryApp, name).__get__(app))
+    return app
+
+def _row(id, quantity=1, name="Asha"):
+    return (id, "BCS-001", "E1", "out", quantity, 1_700_000_000_000 + id, name, "", "", 7)
+
+def test_sync_only_touches_changed_rows_and_keeps_the_tree_and_store_equal():
+    tree = FakeTree(("id", "course_code", "enrolment_no", "action", "quantity", "time", "name", "remarks", "phone"))
+    view = _view(tree, TransactionRecord)
+    store = view.tree_rows[tree]
+
+    def check(rows):
+        assert tree.get_children() == tuple(str(row[0]) for row in rows)
+        assert [values for _, values in tree.items] == [view._display_values(tree, row) for row in rows]
+        assert [store.get(str(row[0])) for row in rows] == rows and len(store) == len(rows)
+
+    rows = [_row(id) for id in (5, 4, 3, 2, 1)]
+    view.sync_tree(tree, rows)
+    check(rows)
+    assert tree.calls["insert"] == 5 and tree.items[0][1][5] != rows[0][5] # Shown formatted, stored raw
+
+    tree.calls = dict.fromkeys(tree.calls, 0)
+    rows = [_row(6), _row(5), _row(4, quantity=2), _row(2)] # One added, one edited, two gone
+    view.sync_tree(tree, rows)
+    check(rows)
+    assert tree.calls == {"insert": 1, "item": 1, "delete": 2, "move": 0}
+
+    tree.calls = dict.fromkeys(tree.calls, 0)
+    rows = rows[::-1] # A re-sort moves, but rewrites nothing
+    view.sync_tree(tree, rows)
+    check(rows)
+    assert tree.calls["insert"] == tree.calls["item"] == tree.calls["delete"] == 0
+
+    view.upsert_tree_row(tree, _row(2, name="Ravi"), index=3) # Edited and moved to the end
+    view.remove_tree_rows(tree, [4, 99])
+    rows = [_row(5), _row(6), _row(2, name="Ravi")]
+    check(rows)
+    assert store.record("2").as_detail()[:3] == (2, 7, "BCS-001") # What selection reads, without a query
+
+def test_records_share_repeated_strings_and_have_no_dict():
+    first, second = (TransactionRecord(*_row(id, name="".join(["As", "ha"]))) for id in (1, 2))
+    assert first.name is second.name
+    assert not hasattr(first, "__dict__")
+
+def test_plain_store_keeps_tuples():
+    store = RowStore()
+    store.put("1", [1, "BCS-001"])
+    assert store.get("1") == (1, "BCS-001") and store.record("1") == (1, "BCS-001")
+    store.remove("1")
+    store.remove("1")
+    assert store.get("1") is None and "1" not in store
@@ -0,0 +1,82 @@
+import asyncio
+import json
+import threading
+import pytest
+import reports
+from client import InventoryClient, ServiceError
+from service import InventoryService
+
+@pytest.fixture
+def served(stocked):
+    """stocked, served by an InventoryService on a free port (in a background event loop), plus a client for it."""
+    loop = asyncio.new_event_loop()
+    thread = threading.Thread(target=loop.run_forever, daemon=True)
+    thread.start()
+    service = asyncio.run_coroutine_threadsafe(InventoryService(port=0, readers=2).start(), loop).result(10)
+    client = InventoryClient(f"127.0.0.1:{service.port}")
+    yield stocked, service, client, loop
+    client.close_db()
+    asyncio.run_coroutine_threadsafe(service.stop(), loop).result(10)
+    loop.call_soon_threadsafe(loop.stop)
+    thread.join(10)
+
+def test_client_returns_what_the_database_returns(served):
+    db, _, client, _ = served
+    client.create_tables(maintenance=False)
+    client.run_maintenance()
+    assert client.search_uses_fts() == db.search_uses_fts()
+    assert client.add_stock("BCS-003", "Data Structures", "English", 4) == (True, "Stock added successfully.")
+    assert client.add_stock("BCS-003", "x", "x", 1) == db.add_stock("BCS-003", "x", "x", 1) # Both refused
+    for filters in (None, {"title": "ram"}):
+        assert client.get_all_stock(filters, sort_by="quantity", descending=True) == db.get_all_stock(
+            filters, sort_by="quantity", descending=True)
+    assert client.get_stock_by_name("BCS-001") == db.get_stock_by_name("BCS-001")
+    assert client.get_course_codes() == db.get_course_codes()
+
+    success, _, first_id = client.add_transaction(1, "E1", "out", 2, "Asha", "", "", return_id=True)
+    assert success and client.get_stock_by_id(1)[4] == 8
+    assert client.checkout_cart([("BCS-001", 1), ("MCO-002", 2)], "E2", "Ravi", "", "")[0]
+    assert client.add_transactions_bulk([{"course_code": "MCO-002", "action": "in", "quantity": 1}])[:2] == (
+        True, "Imported 1 transactions.")
+    assert client.update_transaction_details(first_id, "E1", "Asha Rao", "lab", "")[0]
+
+    for sort_by in ("transaction_time", "course_code", "enrolment_no"):
+        rows, first_key, last_key = client.get_transactions_page(limit=2, sort_by=sort_by, descending=False)
+        assert (rows, first_key, last_key) == db.get_transactions_page(limit=2, sort_by=sort_by, descending=False)
+        assert client.get_transactions_page(after=last_key, limit=2, sort_by=sort_by, descending=False) == \
+            db.get_transactions_page(after=last_key, limit=2, sort_by=sort_by, descending=False)
+    assert list(client.iter_transactions(chunk_size=3)) == db.get_all_transactions()
+    assert client.count_transactions({"enrolment_no": "E2"}) == db.count_transactions({"enrolment_no": "E2"}) == 2
+    assert client.get_transaction_by_id(first_id) == db.get_transaction_by_id(first_id)
+    assert client.get_transaction_row(first_id) == db.get_transaction_row(first_id)
+    assert client.get_outstanding_for_student("E2") == db.get_outstanding_for_student("E2")
+    for name in reports.REPORTS:
+        assert client.run_report(name) == reports.run_report(name)
+
+    assert client.delete_transaction(first_id)[0]
+    assert client.get_transaction_row(first_id) == (None, None)
+
+def test_a_resent_write_is_applied_once(served):
+    db, _, client, _ = served
+    first = client.add_transaction(1, "E1", "out", 1, "", "", "", return_id=True, request_key="counter-1")
+    replay = client.add_transaction(1, "E1", "out", 1, "", "", "", return_id=True, request_key="counter-1")
+    assert replay[1] == "Transaction was already recorded." and replay[2] == first[2]
+    assert db.get_stock_by_id(1)[4] == 9
+
+def test_failures_become_statuses(served):
+    _, service, client, loop = served
+    def dispatch(method, target, body=b""):
+        return asyncio.run_coroutine_threadsafe(service.dispatch(method, target, body), loop).result(10)
+    assert dispatch("GET", "/nowhere")[0] == 404
+    assert dispatch("PATCH", "/stock/1")[0] == 405
+    assert dispatch("POST", "/stock", b"{not json")[0] == 400
+    assert dispatch("POST", "/stock", b"[]")[0] == 400
+    status, payload = dispatch("POST", "/transactions", json.dumps({"stock_id": 1}).encode())
+    assert status == 400 and "action" in payload["error"]
+    assert dispatch("GET", "/transactions?date_from=someday")[0] == 400
+    assert dispatch("GET", "/transactions?sort_by=remarks")[0] == 400
+    assert dispatch("GET", "/reports/Nothing")[0] == 404
+    with pytest.raises(ServiceError, match="Unknown report"):
+        client.run_report("Nothing")
+    # A refused write is a normal reply, not an error
+    assert client.add_transaction(2, "E1", "out", 99, "", "", "")[0] is False
@@ -0,0 +1,47 @@
+import timestamps
+
+def _replay(db, opening, moment):
+    """Quantities at moment from the opening quantities plus every logged row (hot and archived) up to it."""
+    quantities = dict(opening)
+    for row in db.get_all_transactions(include_archive=True):
+        if row[5] <= moment:
+            quantities[row[9]] += row[4] if row[3] == "in" else -row[4]
+    return quantities
+
+def _moment():
+    moment = timestamps.now()
+    while timestamps.now() == moment: # Rows logged from here on are later than moment
+        pass
+    return moment
+
+def test_as_of_matches_a_full_replay(stocked):
+    db = stocked
+    opening = {1: 10, 2: 5}
+    moments = [_moment()]
+    ids = []
+    for stock_id, action, quantity in ((1, "out", 2), (2, "in", 3), (1, "out", 1)):
+        ids.append(db.add_transaction(stock_id, "E1", action, quantity, "", "", "", return_id=True)[2])
+        moments.append(_moment())
+    assert db.take_stock_snapshot()[0]
+    moments.append(_moment())
+    for stock_id, action, quantity in ((2, "out", 4), (1, "in", 5)):
+        ids.append(db.add_transaction(stock_id, "E2", action, quantity, "", "", "", return_id=True)[2])
+        moments.append(_moment())
+    assert db.delete_transaction(ids[0])[0] # Before the snapshot: it is revised
+    assert db.delete_transaction(ids[3])[0] # After it
+    moments.append(_moment())
+    assert db.add_stock("NEW-001", "New", "English", 7)[0] # Unknown to the snapshot
+    opening[3] = 7
+    assert db.add_transaction(3, "E3", "out", 2, "", "", "")[0]
+    assert db.add_transaction(2, "E3", "in", 1, "", "", "")[0]
+    moments.append(_moment())
+    assert db.take_stock_snapshot()[0]
+    assert db.add_transaction(1, "E3", "out", 3, "", "", "")[0]
+    moments.append(_moment())
+    assert db.archive_transactions(moments[4])[0] # The first rows, the snapshot's included
+
+    for moment in moments:
+        expected = _replay(db, opening, moment)
+        assert {row[0]: row[4] for row in db.get_stock_as_of(moment)} == expected, moment
+        assert db.get_stock_as_of(moment, stock_id=2)[4] == expected[2]
+    assert {row[0]: row[4] for row in db.get_all_stock()} == _replay(db, opening, timestamps.now())
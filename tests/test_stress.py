@@ -0,0 +1,10 @@
+import database
+import stress_stock
+
+def test_concurrent_processes_neither_oversell_nor_drift(capsys):
+    try:
+        assert stress_stock.run(processes=3, operations=40, items=2) == []
+    finally:
+        database.close_db()
+    output = capsys.readouterr().out
+    assert output.count("process ") == 3 and "'added': 0," not in output
@@ -0,0 +1,81 @@
+import sqlite3
+import pytest
+import migrations
+import timestamps
+
+@pytest.fixture
+def conn(tmp_path):
+    conn = sqlite3.connect(str(tmp_path / "inventory.db"))
+    migrations.migrate(conn, target=7)
+    conn.execute("INSERT INTO stock (course_code, quantity) VALUES ('BCS-001', 10)")
+    conn.executemany("INSERT INTO transaction_log (stock_id, action, quantity, transaction_time) VALUES (1, 'in', 1, ?)",
+                     [("2024-01-0%d 10:00:00" % day,) for day in range(1, 6)])
+    conn.commit()
+    yield conn
+    conn.close()
+
+def _times(conn):
+    return [row[0] for row in conn.execute("SELECT transaction_time FROM transaction_log ORDER BY id")]
+
+def test_unparseable_time_is_logged_and_left_instead_of_failing_the_migration(conn, caplog):
+    conn.execute("UPDATE transaction_log SET transaction_time = 'yesterday' WHERE id = 3")
+    conn.commit()
+    migrations.migrate(conn)
+    assert migrations.convert_log_times(conn) == 5
+    times = _times(conn)
+    assert times[2] == "yesterday"
+    assert times[:2] + times[3:] == [timestamps.from_text("2024-01-0%d 10:00:00" % day) for day in (1, 2, 4, 5)]
+    assert "'yesterday'" in caplog.text
+    assert timestamps.format_timestamp(times[2]) == "yesterday"
+    assert migrations.convert_log_times(conn) == 1 # Only the unreadable row is looked at again
+
+def test_migration_keeps_the_log_and_its_triggers(conn):
+    summary = conn.execute("SELECT * FROM monthly_stock_summary").fetchall()
+    triggers = conn.execute("SELECT name, sql FROM sqlite_master WHERE type = 'trigger' ORDER BY name").fetchall()
+    migrations.migrate(conn, target=8)
+    assert migrations.get_version(conn) == 8
+    assert all(isinstance(value, str) for value in _times(conn))
+    assert conn.execute("SELECT name, sql FROM sqlite_master WHERE type = 'trigger' ORDER BY name").fetchall() == triggers
+    migrations.convert_log_times(conn)
+    assert all(isinstance(value, int) for value in _times(conn))
+    assert conn.execute("SELECT * FROM monthly_stock_summary").fetchall() == summary # Same months
+
+def test_conversion_commits_each_batch_and_resumes(conn):
+    migrations.migrate(conn)
+    calls = []
+    def fail_on_the_fourth(text):
+        calls.append(text)
+        if len(calls) == 4:
+            raise ValueError("interrupted")
+        return timestamps.from_text(text)
+    original = timestamps.register_functions
+    timestamps.register_functions = lambda conn: conn.create_function("epoch_ms", 1, fail_on_the_fourth)
+    try:
+        with pytest.raises(sqlite3.Error):
+            timestamps.convert_text_column(conn, "transaction_log", "transaction_time", batch_size=2)
+    finally:
+        timestamps.register_functions = original
+    assert [type(value) for value in _times(conn)] == [int, int, str, str, str] # The first batch was committed
+    assert not conn.in_transaction
+
+    assert timestamps.convert_text_column(conn, "transaction_log", "transaction_time", batch_size=2) == 3
+    assert all(isinstance(value, int) for value in _times(conn))
+
+def test_rows_with_an_unconverted_time_are_paged_and_deletable(stocked):
+    db = stocked
+    for _ in range(3):
+        assert db.add_transaction(1, "E1", "in", 1, "", "", "")[0]
+    conn = db.connect_db()
+    # What the version 8 conversion leaves behind for text it couldn't read (summaries count it under its text month)
+    conn.execute("DROP TRIGGER summary_au")
+    conn.execute("UPDATE transaction_log SET transaction_time = 'yesterday' WHERE id = 2")
+    conn.commit()
+    for descending in (True, False):
+        seen, key = [], None
+        while True:
+            rows, _, key = db.get_transactions_page(after=key, limit=1, descending=descending)
+            if not rows:
+                break
+            seen += [row[0] for row in rows]
+        assert seen == ([2, 3, 1] if descending else [1, 3, 2]) # Text after every converted time
+    assert db.delete_transaction(2)[0]
@@ -0,0 +1,116 @@
+import logging
+import time
+from datetime import datetime, timedelta
+
+# --- Timestamps ---
+# transaction_time, and the snapshot and archive times compared with it, are stored as INTEGER
+# milliseconds since the Unix epoch (schema version 8; before that they were ISO text in local
+# time). An integer takes at most 8 bytes against 19-26 for the text, compares without any
+# parsing, and makes a date range a plain range scan of idx_transaction_log_time. Milliseconds
+# rather than seconds keep the order of rows logged within one second around a snapshot
+# (see snapshots.py). Queries return the raw value; it is turned into local wall-clock time
+# only where it is shown (format_timestamp).
+
+DISPLAY_FORMAT = "%Y-%m-%d %H:%M:%S"
+CONVERT_BATCH_SIZE = 50_000 # Rows per write transaction when converting stored text
+
+log = logging.getLogger("inventory.timestamps")
+
+def now():
+    """The current time in epoch milliseconds."""
+    return time.time_ns() // 1_000_000
+
+def from_datetime(value):
+    """Epoch milliseconds for a datetime (naive means local time)."""
+    # Whole seconds through timestamp() are exact; adding the milliseconds separately avoids float rounding
+    return int(value.replace(microsecond=0).timestamp()) * 1000 + value.microsecond // 1000
+
+def to_datetime(stamp):
+    """The local naive datetime for epoch milliseconds."""
+    seconds, millis = divmod(stamp, 1000)
+    return datetime.fromtimestamp(seconds).replace(microsecond=millis * 1000)
+
+def from_text(text):
+    """Epoch milliseconds for an ISO 'YYYY-MM-DD[ HH:MM[:SS[.ffffff]]]' local time, as stored before version 8."""
+    return from_datetime(datetime.fromisoformat(text.strip()))
+
+def bound(value, end=False):
+    """
+    Converts a date filter (date, datetime, 'YYYY-MM-DD[ HH:MM:SS]' string or epoch milliseconds)
+    into epoch milliseconds. With end=True the result is exclusive: a bare date becomes the start
+    of the next day, anything else the next millisecond. Raises ValueError for malformed text.
+    """
+    if isinstance(value, int):
+        return value + 1 if end else value
+    if isinstance(value, str):
+        value = value.strip()
+        parsed = datetime.fromisoformat(value)
+        date_only = " " not in value and "T" not in value
+    else:
+        parsed = value if isinstance(value, datetime) else datetime.combine(value, datetime.min.time())
+        date_only = not isinstance(value, datetime)
+    if end and date_only:
+        return from_datetime(parsed + timedelta(days=1))
+    return from_datetime(parsed) + (1 if end else 0)
+
+def format_timestamp(stamp):
+    """Local 'YYYY-MM-DD HH:MM:SS' for epoch milliseconds ('' for None, text unconverted as stored)."""
+    if stamp is None:
+        return ""
+    if isinstance(stamp, str):
+        return stamp
+    return datetime.fromtimestamp(stamp // 1000).strftime(DISPLAY_FORMAT)
+
+def sql_month(column):
+    """SQL for the local 'YYYY-MM' of a time column, whether it holds epoch milliseconds or pre-version-8 text."""
+    return (f"CASE typeof({column}) WHEN 'text' THEN substr({column}, 1, 7) "
+            f"ELSE strftime('%Y-%m', {column} / 1000, 'unixepoch', 'localtime') END")
+
+def _epoch_ms(text):
+    """
+    from_text for SQL. Text that isn't a time is logged and returned unchanged rather than
+    failing the statement: the summaries already count it under its text month (sql_month),
+    and it stays visible, as stored, after every converted time.
+    """
+    try:
+        return from_text(text)
+    except ValueError:
+        log.warning("Stored time %r is not an ISO date/time; left as text", text)
+        return text
+
+def register_functions(conn):
+    """Makes from_text available to SQL on conn as epoch_ms(text), for converting stored text in place."""
+    conn.create_function("epoch_ms", 1, _epoch_ms, deterministic=True)
+
+def convert_text_column(conn, table, column, key="id", batch_size=CONVERT_BATCH_SIZE):
+    """
+    Rewrites the text values of table.column as epoch milliseconds in place, batch_size rows per
+    write transaction, so the write lock and the WAL only ever hold one batch. Call outside a
+    transaction; it registers epoch_ms on conn. Converted values are the progress marker: run
+    again after an interruption, it carries on from the first value still stored as text. Text
+    that isn't a time stays text and is passed over. Returns the number of rows rewritten.
+    """
+    register_functions(conn)
+    cursor = conn.cursor()
+    # Text sorts after every number, so an index on column holds the unconverted rows at its far end
+    start, params = f"{column} >= ''", ()
+    converted = 0
+    while True:
+        try:
+            cursor.execute("BEGIN IMMEDIATE")
+            cursor.execute(f"""
+                SELECT {column}, {key} FROM {table} WHERE {start}
+                ORDER BY {column}, {key} LIMIT 1 OFFSET ?
+            """, params + (batch_size - 1,))
+            last = cursor.fetchone()
+            end, end_params = (f"({column}, {key}) <= (?, ?)", tuple(last)) if last else ("1", ())
+            cursor.execute(f"UPDATE {table} SET {column} = epoch_ms({column}) WHERE {start} AND {end}",
+                           params + end_params)
+            converted += cursor.rowcount
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        if last is None:
+            return converted
+        start, params = f"({column}, {key}) > (?, ?)", tuple(last)